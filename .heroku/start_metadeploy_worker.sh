@@ -1,4 +1,8 @@
 set -e
 mkdir -p /opt/google/chrome
 ln -s /app/.apt/usr/bin/google-chrome /opt/google/chrome/chrome
-python manage.py rqworker default
+if [ "${RQ_WORKER_CONCURRENCY:-1}" -gt 1 ]; then
+    python manage.py metadeploy_rqworker_pool default --worker-class metadeploy.rq_worker.PreloadingHerokuWorker
+else
+    python manage.py rqworker default --worker-class metadeploy.rq_worker.PreloadingHerokuWorker
+fi
@@ -144,6 +144,11 @@ SITE_ID = 1
 # https://docs.djangoproject.com/en/1.11/ref/settings/#databases
 
 DATABASES = {"default": env.db_url("DATABASE_URL", default="postgres:///metadeploy")}
+# Seconds to keep a connection open for reuse (0 closes it after each request or
+# job). Only enabled for workers that run jobs in-process; see
+# metadeploy.rq_worker.PersistentConnectionWorker.
+DATABASES["default"]["CONN_MAX_AGE"] = env.int("DATABASE_CONN_MAX_AGE", default=0)
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
 
 # Custom User model:
 AUTH_USER_MODEL = "api.User"
@@ -383,7 +388,10 @@ CACHES = {
         "BACKEND": "django_redis.cache.RedisCache",
         "LOCATION": REDIS_LOCATION,
         "OPTIONS": {
-            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            # Count cache hits and misses, and Redis round-trips, for the
+            # instrumented requests and jobs:
+            "CLIENT_CLASS": "metadeploy.instrumentation.InstrumentedCacheClient",
+            "REDIS_CLIENT_CLASS": "metadeploy.instrumentation.InstrumentedRedis",
             "IGNORE_EXCEPTIONS": True,
         },
     }
@@ -393,14 +401,20 @@ RQ_QUEUES = {
         "USE_REDIS_CACHE": "default",
         "DEFAULT_TIMEOUT": METADEPLOY_JOB_TIMEOUT,
         "DEFAULT_RESULT_TTL": 720,
+        "QUEUE_CLASS": "metadeploy.tracing.TracingQueue",
     },
     "short": {
         "USE_REDIS_CACHE": "default",
         "DEFAULT_TIMEOUT": 60,
         "DEFAULT_RESULT_TTL": 300,
+        "QUEUE_CLASS": "metadeploy.tracing.TracingQueue",
     },
 }
 RQ = {"WORKER_CLASS": "metadeploy.rq_worker.ConnectionClosingWorker"}
+# Number of default-queue workers (and so concurrent jobs) per worker dyno
+RQ_WORKER_CONCURRENCY = env.int("RQ_WORKER_CONCURRENCY", default=1)
+# Times a job interrupted by a worker restart is resumed before being canceled
+JOB_MAX_RESUMES = env.int("JOB_MAX_RESUMES", default=2)
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",
@@ -408,6 +422,10 @@ CHANNEL_LAYERS = {
     }
 }
 MAX_QUEUE_LENGTH = env.int("MAX_QUEUE_LENGTH", default=15)
+# Seconds of recent RQ jobs that the queue metrics' wait times, run times and
+# failure rates cover. RQ forgets finished jobs after their queue's
+# DEFAULT_RESULT_TTL, so the short queue's figures cover at most 5 minutes:
+QUEUE_METRICS_WINDOW = env.int("QUEUE_METRICS_WINDOW", default=600)
 
 CRON_JOBS = {
     "cleanup_user_data": {
@@ -422,10 +440,9 @@ CRON_JOBS = {
         "func": "metadeploy.api.jobs.expire_preflights_job",
         "cron_string": "* * * * *",
     },
-    "calculate_average_plan_runtimes": {
-        "func": "metadeploy.api.jobs.calculate_average_plan_runtime_job",
-        "cron_string": "0 0 * * *",  # run daily at midnight
-        "queue_name": "default",
+    "report_step_timings": {
+        "func": "metadeploy.api.jobs.report_step_timings_job",
+        "cron_string": "0 * * * *",
     },
 }
 # There is a default dict of cron jobs,
@@ -434,6 +451,8 @@ CRON_JOBS = {
 # CRON_SCHEDULE is a mapping from a name identifying the job
 # to a cron string specifying the schedule for the job,
 # or null to disable the job.
+# Jobs that have been removed are ignored, so existing overrides keep working.
+RETIRED_CRON_JOBS = {"calculate_average_plan_runtimes"}
 cron_overrides = json.loads(env("CRON_SCHEDULE", default="{}"))
 if not isinstance(cron_overrides, dict):
     raise TypeError("CRON_SCHEDULE must be a JSON object")
@@ -443,7 +462,7 @@ for key, cron_string in cron_overrides.items():
             del CRON_JOBS[key]
         else:
             CRON_JOBS[key]["cron_string"] = cron_string
-    else:
+    elif key not in RETIRED_CRON_JOBS:
         raise KeyError(key)
 
 # Rest Framework settings:
@@ -469,6 +488,20 @@ REST_FRAMEWORK = {
 # Token expiration
 TOKEN_LIFETIME_MINUTES = env.int("TOKEN_LIFETIME_MINUTES", default=10)
 PREFLIGHT_LIFETIME_MINUTES = env.int("PREFLIGHT_LIFETIME_MINUTES", default=10)
+# Largest number of preflights expire_preflights invalidates in one statement
+PREFLIGHT_EXPIRY_BATCH_SIZE = env.int("PREFLIGHT_EXPIRY_BATCH_SIZE", default=1000)
+
+# Largest number of rows the cleanup jobs delete or update in one statement
+CLEANUP_CHUNK_SIZE = env.int("CLEANUP_CHUNK_SIZE", default=500)
+
+# Age after which archive_results moves finished jobs and preflights out of the
+# database
+RESULT_ARCHIVE_AFTER_DAYS = env.int("RESULT_ARCHIVE_AFTER_DAYS", default=365)
+# Where in the default file storage (S3, when configured) the archives go
+RESULT_ARCHIVE_PREFIX = env("RESULT_ARCHIVE_PREFIX", default="archives/")
+
+# Window of recorded job steps that each hourly step_timing_histogram report covers
+STEP_TIMING_REPORT_MINUTES = env.int("STEP_TIMING_REPORT_MINUTES", default=60)
 
 # Displaying average job completion time
 MINIMUM_JOBS_FOR_AVERAGE = env.int("MINIMUM_JOBS_FOR_AVERAGE", default=5)
@@ -477,6 +510,16 @@ AVERAGE_JOB_WINDOW = env.int("AVERAGE_JOB_WINDOW", default=20)
 API_PRODUCT_PAGE_SIZE = env.int("API_PRODUCT_PAGE_SIZE", default=25)
 
 LOG_REQUESTS = True
+# Fraction of requests, websocket messages and jobs that log their database
+# queries, cache hits and misses, Redis round-trips and serializer time:
+INSTRUMENTATION_SAMPLE_RATE = env.float("INSTRUMENTATION_SAMPLE_RATE", default=0.05)
+# Where to export trace spans: "json" appends them to TRACING_JSON_PATH, "otlp"
+# posts them to an OpenTelemetry collector, and "" turns tracing off:
+TRACING_EXPORTER = env("TRACING_EXPORTER", default="")
+TRACING_JSON_PATH = env("TRACING_JSON_PATH", default="traces.jsonl")
+TRACING_OTLP_ENDPOINT = env(
+    "TRACING_OTLP_ENDPOINT", default="http://localhost:4318/v1/traces"
+)
 LOG_REQUEST_ID_HEADER = "HTTP_X_REQUEST_ID"
 GENERATE_REQUEST_ID_IF_NOT_IN_HEADER = True
 REQUEST_ID_RESPONSE_HEADER = "X-Request-ID"
@@ -485,12 +528,33 @@ REQUEST_ID_RESPONSE_HEADER = "X-Request-ID"
 DEVHUB_USERNAME = env("DEVHUB_USERNAME", default=None)
 SCRATCH_ORG_DURATION_DAYS = env.int("SCRATCH_ORG_DURATION_DAYS", default=30)
 
+# Scratch org access tokens are cached (encrypted) and reused until this many
+# seconds before the end of their expected lifetime, the Salesforce session
+# timeout. Set ORG_TOKEN_LIFETIME to 0 to refresh on every use.
+ORG_TOKEN_LIFETIME = env.int("ORG_TOKEN_LIFETIME", default=2 * 60 * 60)
+ORG_TOKEN_REFRESH_MARGIN = env.int("ORG_TOKEN_REFRESH_MARGIN", default=10 * 60)
+
+# Built metadata deploy packages are cached in Redis per Version, commit and
+# options for this many seconds (0 disables the cache). The cache shares Redis
+# with the job queues, so packages larger than DEPLOY_ARTIFACT_MAX_SIZE bytes
+# (base64-encoded) are never stored and are rebuilt every time.
+DEPLOY_ARTIFACT_CACHE_TIMEOUT = env.int(
+    "DEPLOY_ARTIFACT_CACHE_TIMEOUT", default=24 * 60 * 60
+)
+DEPLOY_ARTIFACT_MAX_SIZE = env.int("DEPLOY_ARTIFACT_MAX_SIZE", default=1024 * 1024)
+
+# How many plans the run_release_tests command tests at once, and how many may
+# fail before it skips the rest (0 to always test them all):
+RELEASE_TEST_PROCESSES = env.int("RELEASE_TEST_PROCESSES", default=4)
+RELEASE_TEST_MAX_FAILURES = env.int("RELEASE_TEST_MAX_FAILURES", default=0)
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": True,
     "filters": {
         "request_id": {"()": "log_request_id.filters.RequestIDFilter"},
         "job_id": {"()": "metadeploy.logfmt.JobIDFilter"},
+        "trace_id": {"()": "metadeploy.tracing.TraceIDFilter"},
     },
     "formatters": {
         "logfmt": {
@@ -516,13 +580,13 @@ LOGGING = {
         "console": {
             "level": "DEBUG",
             "class": "logging.StreamHandler",
-            "filters": ["request_id"],
+            "filters": ["request_id", "trace_id"],
             "formatter": "logfmt",
         },
         "rq_console": {
             "level": "DEBUG",
             "class": "logging.StreamHandler",
-            "filters": ["job_id"],
+            "filters": ["job_id", "trace_id"],
             "formatter": "logfmt",
         },
     },
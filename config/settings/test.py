@@ -6,5 +6,9 @@ CHANNEL_LAYERS = {
     }
 }
 
+# Tests that look at instrumentation turn it on themselves:
+INSTRUMENTATION_SAMPLE_RATE = 0
+TRACING_EXPORTER = ""
+
 HEROKU_TOKEN = "abcdefg1234567"
 HEROKU_APP_NAME = "test_heroku_app_name"
@@ -10,6 +10,7 @@ from sfdo_template_helpers.admin.views import AdminAPIViewSet
 from metadeploy.adminapi.translations import update_all_translations
 from metadeploy.api import models
 from metadeploy.api.models import SUPPORTED_ORG_TYPES, Plan
+from metadeploy.api.queue_metrics import all_queue_metrics
 from metadeploy.api.serializers import get_from_data_or_instance
 
 
@@ -61,7 +62,11 @@ class PlanSerializer(AdminAPISerializer):
     )
 
     class Meta:
-        exclude = ["calculated_average_duration"]
+        exclude = [
+            "calculated_average_duration",
+            "requires_preflight",
+            "required_step_pks",
+        ]
         extra_kwargs = {"plan_template": {"required": False}}
 
     def validate(self, data):
@@ -159,8 +164,14 @@ class PlanSlugViewSet(AdminAPIViewSet):
     throttle_classes = []
 
 
+class VersionSerializer(AdminAPISerializer):
+    class Meta:
+        exclude = ["primary_plan", "secondary_plan", "additional_plan_pks"]
+
+
 class VersionViewSet(AdminAPIViewSet):
     model_name = "Version"
+    serializer_base = VersionSerializer
     throttle_classes = []
 
 
@@ -220,3 +231,23 @@ class TranslationViewSet(viewsets.ViewSet):
 
         update_all_translations.delay(lang)
         return Response({})
+
+
+class QueueViewSet(viewsets.ViewSet):
+    """Telemetry on the RQ queues and workers, for autoscaling.
+
+    GET /admin/rest/queues
+
+    For the ``default`` and ``short`` queues: depth, age of the oldest queued
+    job, enqueue-to-start wait and run time percentiles and failure rate over
+    the last QUEUE_METRICS_WINDOW seconds, busy and idle workers, and an
+    estimate of how long the current backlog will take to clear (all times
+    in seconds).
+    """
+
+    permission_classes = [IsAPIUser]
+    model_name = "Queue"
+    throttle_classes = []
+
+    def list(self, request):
+        return Response(all_queue_metrics())
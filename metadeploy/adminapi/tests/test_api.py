@@ -408,3 +408,17 @@ class TestAllowedListOrgViewSet:
         response = admin_api_client.get(url)
         assert response.status_code == 200
         assert len(response.json()["data"]) == 1
+
+
+@pytest.mark.django_db
+class TestQueueViewSet:
+    def test_list(self, admin_api_client):
+        response = admin_api_client.get("http://testserver/admin/rest/queues")
+
+        assert response.status_code == 200
+        assert set(response.json()["queues"]) == {"default", "short"}
+
+    def test_list__not_admin(self, client):
+        response = client.get("http://testserver/admin/rest/queues")
+
+        assert response.status_code == 403
@@ -9,6 +9,7 @@ from .api import (
     ProductCategoryViewSet,
     ProductSlugViewSet,
     ProductViewSet,
+    QueueViewSet,
     TranslationViewSet,
     VersionViewSet,
 )
@@ -31,4 +32,5 @@ router.register(r"products", ProductViewSet)
 router.register(r"productslug", ProductSlugViewSet)
 router.register(r"versions", VersionViewSet)
 router.register(r"translations", TranslationViewSet)
+router.register(r"queues", QueueViewSet)
 urlpatterns = router.urls
@@ -1,3 +1,5 @@
+from datetime import timedelta
+
 from allauth.socialaccount.admin import SocialTokenAdmin
 from allauth.socialaccount.models import SocialToken
 from django.conf import settings
@@ -6,6 +8,7 @@ from django.contrib.postgres.fields import ArrayField
 from django.forms.widgets import CheckboxSelectMultiple
 from django.shortcuts import redirect
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from parler.admin import TranslatableAdmin
 from parler.utils.views import TabsList
@@ -17,6 +20,7 @@ from .models import (
     ClickThroughAgreement,
     Job,
     Plan,
+    PlanDurationStats,
     PlanSlug,
     PlanTemplate,
     PreflightResult,
@@ -57,6 +61,44 @@ class PlanMixin:
     version.admin_order_field = "plan__version__label"
 
 
+class RecentlyCreatedFilter(admin.SimpleListFilter):
+    """
+    Filters on created_at, defaulting to the last 30 days so that the changelist
+    and its search only scan recent rows unless "All" is picked.
+    """
+
+    title = _("created")
+    parameter_name = "created"
+    default = "30"
+
+    def lookups(self, request, model_admin):
+        return (
+            ("30", _("Last 30 days")),
+            ("365", _("Last year")),
+            ("all", _("All")),
+        )
+
+    def value(self):
+        value = super().value()
+        return value if value in dict(self.lookup_choices) else self.default
+
+    def choices(self, changelist):
+        for lookup, title in self.lookup_choices:
+            yield {
+                "selected": self.value() == lookup,
+                "query_string": changelist.get_query_string(
+                    {self.parameter_name: lookup}
+                ),
+                "display": title,
+            }
+
+    def queryset(self, request, queryset):
+        if self.value() == "all":
+            return queryset
+        days = int(self.value())
+        return queryset.filter(created_at__gte=timezone.now() - timedelta(days=days))
+
+
 class AdminHelpTextMixin:
     """Renders help text at the top of the list and edit views."""
 
@@ -112,7 +154,7 @@ class JobAdmin(AdminHelpTextMixin, admin.ModelAdmin, PlanMixin):
     )
 
     autocomplete_fields = ("plan", "steps", "user")
-    list_filter = ("status", "plan__version__product")
+    list_filter = (RecentlyCreatedFilter, "status", "plan__version__product")
     list_display = (
         "id",
         "org_id",
@@ -192,6 +234,12 @@ class PlanSlugAdmin(admin.ModelAdmin):
     list_display = ("slug", "parent")
 
 
+@admin.register(PlanDurationStats)
+class PlanDurationStatsAdmin(admin.ModelAdmin):
+    list_display = ("plan", "p50", "p90", "updated_at")
+    readonly_fields = ("plan", "durations", "step_durations", "p50", "p90")
+
+
 @admin.register(PreflightResult)
 class PreflightResult(AdminHelpTextMixin, admin.ModelAdmin, PlanMixin):
     help_text = _(
@@ -199,7 +247,12 @@ class PreflightResult(AdminHelpTextMixin, admin.ModelAdmin, PlanMixin):
         "must be used for support/debugging purposes only, and not exported from this system."
     )
     autocomplete_fields = ("plan", "user")
-    list_filter = ("status", "is_valid", "plan__version__product")
+    list_filter = (
+        RecentlyCreatedFilter,
+        "status",
+        "is_valid",
+        "plan__version__product",
+    )
     list_display = (
         "id",
         "org_id",
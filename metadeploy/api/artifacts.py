@@ -0,0 +1,162 @@
+"""
+Reuse of built metadata deploy packages.
+
+Building a deploy package (converting source, injecting namespace tokens,
+cleaning meta.xml, zipping) gives the same result every time for the same
+commit, path and options, so the first job to build one for a Version stores
+it and later jobs deploy the stored zip instead of rebuilding it.
+"""
+
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+
+from cumulusci.core.utils import process_bool_arg
+from cumulusci.tasks.salesforce import Deploy
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+DEPLOY_ARTIFACT_KEY = "deploy-artifact:{version}:{commit_sha}:{digest}"
+
+# The private Deploy methods CachedPackageZipMixin overrides or calls, with the
+# parameters they take in the CumulusCI version this was written against. A
+# Deploy class whose methods don't match is run uncached:
+DEPLOY_HOOKS = {
+    "_get_package_zip": ["self", "path"],
+    "_has_namespaced_package": ["self", "ns"],
+    "_is_namespaced_org": ["self", "ns"],
+}
+
+
+class CachedPackageZipMixin:
+    """Look up the package zip a Deploy task builds in the artifact cache."""
+
+    artifact_version_id = None
+    artifact_commit_sha = None
+    artifact_repo_root = None
+
+    def _get_package_zip(self, path):
+        key = self._artifact_key(path)
+        if key is None:
+            return super()._get_package_zip(path)
+
+        package_zip = cache.get(key)
+        reused = package_zip is not None
+        if not reused:
+            package_zip = super()._get_package_zip(path)
+            # Collision checks return a map of existing metadata, not a zip:
+            if (
+                isinstance(package_zip, str)
+                and len(package_zip) <= settings.DEPLOY_ARTIFACT_MAX_SIZE
+            ):
+                cache.set(key, package_zip, settings.DEPLOY_ARTIFACT_CACHE_TIMEOUT)
+        logger.info(
+            f"{'Reused' if reused else 'Built'} deploy package for {path}",
+            extra={
+                "context": {
+                    "event": "deploy_artifact",
+                    "version": self.artifact_version_id,
+                    "path": path,
+                    "reused": reused,
+                }
+            },
+        )
+        return package_zip
+
+    def _artifact_key(self, path):
+        """
+        The cache key for the package built from path, or None if the package
+        can't be cached: it is missing, or comes from an included source rather
+        than the checked-out commit.
+        """
+        abs_path = os.path.abspath(path)
+        repo_root = self.artifact_repo_root
+        if not os.path.exists(abs_path) or (
+            os.path.commonpath([abs_path, repo_root]) != repo_root
+        ):
+            return None
+        if process_bool_arg(self.options.get("collision_check") or False):
+            return None
+
+        # Mirror the options Deploy._get_package_zip() builds the package with,
+        # including the ones that depend on the target org:
+        namespace = self.options["namespace_inject"]
+        options = {
+            **self.options,
+            "path": os.path.relpath(abs_path, repo_root),
+            "clean_meta_xml": process_bool_arg(
+                self.options.get("clean_meta_xml", True)
+            ),
+            "unmanaged": not self._has_namespaced_package(namespace),
+            "namespaced_org": self._is_namespaced_org(namespace),
+        }
+        digest = hashlib.sha256(
+            json.dumps(
+                {"task": self.__class__.__qualname__, "options": options},
+                sort_keys=True,
+                default=str,
+            ).encode()
+        ).hexdigest()
+        return DEPLOY_ARTIFACT_KEY.format(
+            version=self.artifact_version_id,
+            commit_sha=self.artifact_commit_sha,
+            digest=digest,
+        )
+
+
+def with_artifact_cache(task_class, *, version, commit_sha, repo_root):
+    """
+    Return task_class, or for Deploy tasks a subclass of it that reuses
+    packages built from the same commit of the same Version.
+
+    commit_sha must be the SHA that was actually checked out into repo_root.
+    """
+    if (
+        not settings.DEPLOY_ARTIFACT_CACHE_TIMEOUT
+        or not commit_sha
+        or not issubclass(task_class, Deploy)
+        or not supports_artifact_cache(task_class)
+    ):
+        return task_class
+    return type(
+        task_class.__name__,
+        (CachedPackageZipMixin, task_class),
+        {
+            "__qualname__": task_class.__qualname__,
+            "__module__": task_class.__module__,
+            "artifact_version_id": str(version.id),
+            "artifact_commit_sha": commit_sha,
+            "artifact_repo_root": os.path.abspath(repo_root),
+        },
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def supports_artifact_cache(task_class):
+    """Whether task_class still has the Deploy internals the cache relies on."""
+    for name, params in DEPLOY_HOOKS.items():
+        method = getattr(task_class, name, None)
+        if not callable(method) or _parameters(method) != params:
+            logger.warning(
+                f"Not caching packages for {task_class.__qualname__}: "
+                f"{name}() has changed",
+                extra={"context": {"event": "deploy_artifact", "hook": name}},
+            )
+            return False
+    return True
+
+
+def _parameters(method):
+    return list(inspect.signature(method).parameters)
+
+
+def evict_deploy_artifacts(version_id):
+    """Drop every package cached for a Version."""
+    cache.delete_pattern(
+        DEPLOY_ARTIFACT_KEY.format(version=version_id, commit_sha="*", digest="*")
+    )
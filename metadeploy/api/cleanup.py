@@ -1,31 +1,108 @@
+import gzip
+import json
+import logging
+import tempfile
+import time
 from datetime import timedelta
 
-from allauth.socialaccount.models import SocialToken
+from allauth.socialaccount.models import SocialAccount, SocialToken
 from asgiref.sync import async_to_sync
 from django.conf import settings
+from django.core import serializers
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.db.models.functions import TruncMonth
 from django.utils import timezone
 from rest_framework.authtoken.models import Token
 
 from .models import Job, PreflightResult, User
-from .push import user_token_expired
+from .push import user_tokens_expired
+
+logger = logging.getLogger(__name__)
 
 
 def cleanup_user_data():
     """Remove old records with PII and other sensitive data."""
+    timings = {}
+
+    def timed(name, fn, *args):
+        start = time.monotonic()
+        count = fn(*args)
+        timings[f"{name}_ms"] = round((time.monotonic() - start) * 1000)
+        timings[f"{name}_count"] = count
+
     # fix status of dead jobs that got left as started
-    fix_dead_jobs_status()
+    timed("fix_dead_jobs_status", fix_dead_jobs_status)
 
     # remove oauth tokens after 10 minutes of inactivity
-    expire_oauth_tokens()
+    timed("expire_oauth_tokens", expire_oauth_tokens)
 
     # remove users after 30 days
-    delete_old_users()
+    timed("delete_old_users", delete_old_users)
 
     # remove job exceptions after 90 days
-    clear_old_exceptions()
+    timed("clear_old_exceptions", clear_old_exceptions)
 
     # expire API access tokens after specified number of days
-    expire_api_access_tokens_older_than_days(settings.API_TOKEN_EXPIRE_AFTER_DAYS)
+    timed(
+        "expire_api_access_tokens",
+        expire_api_access_tokens_older_than_days,
+        settings.API_TOKEN_EXPIRE_AFTER_DAYS,
+    )
+
+    logger.info(
+        "cleanup_user_data finished",
+        extra={"context": {"event": "cleanup_user_data", **timings}},
+    )
+
+
+def _chunks(items):
+    size = settings.CLEANUP_CHUNK_SIZE
+    for start in range(0, len(items), size):
+        end = start + size
+        yield items[start:end]
+
+
+def _update_in_chunks(queryset, **values):
+    """
+    Update the rows matched by queryset in bounded batches. The update must take
+    rows out of the queryset, or this won't terminate.
+
+    Returns the number of rows updated.
+    """
+    total = 0
+    size = settings.CLEANUP_CHUNK_SIZE
+    while True:
+        ids = list(queryset.order_by().values_list("pk", flat=True)[:size])
+        if not ids:
+            return total
+        total += queryset.model.objects.filter(pk__in=ids).update(**values)
+
+
+def _delete_in_chunks(queryset):
+    """
+    Delete the rows matched by queryset (and whatever cascades from them) in
+    bounded batches.
+
+    Returns the number of rows of the queryset's own model deleted.
+    """
+    total = 0
+    size = settings.CLEANUP_CHUNK_SIZE
+    queryset = queryset.order_by("pk")
+    last_pk = None
+    while True:
+        # Page through by primary key, so only one batch of ids is in memory:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        ids = list(page.values_list("pk", flat=True)[:size])
+        if not ids:
+            return total
+        last_pk = ids[-1]
+        with transaction.atomic():
+            _, deleted = queryset.model.objects.filter(pk__in=ids).delete()
+        total += deleted.get(queryset.model._meta.label, 0)
 
 
 def expire_oauth_tokens():
@@ -34,29 +111,48 @@ def expire_oauth_tokens():
     Also clear the extra_data of the associated SocialAccount, unless it's a staff user.
 
     Exception: if there is a job or preflight that started in the last day.
+
+    Returns the number of tokens expired.
     """
     token_lifetime_ago = timezone.now() - timedelta(
         minutes=settings.TOKEN_LIFETIME_MINUTES
     )
     day_ago = timezone.now() - timedelta(days=1)
-    for token in SocialToken.objects.filter(
-        account__last_login__lte=token_lifetime_ago
-    ):
-        user = token.account.user
-        has_running_jobs = (
-            user.job_set.filter(
-                status=Job.Status.started, created_at__gt=day_ago
-            ).exists()
-            or user.preflightresult_set.filter(
-                status=PreflightResult.Status.started, created_at__gt=day_ago
-            ).exists()
-        )
-        if not has_running_jobs:
-            token.delete()
-            if not user.is_staff:
-                token.account.extra_data = {}
-                token.account.save()
-            async_to_sync(user_token_expired)(user)
+    running_jobs = Job.objects.filter(
+        user=OuterRef("account__user"),
+        status=Job.Status.started,
+        created_at__gt=day_ago,
+    )
+    running_preflights = PreflightResult.objects.filter(
+        user=OuterRef("account__user"),
+        status=PreflightResult.Status.started,
+        created_at__gt=day_ago,
+    )
+    expired = (
+        SocialToken.objects.filter(account__last_login__lte=token_lifetime_ago)
+        .exclude(Exists(running_jobs))
+        .exclude(Exists(running_preflights))
+        .order_by("id")
+        .values_list("id", "account_id", "account__user__id", "account__user__is_staff")
+    )
+
+    total = 0
+    last_id = 0
+    while True:
+        chunk = list(expired.filter(id__gt=last_id)[: settings.CLEANUP_CHUNK_SIZE])
+        if not chunk:
+            return total
+        last_id = chunk[-1][0]
+        total += len(chunk)
+        user_ids = {user_id for _, _, user_id, _ in chunk}
+        with transaction.atomic():
+            SocialToken.objects.filter(id__in=[id for id, *_ in chunk]).delete()
+            SocialAccount.objects.filter(
+                id__in=[
+                    account_id for _, account_id, _, is_staff in chunk if not is_staff
+                ]
+            ).update(extra_data={})
+        async_to_sync(user_tokens_expired)(sorted(str(id) for id in user_ids))
 
 
 def delete_old_users():
@@ -65,7 +161,9 @@ def delete_old_users():
     Deletes users who have not logged in for 30 days, unless they have the is_staff flag.
     """
     month_ago = timezone.now() - timedelta(days=30)
-    User.objects.filter(is_staff=False, last_login__lte=month_ago).delete()
+    return _delete_in_chunks(
+        User.objects.filter(is_staff=False, last_login__lte=month_ago)
+    )
 
 
 def clear_old_exceptions():
@@ -74,35 +172,176 @@ def clear_old_exceptions():
     (This field may contain customer metadata such as custom schema names from the org.)
     """
     ninety_days_ago = timezone.now() - timedelta(days=90)
-    Job.objects.filter(created_at__lte=ninety_days_ago, exception__isnull=False).update(
-        exception=None
+    return _update_in_chunks(
+        Job.objects.filter(created_at__lte=ninety_days_ago, exception__isnull=False),
+        exception=None,
+    ) + _update_in_chunks(
+        PreflightResult.objects.filter(
+            created_at__lte=ninety_days_ago, exception__isnull=False
+        ),
+        exception=None,
     )
-    PreflightResult.objects.filter(
-        created_at__lte=ninety_days_ago, exception__isnull=False
-    ).update(exception=None)
 
 
 def fix_dead_jobs_status():
     """Fix the status of any jobs which were started but are past their timeout.
 
     Jobs are supposed to get their status updated if they die, but that can fail.
+    Those with resumes left are handed back to the enqueuer to rerun their
+    remaining steps; the rest are canceled.
     """
     now = timezone.now()
     timeout_seconds = settings.RQ_QUEUES["default"]["DEFAULT_TIMEOUT"] + 120
     timeout_ago = now - timedelta(seconds=timeout_seconds)
+    dead_jobs = Job.objects.filter(status="started", enqueued_at__lte=timeout_ago)
+    resumed = _update_in_chunks(
+        dead_jobs.filter(resume_count__lt=settings.JOB_MAX_RESUMES),
+        enqueued_at=None,
+        job_id=None,
+        resume_count=F("resume_count") + 1,
+    )
     canceled_values = {
         "status": "canceled",
         "canceled_at": now,
         "exception": "The installation job was interrupted. Please retry the installation.",
     }
-    Job.objects.filter(status="started", enqueued_at__lte=timeout_ago).update(
-        **canceled_values
-    )
+    return resumed + _update_in_chunks(dead_jobs, **canceled_values)
 
 
 def expire_api_access_tokens_older_than_days(days: int):
     """Delete any Admin API access tokens older than days given."""
     obsolete_date = timezone.now() - timedelta(days=days)
-    expired_tokens = Token.objects.filter(created__lte=obsolete_date)
-    if expired_tokens:
-        expired_tokens.delete()
+    return _delete_in_chunks(Token.objects.filter(created__lte=obsolete_date))
+
+
+# Archives keep what ran and how it went, but not who ran it against which org,
+# nor anything logged from the org:
+ARCHIVE_OMITTED_FIELDS = ("user", "org_id", "log", "exception")
+ARCHIVE_OMITTED_OUTCOME_KEYS = ("message", "logs")
+
+
+def archive_old_results(*, storage=None, days=None, dry_run=False):
+    """
+    Move finished Jobs and PreflightResults created more than ``days`` (default
+    RESULT_ARCHIVE_AFTER_DAYS) ago out of the database, into one gzipped JSON
+    Lines file per model per month of ``created_at`` under RESULT_ARCHIVE_PREFIX
+    in ``storage`` (default: the default file storage, which is S3 when
+    configured).
+
+    Rows are only deleted once their archive is confirmed in storage, and never
+    when storage is the local filesystem, which goes away with a Heroku dyno.
+
+    Returns a list of (name, count) for each archive written.
+    """
+    storage = default_storage if storage is None else storage
+    durable = not isinstance(storage, FileSystemStorage)
+    days = settings.RESULT_ARCHIVE_AFTER_DAYS if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    run = timezone.now().strftime("%Y%m%dT%H%M%S")
+    archives = []
+    for model, prefetch in (
+        (Job, ("steps", "step_results")),
+        (PreflightResult, ()),
+    ):
+        queryset = model.objects.filter(created_at__lt=cutoff).exclude(
+            status=model.Status.started
+        )
+        months = (
+            queryset.annotate(month=TruncMonth("created_at"))
+            .order_by("month")
+            .values_list("month", flat=True)
+            .distinct()
+        )
+        for month in months:
+            next_month = (month + timedelta(days=32)).replace(day=1)
+            ids = list(
+                queryset.filter(created_at__gte=month, created_at__lt=next_month)
+                .order_by("pk")
+                .values_list("pk", flat=True)
+            )
+            name = (
+                f"{settings.RESULT_ARCHIVE_PREFIX}"
+                f"{model._meta.model_name}-{month:%Y-%m}-{run}.jsonl.gz"
+            )
+            if dry_run:
+                archives.append((name, len(ids)))
+                continue
+
+            with tempfile.TemporaryFile() as f:
+                with gzip.open(f, "wt", encoding="utf-8") as archive:
+                    for chunk in _chunks(ids):
+                        instances = (
+                            model.objects.filter(pk__in=chunk)
+                            .order_by("pk")
+                            .prefetch_related(*prefetch)
+                        )
+                        for instance in instances:
+                            record = _archive_record(instance)
+                            archive.write(
+                                json.dumps(record, cls=DjangoJSONEncoder) + "\n"
+                            )
+                size = f.tell()
+                f.seek(0)
+                name = storage.save(name, File(f))
+            archives.append((name, len(ids)))
+            if not storage.exists(name) or storage.size(name) != size:
+                raise OSError(f"Archive {name} was not stored intact.")
+
+            if durable:
+                for chunk in _chunks(ids):
+                    with transaction.atomic():
+                        model.objects.filter(pk__in=chunk).delete()
+            else:
+                logger.warning(
+                    f"Not deleting archived {model._meta.verbose_name_plural}: "
+                    f"{name} is on the local filesystem"
+                )
+            logger.info(
+                f"Archived {len(ids)} {model._meta.verbose_name_plural} to {name}",
+                extra={
+                    "context": {
+                        "event": "archive_old_results",
+                        "model": model._meta.model_name,
+                        "month": f"{month:%Y-%m}",
+                        "count": len(ids),
+                        "deleted": durable,
+                    }
+                },
+            )
+    return archives
+
+
+def _redact_outcomes(results):
+    return {
+        step_key: [
+            {
+                key: value
+                for key, value in outcome.items()
+                if key not in ARCHIVE_OMITTED_OUTCOME_KEYS
+            }
+            for outcome in outcomes
+            if isinstance(outcome, dict)
+        ]
+        for step_key, outcomes in results.items()
+        if isinstance(outcomes, list)
+    }
+
+
+def _archive_record(instance):
+    """Serialize a Job, together with its StepResults, or a PreflightResult."""
+    step_results = instance.step_results.all() if isinstance(instance, Job) else []
+    record, *step_results = serializers.serialize("python", [instance, *step_results])
+    fields = record["fields"]
+    for name in ARCHIVE_OMITTED_FIELDS:
+        fields.pop(name, None)
+    fields["results"] = _redact_outcomes(fields["results"])
+    if isinstance(instance, Job):
+        record["step_results"] = [
+            {
+                key: value
+                for key, value in step_result["fields"].items()
+                if key not in ARCHIVE_OMITTED_OUTCOME_KEYS
+            }
+            for step_result in step_results
+        ]
+    return record
@@ -1,4 +1,6 @@
 import logging
+import threading
+import time
 from io import StringIO
 
 import bleach
@@ -6,6 +8,7 @@ import coloredlogs
 from cumulusci.core.flowrunner import FlowCallback
 from django.core.cache import cache
 
+from .. import tracing
 from .belvedere_utils import obscure_salesforce_log
 from .constants import ERROR, OK, REDIS_JOB_CANCEL_KEY
 from .result_spool_logger import ResultSpoolLogger
@@ -20,13 +23,42 @@ class StopFlowException(Exception):
 class BasicFlowCallback(FlowCallback):
     def __init__(self, ctx):
         self.context = ctx  # will be either a preflight or a job...
+        self.handlers = ()
 
-    def _get_step_id(self, **filters):
+    def start_capture(self, *handlers):
+        """
+        Attach ``handlers`` to the cumulusci logger for the duration of this flow.
+
+        They only accept records logged from the thread running the flow, so a
+        worker running flows side by side never mixes one flow's log into another.
+        """
+        thread_id = threading.get_ident()
+        self.logger = logging.getLogger("cumulusci")
+        for handler in handlers:
+            handler.addFilter(lambda record: record.thread == thread_id)
+            self.logger.addHandler(handler)
+        self.logger.setLevel(logging.DEBUG)
+        self.handlers = handlers
+        return self.logger
+
+    def stop_capture(self):
+        """Detach the flow's log handlers; safe to call more than once."""
+        for handler in self.handlers:
+            self.logger.removeHandler(handler)
+        self.handlers = ()
+
+    def _get_step(self, **filters):
         try:
-            return str(self.context.plan.steps.filter(**filters).first().id)
+            step = self.context.plan.steps.filter(**filters).first()
         except AttributeError:
+            step = None
+        if step is None:
             logger.error(f"Unknown task {filters} for {self.context}")
-            return None
+        return step
+
+    def _get_step_id(self, **filters):
+        step = self._get_step(**filters)
+        return None if step is None else str(step.id)
 
     def pre_task(self, step):
         """
@@ -34,6 +66,44 @@ class BasicFlowCallback(FlowCallback):
         """
         if self._flow_canceled():
             raise StopFlowException("Job canceled.")
+        self.step_started_at = time.monotonic()
+        self.step_span = tracing.start_span(
+            f"step {step.step_num}", task_name=step.task_name
+        )
+
+    def _end_step_span(self, result):
+        span = getattr(self, "step_span", None)
+        self.step_span = None
+        if span is not None:
+            tracing.end_span(span, error=result.exception)
+
+    def _step_duration(self):
+        """Seconds since the current task started, if it was timed."""
+        started_at = getattr(self, "step_started_at", None)
+        self.step_started_at = None
+        return None if started_at is None else time.monotonic() - started_at
+
+    def _log_step_timing(self, step, *, task_class, status, duration):
+        if duration is None:
+            return
+        plan = self.context.plan
+        logger.info(
+            f"{step.task_name} took {duration:.1f}s",
+            extra={
+                "context": {
+                    "event": "step_timing",
+                    "result": f"{self.context.__class__.__name__}:{self.context.id}",
+                    "task_class": task_class,
+                    "task_name": step.task_name,
+                    "step_num": step.step_num,
+                    "plan": plan.slug,
+                    "version": plan.version.label,
+                    "product": plan.version.product.slug,
+                    "status": status,
+                    "duration": round(duration, 3),
+                }
+            },
+        )
 
     def _flow_canceled(self):
         return cache.get(REDIS_JOB_CANCEL_KEY.format(id=self.context.id))
@@ -41,22 +111,16 @@ class BasicFlowCallback(FlowCallback):
 
 class JobFlowCallback(BasicFlowCallback):
     def pre_flow(self, coordinator):
-        logger = logging.getLogger("cumulusci")
         self.string_buffer = StringIO()
 
         self.handler = logging.StreamHandler(stream=self.string_buffer)
         self.handler.setFormatter(logging.Formatter())
-        logger.addHandler(self.handler)
 
         self.result_handler = ResultSpoolLogger(result=self.context)
         self.result_handler.setFormatter(
             coloredlogs.ColoredFormatter(fmt="%(asctime)s %(message)s")
         )
-        logger.addHandler(self.result_handler)
-
-        logger.setLevel(logging.DEBUG)
-        self.logger = logger
-        return self.logger
+        return self.start_capture(self.handler, self.result_handler)
 
     def post_flow(self, coordinator):
         """
@@ -64,33 +128,47 @@ class JobFlowCallback(BasicFlowCallback):
         """
         from .models import ScratchOrg
 
-        config = coordinator.org_config
-        is_scratch = ScratchOrg.objects.filter(org_id=config.org_id).exists()
-        if is_scratch:
-            config.salesforce_client.restful(
-                f"sobjects/User/{config.user_id}/password", method="DELETE"
-            )  # Deleting the password forces a password reset email
-
-        self.logger.removeHandler(self.handler)
-        self.logger.removeHandler(self.result_handler)
+        try:
+            config = coordinator.org_config
+            is_scratch = ScratchOrg.objects.filter(org_id=config.org_id).exists()
+            if is_scratch:
+                config.salesforce_client.restful(
+                    f"sobjects/User/{config.user_id}/password", method="DELETE"
+                )  # Deleting the password forces a password reset email
+        finally:
+            self.stop_capture()
 
     def pre_task(self, step):
         super().pre_task(step)
         self.set_current_key_by_step(step)
 
     def post_task(self, step, result):
-        job_id = self._get_step_id(step_num=step.step_num)
-        if job_id:
-            if job_id not in self.context.results:
-                self.context.results[job_id] = [{}]
+        duration = self._step_duration()
+        self._end_step_span(result)
+        plan_step = self._get_step(step_num=step.step_num)
+        if plan_step:
             if result.exception:
-                self.context.results[job_id][0].update(
-                    {"status": ERROR, "message": bleach.clean(str(result.exception))}
-                )
+                status = ERROR
+                message = bleach.clean(str(result.exception))
             else:
-                self.context.results[job_id][0].update({"status": OK})
+                status, message = OK, None
+            self.context.record_step_result(
+                str(plan_step.id),
+                status=status,
+                message=message,
+                duration=duration,
+                task_class=plan_step.task_class,
+            )
             self.context.log = obscure_salesforce_log(self.string_buffer.getvalue())
+            self.context.update_result_counts()
             self.context.save()
+            self.context.push_results_changed()
+            self._log_step_timing(
+                step,
+                task_class=plan_step.task_class,
+                status=status,
+                duration=duration,
+            )
         self.set_current_key_by_step(None)
 
     def set_current_key_by_step(self, step):
@@ -103,11 +181,9 @@ class JobFlowCallback(BasicFlowCallback):
 class PreflightFlowCallback(BasicFlowCallback):
     def pre_flow(self, coordinator):
         # capture cumulusci logs into buffer
-        self.logger = logging.getLogger("cumulusci")
         self.string_buffer = StringIO()
         self.handler = logging.StreamHandler(stream=self.string_buffer)
-        self.logger.addHandler(self.handler)
-        self.logger.setLevel(logging.DEBUG)
+        self.start_capture(self.handler)
 
     def post_flow(self, coordinator):
         """
@@ -116,7 +192,7 @@ class PreflightFlowCallback(BasicFlowCallback):
         Also sanitize them for display on the frontend.
         """
         # stop capturing logs and store in the PreflightResult
-        self.logger.removeHandler(self.handler)
+        self.stop_capture()
         self.context.log = obscure_salesforce_log(self.string_buffer.getvalue())
 
         results = coordinator.preflight_results
@@ -141,5 +217,12 @@ class PreflightFlowCallback(BasicFlowCallback):
         so that it can be picked up and recorded
         by the finalize_result context manager
         """
+        self._end_step_span(result)
+        self._log_step_timing(
+            step,
+            task_class=step.task_config.get("class_path", ""),
+            status=ERROR if result.exception else OK,
+            duration=self._step_duration(),
+        )
         if result.exception:
             raise result.exception
@@ -5,12 +5,15 @@ GitHub utilities
 
 import contextlib
 import os
+import re
 
 from cumulusci.core.github import get_github_api_for_repo
-from cumulusci.utils import download_extract_github, temporary_dir
+from cumulusci.utils import download_extract_github_from_repo, temporary_dir
 
 from metadeploy.api.models import Product
 
+SHA_RE = re.compile(r"[0-9a-f]{40}")
+
 
 @contextlib.contextmanager
 def local_github_checkout(repo_owner, repo_name, commit_ish=None):
@@ -19,11 +22,29 @@ def local_github_checkout(repo_owner, repo_name, commit_ish=None):
         os.mkdir(".git")
         repo_url_ending = f"/{repo_owner}/{repo_name}"
         product = Product.objects.get(repo_url__endswith=repo_url_ending)
-        repo = get_github_api_for_repo(None, product.repo_url)
+        gh = get_github_api_for_repo(None, product.repo_url)
+        repo = gh.repository(repo_owner, repo_name)
         if commit_ish is None:
-            commit_ish = repo.repository(repo_owner, repo_name).default_branch
+            commit_ish = repo.default_branch
+
+        # Pin the ref to a commit up front, so the archive and the recorded
+        # SHA can't disagree if the branch moves while we download. Record it
+        # the way a detached checkout would:
+        sha = repo.commit(commit_ish).sha
+        with open(os.path.join(".git", "HEAD"), "w") as f:
+            f.write(f"{sha}\n")
 
-        zip_file = download_extract_github(repo, repo_owner, repo_name, ref=commit_ish)
+        zip_file = download_extract_github_from_repo(repo, ref=sha)
         zip_file.extractall(repo_root)
 
         yield repo_root
+
+
+def get_checkout_sha(repo_root):
+    """The commit SHA of a checkout made by local_github_checkout, if known."""
+    try:
+        with open(os.path.join(repo_root, ".git", "HEAD")) as f:
+            head = f.read().strip()
+    except OSError:
+        return None
+    return head if SHA_RE.fullmatch(head) else None
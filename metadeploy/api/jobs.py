@@ -18,25 +18,42 @@ import os
 import sys
 import traceback
 import uuid
+from bisect import bisect_right
 from datetime import timedelta
 from typing import Union
 
 from asgiref.sync import async_to_sync
-from cumulusci.core.config import OrgConfig, ServiceConfig
+from cumulusci.core.config import OrgConfig, ServiceConfig, UniversalConfig
+from cumulusci.core.utils import import_class
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import transaction
+from django.db.models import Count, Sum
 from django.utils import timezone
 from django_rq import job as django_rq_job
+from rq import get_current_job
 from rq.exceptions import ShutDownImminentException
 from rq.worker import StopRequested
 
+from .. import instrumentation, tracing
+from .artifacts import with_artifact_cache
 from .cci_configs import MetaDeployCCI, extract_user_and_repo
 from .cleanup import cleanup_user_data
 from .flows import StopFlowException
-from .github import local_github_checkout
-from .models import ORG_TYPES, Job, Plan, PreflightResult, ScratchOrg
-from .push import job_started, preflight_started, report_error
+from .github import get_checkout_sha, local_github_checkout
+from .models import (
+    ORG_TYPES,
+    Job,
+    Plan,
+    PlanDurationStats,
+    PreflightResult,
+    ScratchOrg,
+    Step,
+    StepResult,
+    percentile,
+)
+from .push import job_started, preflight_started, preflights_expired, report_error
+from .salesforce import cache_org_config
 from .salesforce import create_scratch_org as create_scratch_org_on_sf
 from .salesforce import delete_scratch_org as delete_scratch_org_on_sf
 
@@ -45,9 +62,12 @@ User = get_user_model()
 sync_report_error = async_to_sync(report_error)
 
 
+# Keep failed jobs for 7 days:
+FAILURE_TTL = 7 * 3600 * 24
+
+
 def job(*args, **kw):
-    # keep failed jobs for 7 days
-    kw["failure_ttl"] = 7 * 3600 * 24
+    kw["failure_ttl"] = FAILURE_TTL
     return django_rq_job(*args, **kw)
 
 
@@ -63,6 +83,7 @@ class JobLogStatus(str, enum.Enum):
     ERROR = "error"  # job threw an exception and failed
     CANCELED = "canceled"  # by admins
     TERMINATED = "terminated"  # by Heroku
+    RESUMED = "resumed"  # terminated by Heroku, and will rerun its remaining steps
 
 
 @contextlib.contextmanager
@@ -91,8 +112,14 @@ def finalize_result(result: Union[Job, PreflightResult]):
         # When an RQ worker gets a SIGTERM, it will initiate a warm shutdown,
         # trying to wrap up existing tasks and then raising a
         # ShutDownImminentException or StopRequested exception.
-        # So we want to mark any job that's not done by then as canceled
-        # by catching that exception as it propagates back up.
+        # Jobs are handed back to the enqueuer to resume from their last completed
+        # step, while they have resumes left. Anything else that's not done by
+        # then is marked as canceled as the exception propagates back up.
+        if isinstance(result, Job) and result.prepare_resume():
+            end_time = timezone.now()
+            log_status = JobLogStatus.RESUMED
+            log_msg = f"Job {result.id} interrupted by dyno restart, will resume"
+            raise
         result.status = result.Status.canceled
         result.canceled_at = timezone.now()
         end_time = result.canceled_at
@@ -122,7 +149,7 @@ def finalize_result(result: Union[Job, PreflightResult]):
             result.exception += "\n" + e.response.text
         raise
     finally:
-        duration = (end_time - start_time).seconds
+        duration = (end_time - start_time).total_seconds()
 
         if result.is_release_test:
             job_type = JobType.TEST_JOB
@@ -133,6 +160,7 @@ def finalize_result(result: Union[Job, PreflightResult]):
                 job_type = JobType.JOB
 
         context = f"{result.plan.version.product.slug}/{result.plan.version.label}/{result.plan.slug}"
+        stats = instrumentation.current()
         logger.info(
             log_msg,
             extra={
@@ -141,10 +169,13 @@ def finalize_result(result: Union[Job, PreflightResult]):
                     "context": context,
                     "status": f"{log_status}",
                     "duration": duration,
+                    **(stats.as_context() if stats is not None else {}),
                 }
             },
         )
         result.save()
+        if isinstance(result, Job) and result.status == Job.Status.complete:
+            PlanDurationStats.record_job(result)
 
 
 @contextlib.contextmanager
@@ -167,6 +198,28 @@ def delete_org_on_error(scratch_org):
         raise
 
 
+def preload_job_modules():
+    """
+    Load the CumulusCI universal config and import every task class used by a
+    step, so that workhorses forked afterwards start with them in memory. Task
+    classes that only exist in a product's repository can't be imported yet and
+    are left for the job to load.
+
+    Returns the number of task classes imported.
+    """
+    UniversalConfig()
+    imported = 0
+    task_classes = Step.objects.order_by().values_list("task_class", flat=True)
+    for task_class in task_classes.distinct():
+        try:
+            import_class(task_class)
+        except Exception:
+            logger.debug(f"Could not preload {task_class}")
+        else:
+            imported += 1
+    return imported
+
+
 @contextlib.contextmanager
 def prepend_python_path(path):
     prev_path = sys.path.copy()
@@ -200,6 +253,9 @@ def run_flows(
         result_id (int): the PK of the result instance to get.
     """
     result = result_class.objects.get(pk=result_id)
+    if is_superseded(result):
+        logger.warning(f"Not running {result_class.__name__} {result.id} again")
+        return
     scratch_org = None
     if not result.user:
         # This means we're in a ScratchOrg.
@@ -207,6 +263,9 @@ def run_flows(
 
     repo_url = plan.version.product.repo_url
     commit_ish = plan.commit_ish or plan.version.commit_ish
+    if isinstance(result, Job) and result.commit_sha:
+        # Resumed jobs and retries run from the commit the job started from
+        commit_ish = result.commit_sha
 
     with contextlib.ExitStack() as stack:
         stack.enter_context(finalize_result(result))
@@ -214,12 +273,24 @@ def run_flows(
             stack.enter_context(report_errors_to(result.user))
         if scratch_org:
             stack.enter_context(delete_org_on_error(scratch_org))
+        stack.enter_context(
+            tracing.span(
+                f"run {result_class.__name__}",
+                result=result.id,
+                plan=plan.slug,
+                scratch_org=scratch_org is not None,
+            )
+        )
 
         # Let's clone the repo locally:
         repo_user, repo_name = extract_user_and_repo(repo_url)
-        repo_root = stack.enter_context(
-            local_github_checkout(repo_user, repo_name, commit_ish)
-        )
+        with tracing.span("checkout", repo=repo_url, commit_ish=commit_ish):
+            repo_root = stack.enter_context(
+                local_github_checkout(repo_user, repo_name, commit_ish)
+            )
+        checkout_sha = get_checkout_sha(repo_root)
+        if isinstance(result, Job) and not result.commit_sha:
+            result.commit_sha = checkout_sha or ""
 
         # Get cwd into Python path, so that the tasks below can import
         # from the checked-out repo:
@@ -231,27 +302,28 @@ def run_flows(
         ctx = MetaDeployCCI(repo_root=repo_root, plan=plan)
 
         current_org = "current_org"
-        if settings.METADEPLOY_FAST_FORWARD:  # pragma: no cover
-            org_config = OrgConfig({}, name=current_org, keychain=ctx.keychain)
-        elif scratch_org:
-            org_config = scratch_org.get_refreshed_org_config(
-                org_name=current_org, keychain=ctx.keychain
-            )
-        else:
-            token, token_secret = result.user.token
-            org_config = OrgConfig(
-                {
-                    "access_token": token,
-                    "instance_url": result.user.instance_url,
-                    "refresh_token": token_secret,
-                    "username": result.user.sf_username,
-                    # 'id' is used by CumulusCI to pick the right 'aud' for JWT auth
-                    "id": result.user.oauth_id,
-                },
-                current_org,
-                keychain=ctx.keychain,
-            )
-        org_config.save()
+        with tracing.span("org config"):
+            if settings.METADEPLOY_FAST_FORWARD:  # pragma: no cover
+                org_config = OrgConfig({}, name=current_org, keychain=ctx.keychain)
+            elif scratch_org:
+                org_config = scratch_org.get_refreshed_org_config(
+                    org_name=current_org, keychain=ctx.keychain
+                )
+            else:
+                token, token_secret = result.user.token
+                org_config = OrgConfig(
+                    {
+                        "access_token": token,
+                        "instance_url": result.user.instance_url,
+                        "refresh_token": token_secret,
+                        "username": result.user.sf_username,
+                        # 'id' is used by CumulusCI to pick the right 'aud' for JWT auth
+                        "id": result.user.oauth_id,
+                    },
+                    current_org,
+                    keychain=ctx.keychain,
+                )
+            org_config.save()
 
         # Set up the connected_app:
         connected_app = ServiceConfig(
@@ -273,9 +345,35 @@ def run_flows(
             )
             for step in plan.steps.all()
         ]
+        if isinstance(result, Job):
+            for spec in steps:
+                spec.task_class = with_artifact_cache(
+                    spec.task_class,
+                    version=plan.version,
+                    commit_sha=checkout_sha,
+                    repo_root=repo_root,
+                )
         org = ctx.keychain.get_org(current_org)
         if not settings.METADEPLOY_FAST_FORWARD:
-            result.run(ctx, plan, steps, org)
+            with tracing.span("flow"):
+                result.run(ctx, plan, steps, org)
+
+
+def is_superseded(result):
+    """
+    Whether this run of a job should not go ahead: it is no longer running, or it
+    has since been handed to a different rq job (e.g. it was resumed while this
+    one was still queued).
+    """
+    if not isinstance(result, Job):
+        return False
+    rq_job = get_current_job()
+    handed_off = (
+        rq_job is not None
+        and result.job_id is not None
+        and str(result.job_id) != rq_job.id
+    )
+    return result.status != Job.Status.started or handed_off
 
 
 run_flows_job = job(run_flows)
@@ -284,18 +382,65 @@ run_flows_job = job(run_flows)
 def enqueuer():
     logger.debug("Enqueuer live")
     for j in Job.objects.filter(enqueued_at=None):
-        j.invalidate_related_preflight()
-        rq_job = run_flows_job.delay(
-            plan=j.plan,
-            skip_steps=j.skip_steps(),
-            result_class=Job,
-            result_id=j.id,
+        # Claim the job before enqueueing it, so that it is enqueued once even if
+        # enqueuers overlap, and the worker can tell it is the job's current run:
+        rq_job_id = uuid.uuid4()
+        claimed = Job.objects.filter(pk=j.pk, enqueued_at=None).update(
+            job_id=rq_job_id, enqueued_at=timezone.now()
         )
-        j.job_id = rq_job.id
+        if not claimed:
+            continue
+        j.refresh_from_db()
+        if j.resume_count:
+            log_resume(j)
+        # Carry on the trace of the request that created the job:
+        with tracing.span("enqueue", context={"trace_id": j.trace_id}, job=j.id):
+            j.invalidate_related_preflight()
+            try:
+                rq_job = run_flows_job.delay(
+                    plan=j.plan,
+                    skip_steps=j.skip_steps(),
+                    result_class=Job,
+                    result_id=j.id,
+                    job_id=str(rq_job_id),
+                )
+            except Exception:
+                # Release the claim, so the next enqueuer run picks the job up
+                # again instead of it waiting forever on an rq job that was never
+                # enqueued:
+                Job.objects.filter(pk=j.pk, job_id=rq_job_id).update(
+                    job_id=None, enqueued_at=None
+                )
+                logger.exception(
+                    f"Failed to enqueue Job {j.id}",
+                    extra={
+                        "context": {"event": "job_enqueue_failed", "job": str(j.id)}
+                    },
+                )
+                raise
         j.enqueued_at = rq_job.enqueued_at
         j.save()
 
 
+def log_resume(job):
+    """Log a resumed job, with the run time its completed steps won't repeat."""
+    completed = job.completed_step_results().aggregate(
+        steps=Count("id"), saved=Sum("duration")
+    )
+    logger.info(
+        f"Resuming Job {job.id}",
+        extra={
+            "context": {
+                "event": "job_resumed",
+                "job": str(job.id),
+                "resume_count": job.resume_count,
+                "skipped_steps": completed["steps"],
+                "time_saved": round(completed["saved"] or 0),
+            }
+        },
+    )
+
+
 enqueuer_job = job(enqueuer)
 
 
@@ -319,26 +464,108 @@ preflight_job = job(preflight)
 
 
 def expire_preflights():
-    now = timezone.now()
-    preflight_lifetime_ago = now - timedelta(
+    """
+    Invalidate preflights created more than PREFLIGHT_LIFETIME_MINUTES ago, in
+    batches of PREFLIGHT_EXPIRY_BATCH_SIZE. Each batch is a single UPDATE, and its
+    websocket notifications are sent together once the batch has committed.
+    """
+    preflight_lifetime_ago = timezone.now() - timedelta(
         minutes=settings.PREFLIGHT_LIFETIME_MINUTES
     )
-    preflights_to_invalidate = PreflightResult.objects.filter(
-        created_at__lte=preflight_lifetime_ago,
-        is_valid=True,
+    batch_size = settings.PREFLIGHT_EXPIRY_BATCH_SIZE
+    total = 0
+    while True:
+        with transaction.atomic():
+            expired = PreflightResult.objects.expire(
+                created_before=preflight_lifetime_ago, limit=batch_size
+            )
+            if expired:
+                transaction.on_commit(
+                    lambda expired=expired: notify_expired_preflights(expired)
+                )
+        total += len(expired)
+        if len(expired) < batch_size:
+            break
+    if total:
+        logger.info(
+            f"Expired {total} preflight(s)",
+            extra={"context": {"event": "expire_preflights", "count": total}},
+        )
+    return total
+
+
+def notify_expired_preflights(expired):
+    """
+    Send the notifications PreflightResult.save() would have sent for a batch of
+    ``(id, org_id, was_started)`` rows from PreflightResultQuerySet.expire().
+    Only the stalled preflights change status, so only their orgs change.
+    """
+    canceled = [(id, org_id) for id, org_id, was_started in expired if was_started]
+    async_to_sync(preflights_expired)(
+        [id for id, _, _ in expired],
+        canceled_ids=[id for id, _ in canceled],
+        org_ids=sorted({org_id for _, org_id in canceled if org_id}),
     )
-    for preflight in preflights_to_invalidate:
-        # If the status is "Started" then we can assume this job
-        # is stalled (e.g. from a dyno restart) and needs
-        # to be set to a "canceled" status
-        if preflight.status == PreflightResult.Status.started:
-            preflight.status = PreflightResult.Status.canceled
-        preflight.is_valid = False
-        preflight.save()
 
 
 expire_preflights_job = job(expire_preflights)
 
+# Upper bounds, in seconds, of the step_timing_histogram buckets:
+STEP_TIMING_BUCKETS = (1, 5, 15, 60, 300, 900, 3600)
+
+
+def step_timing_histogram(durations):
+    """Summary statistics and cumulative bucket counts (le_<seconds>) of durations."""
+    ordered = sorted(durations)
+    histogram = {
+        "count": len(ordered),
+        "sum": round(sum(ordered), 3),
+        "p50": round(percentile(ordered, 0.5), 3),
+        "p90": round(percentile(ordered, 0.9), 3),
+        "max": round(ordered[-1], 3),
+    }
+    for bound in STEP_TIMING_BUCKETS:
+        histogram[f"le_{bound}"] = bisect_right(ordered, bound)
+    return histogram
+
+
+def report_step_timings():
+    """
+    Log a histogram of the durations of the job steps recorded in the last
+    STEP_TIMING_REPORT_MINUTES, for each task class and plan.
+    """
+    since = timezone.now() - timedelta(minutes=settings.STEP_TIMING_REPORT_MINUTES)
+    durations = {}
+    for task_class, plan_id, duration in (
+        StepResult.objects.filter(duration__isnull=False, recorded_at__gte=since)
+        .values_list("task_class", "job__plan_id", "duration")
+        .iterator()
+    ):
+        durations.setdefault((task_class, plan_id), []).append(duration)
+
+    plans = Plan.objects.select_related("version__product").in_bulk(
+        {plan_id for _, plan_id in durations}
+    )
+    for (task_class, plan_id), values in durations.items():
+        plan = plans[plan_id]
+        logger.info(
+            f"{task_class or 'Unknown task'} ran {len(values)} time(s) in {plan}",
+            extra={
+                "context": {
+                    "event": "step_timing_histogram",
+                    "task_class": task_class,
+                    "plan": plan.slug,
+                    "version": plan.version.label,
+                    "product": plan.version.product.slug,
+                    **step_timing_histogram(values),
+                }
+            },
+        )
+    return len(durations)
+
+
+report_step_timings_job = job(report_step_timings)
+
 
 def create_scratch_org(org_pk):
     """
@@ -349,13 +576,14 @@ def create_scratch_org(org_pk):
     If the plan associated with the ScratchOrg has *NO OPTIONAL STEPS* then
     the plan steps are also run against the org.
     """
-    org, plan = setup_scratch_org(org_pk)
+    with tracing.span("scratch org setup", org=org_pk):
+        org, plan = setup_scratch_org(org_pk)
 
     if plan.requires_preflight:
         preflight_result = run_preflight_checks_sync(org)
         async_to_sync(preflight_started)(org, preflight_result)
 
-    if plan.required_step_ids.count() == plan.steps.count():
+    if len(plan.required_step_pks) == plan.steps.count():
         # Start installation job automatically if both:
         # - Plan has no preflight
         # - All plan steps are required
@@ -372,7 +600,9 @@ create_scratch_org_job = job(create_scratch_org)
 def delete_scratch_org(scratch_org, should_delete_locally=True):
     try:
         scratch_org.refresh_from_db()
-        delete_scratch_org_on_sf(scratch_org)
+        # Fast-forwarded scratch orgs are faked, with nothing to delete:
+        if not settings.METADEPLOY_FAST_FORWARD:
+            delete_scratch_org_on_sf(scratch_org)
     finally:
         if should_delete_locally:
             scratch_org.delete(should_delete_on_sf=False, should_notify=False)
@@ -381,21 +611,6 @@ def delete_scratch_org(scratch_org, should_delete_locally=True):
 delete_scratch_org_job = job(delete_scratch_org)
 
 
-def calculate_average_plan_runtime():
-    """Plan.average_duration is a slow query, so we
-    get its value for each plan via this method and store its value
-    on Plan.calculated_average_duration.
-    """
-    for plan in Plan.objects.all():
-        duration_seconds = plan.average_duration
-        if duration_seconds:
-            plan.calculated_average_duration = int(duration_seconds)
-            plan.save()
-
-
-calculate_average_plan_runtime_job = job(calculate_average_plan_runtime)
-
-
 def run_preflight_checks_sync(org: ScratchOrg, release_test=False):
     """Runs the preflight checks of the given plan against an org synchronously"""
     preflight_result = PreflightResult.objects.create(
@@ -446,6 +661,7 @@ def setup_scratch_org(org_pk: str):
     if settings.METADEPLOY_FAST_FORWARD:  # pragma: no cover
         fake_org_id = str(uuid.uuid4())[:18]
         scratch_org_config = OrgConfig({"org_id": fake_org_id}, "scratch")
+        org_config = scratch_org_config
     else:
         try:
             with local_github_checkout(
@@ -469,5 +685,8 @@ def setup_scratch_org(org_pk: str):
     # this stores some values on the scratch
     # org model in the db
     org.complete(scratch_org_config)
+    # The token that was just refreshed to deploy the org settings can serve
+    # the plan's first job and the user's first login, too:
+    cache_org_config(org.org_id, org_config)
 
     return org, plan
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from ...cleanup import archive_old_results
+
+
+class Command(BaseCommand):
+    help = (
+        "Move old finished jobs and preflights out of the database into gzipped "
+        "JSON Lines files in the default file storage, one per model per month"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            help=(
+                "Archive rows created more than this many days ago. "
+                "Defaults to RESULT_ARCHIVE_AFTER_DAYS."
+            ),
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would be archived without writing or deleting.",
+        )
+
+    def handle(self, *args, days=None, dry_run=False, **options):
+        archives = archive_old_results(days=days, dry_run=dry_run)
+        for name, count in archives:
+            self.stdout.write(f"{name}: {count}")
+        verb = "Would archive" if dry_run else "Archived"
+        total = sum(count for _, count in archives)
+        self.stdout.write(f"{verb} {total} row(s) to {len(archives)} file(s).")
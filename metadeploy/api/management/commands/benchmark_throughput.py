@@ -0,0 +1,308 @@
+import asyncio
+import json
+import subprocess
+import threading
+import time
+import uuid
+from importlib import import_module
+from pathlib import Path
+
+from allauth.socialaccount.models import SocialAccount, SocialApp, SocialToken
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import connection, connections
+from django.db.models import Max
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from sfdo_template_helpers.crypto import fernet_encrypt
+
+from metadeploy.api.jobs import enqueuer
+from metadeploy.api.management.commands.populate_data import Command as PopulateData
+from metadeploy.api.management.commands.run_release_tests import offline_services
+from metadeploy.api.models import Job, ProductCategory, summarize_durations
+from metadeploy.consumers import PushNotificationConsumer
+
+User = get_user_model()
+
+
+def worker_counts(value):
+    return [int(count) for count in value.split(",")]
+
+
+class PushListener(threading.Thread):
+    """
+    Websocket clients subscribed to the jobs, on their own event loop, noting
+    how many messages arrive and when each job's first one does.
+    """
+
+    def __init__(self, subscriptions):
+        super().__init__(daemon=True)
+        self.subscriptions = subscriptions
+        self.subscribed = threading.Event()
+        self.finished = threading.Event()
+        self.messages = 0
+        self.first_message_at = {}
+
+    def run(self):
+        try:
+            asyncio.run(self.listen())
+        finally:
+            # Don't leave the benchmark waiting if a client failed to connect:
+            self.subscribed.set()
+
+    async def listen(self):
+        SessionStore = import_module(settings.SESSION_ENGINE).SessionStore
+        clients = []
+        for user, job in self.subscriptions:
+            communicator = WebsocketCommunicator(
+                PushNotificationConsumer.as_asgi(), "/ws/notifications/"
+            )
+            communicator.scope["user"] = user
+            communicator.scope["session"] = SessionStore()
+            await communicator.connect()
+            await communicator.send_json_to({"model": "job", "id": str(job.id)})
+            await communicator.receive_json_from()
+            clients.append((str(job.id), communicator))
+        self.subscribed.set()
+
+        receivers = [
+            asyncio.create_task(self.receive(job_id, communicator))
+            for job_id, communicator in clients
+        ]
+        while not self.finished.is_set():
+            await asyncio.sleep(0.1)
+        for receiver in receivers:
+            receiver.cancel()
+        for _, communicator in clients:
+            await communicator.disconnect()
+
+    async def receive(self, job_id, communicator):
+        while True:
+            await communicator.receive_json_from(timeout=None)
+            self.messages += 1
+            self.first_message_at.setdefault(job_id, time.monotonic())
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures end-to-end job throughput: creates users and orgs, starts jobs "
+        "through the REST API, runs them through the enqueuer and a pool of "
+        "workers, fast-forwarded, and listens for their push notifications. "
+        "Repeats for each pool size. For local development databases only."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--users", type=int, default=20, help="How many users start a job."
+        )
+        parser.add_argument(
+            "--steps", type=int, default=3, help="How many steps each job has."
+        )
+        parser.add_argument(
+            "--workers",
+            type=worker_counts,
+            default="1,2,4",
+            help="The worker pool sizes to measure, comma-separated.",
+        )
+        parser.add_argument(
+            "--subscribers",
+            type=int,
+            default=1,
+            help="How many websocket clients follow each job.",
+        )
+        parser.add_argument(
+            "--output", help="Also write the results to this file, as JSON."
+        )
+
+    def handle(self, *args, users, steps, workers, subscribers, output, **options):
+        if not settings.DEBUG:
+            raise CommandError(
+                "Refusing to generate load outside of local development (DEBUG)."
+            )
+
+        runs = []
+        plan = self.create_plan(steps=steps)
+        try:
+            # The pool's worker processes are forked from this one, and so are
+            # offline too:
+            with offline_services():
+                for count in workers:
+                    # Only this run's users are cleaned up, even if others are
+                    # running:
+                    username_prefix = f"load-test-{uuid.uuid4().hex[:8]}-"
+                    try:
+                        run = self.run_load(
+                            plan,
+                            users=self.create_users(
+                                users, username_prefix=username_prefix
+                            ),
+                            subscribers=subscribers,
+                            workers=count,
+                        )
+                    finally:
+                        self.clean_up_users(plan, username_prefix=username_prefix)
+                    runs.append({"workers": count, **run})
+        finally:
+            self.clean_up(plan)
+
+        results = {
+            "parameters": {
+                "users": users,
+                "steps": steps,
+                "workers": workers,
+                "subscribers": subscribers,
+            },
+            "commit": self.current_commit(),
+            "runs": runs,
+        }
+        self.stdout.write(json.dumps(results, indent=2))
+        if output:
+            Path(output).write_text(json.dumps(results, indent=2))
+
+    def create_plan(self, *, steps):
+        data = PopulateData()
+        category = ProductCategory.objects.create(title="Load Test")
+        product = data.create_product(
+            title="Load Test",
+            repo_url="https://github.com/example/load-test",
+            category=category,
+        )
+        plan = data.create_plan(data.create_version(product, "1.0"), title="Load Test")
+        for i in range(steps):
+            data.create_step(
+                plan=plan,
+                name=f"Step {i + 1}",
+                path=f"sleep_{i + 1}",
+                step_num=str(i + 1),
+            )
+        return plan
+
+    def create_users(self, count, *, username_prefix):
+        app, _ = SocialApp.objects.get_or_create(
+            provider="salesforce",
+            defaults={"name": "Salesforce", "key": "https://login.salesforce.com/"},
+        )
+        users = []
+        for i in range(count):
+            username = f"{username_prefix}{i}"
+            user = User.objects.create(username=username)
+            account = SocialAccount.objects.create(
+                user=user,
+                provider="salesforce",
+                uid=f"https://example.com/{username}",
+                extra_data={
+                    "preferred_username": f"{username}@example.com",
+                    "organization_id": f"00DLOADTEST{i:07d}",
+                    "instance_url": "https://example.com",
+                    "organization_details": {
+                        "Name": "Load Test",
+                        "OrganizationType": "Developer Edition",
+                        "IsSandbox": False,
+                    },
+                },
+            )
+            SocialToken.objects.create(
+                app=app,
+                account=account,
+                token=fernet_encrypt("0123456789abcdef"),
+                token_secret=fernet_encrypt("secret.0123456789abcdef"),
+            )
+            users.append(user)
+        return users
+
+    def run_load(self, plan, *, users, subscribers, workers):
+        step_ids = [str(step.id) for step in plan.steps.all()]
+        clicked_at = {}
+        click_times = []
+        click_queries = []
+        jobs = []
+        for user in users:
+            client = APIClient()
+            client.force_authenticate(user)
+            start = time.monotonic()
+            with CaptureQueriesContext(connection) as queries:
+                response = client.post(
+                    "/api/jobs/",
+                    {"plan": str(plan.id), "steps": step_ids, "is_public": False},
+                    format="json",
+                )
+            if response.status_code != 201:
+                raise CommandError(f"Could not start a job: {response.data}")
+            click_times.append(time.monotonic() - start)
+            click_queries.append(len(queries))
+            job = Job.objects.get(pk=response.data["id"])
+            clicked_at[str(job.id)] = start
+            jobs.append((user, job))
+
+        listener = PushListener(jobs * subscribers)
+        listener.start()
+        listener.subscribed.wait()
+
+        started_at = timezone.now()
+        start = time.monotonic()
+        with CaptureQueriesContext(connection) as queries:
+            enqueuer()
+        # The workers are forked from this process, and must open their own
+        # database connections:
+        connections.close_all()
+        call_command(
+            "metadeploy_rqworker_pool",
+            "default",
+            num_workers=workers,
+            burst=True,
+            verbosity=0,
+        )
+        # The pool only notices its workers are done once a second, so time the
+        # run by when its last job finished, if any did:
+        finished = Job.objects.filter(plan=plan).aggregate(at=Max("success_at"))
+        if finished["at"]:
+            elapsed = (finished["at"] - started_at).total_seconds()
+        else:
+            elapsed = time.monotonic() - start
+        time.sleep(1)  # let the last notifications arrive
+        listener.finished.set()
+        listener.join()
+
+        completed = Job.objects.filter(plan=plan, status=Job.Status.complete).count()
+        return {
+            "jobs": len(jobs),
+            "completed": completed,
+            "jobs_per_second": round(completed / elapsed, 2),
+            "click_ms": summarize_durations(seconds * 1000 for seconds in click_times),
+            "click_to_start_ms": summarize_durations(
+                (listener.first_message_at[job_id] - clicked_at[job_id]) * 1000
+                for job_id in listener.first_message_at
+            ),
+            "queries_per_click": round(sum(click_queries) / len(jobs), 1),
+            "queries_per_enqueue": round(len(queries) / len(jobs), 1),
+            "push_messages": listener.messages,
+            "push_messages_per_job": round(listener.messages / len(jobs), 1),
+        }
+
+    def clean_up_users(self, plan, *, username_prefix):
+        Job.objects.filter(plan=plan).delete()
+        User.objects.filter(username__startswith=username_prefix).delete()
+
+    def clean_up(self, plan):
+        version = plan.version
+        product = version.product
+        plan.delete()
+        plan.plan_template.delete()
+        version.delete()
+        product.delete()
+        product.category.delete()
+
+    def current_commit(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "HEAD"],
+                capture_output=True,
+                check=True,
+                text=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
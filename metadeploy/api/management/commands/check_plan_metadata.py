@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from metadeploy.api.models import Plan, Version
+
+
+def find_mismatches(model, queryset) -> list[tuple]:
+    """Compare each instance's stored denormalized fields against freshly computed
+    values. Returns a list of (instance, field name, stored, expected)."""
+    compute = {
+        Plan: Plan.compute_step_metadata,
+        Version: Version.compute_plan_pointers,
+    }[model]
+    mismatches = []
+    for instance in queryset.iterator():
+        for name, expected in compute(instance).items():
+            stored = getattr(instance, name)
+            if stored != expected:
+                mismatches.append((instance, name, stored, expected))
+    return mismatches
+
+
+class Command(BaseCommand):
+    help = (
+        "Check that the denormalized Plan and Version fields match the rows they "
+        "are derived from"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Recompute any fields found to be out of date.",
+        )
+
+    def handle(self, *args, fix=False, **options):
+        mismatches = find_mismatches(Plan, Plan.objects.all()) + find_mismatches(
+            Version, Version.objects.all()
+        )
+        for instance, name, stored, expected in mismatches:
+            self.stdout.write(
+                f"{instance._meta.label} {instance.pk} {name}: "
+                f"stored {stored!r}, expected {expected!r}"
+            )
+
+        if not mismatches:
+            self.stdout.write("All denormalized plan metadata is up to date.")
+            return
+        if not fix:
+            raise CommandError(f"Found {len(mismatches)} out-of-date field(s).")
+
+        for instance in {instance for instance, *_ in mismatches}:
+            if isinstance(instance, Plan):
+                instance.refresh_step_metadata()
+            else:
+                instance.refresh_plan_pointers()
+        self.stdout.write(f"Fixed {len(mismatches)} out-of-date field(s).")
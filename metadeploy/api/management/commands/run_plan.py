@@ -11,7 +11,7 @@ from metadeploy.api.jobs import (
     run_preflight_checks_sync,
     setup_scratch_org,
 )
-from metadeploy.api.models import Plan, ScratchOrg
+from metadeploy.api.models import Job, Plan, PreflightResult, ScratchOrg
 
 logger = getLogger(__name__)
 
@@ -30,24 +30,31 @@ class Command(BaseCommand):
         except Plan.DoesNotExist:
             raise CommandError(f"Plan with Id {plan_id} does not exist.")
 
-        scratch_org = ScratchOrg.objects.create(
-            plan=plan, enqueued_at=datetime.utcnow().isoformat()
+        run_plan(plan)
+
+
+def run_plan(plan: Plan) -> tuple[PreflightResult, Job]:
+    """Run the preflight checks and steps of a plan against a new scratch org,
+    then delete the org."""
+    scratch_org = ScratchOrg.objects.create(
+        plan=plan, enqueued_at=datetime.utcnow().isoformat()
+    )
+    try:
+        org, plan = setup_scratch_org(scratch_org.pk)
+    except Exception:
+        context = f"{plan.version.product.slug}/{plan.version.label}/{plan.slug}"
+        logger.info(
+            "Scratch org creation failed.",
+            extra={
+                "context": {
+                    "event": JobType.TEST_JOB,
+                    "context": context,
+                    "status": JobLogStatus.ERROR,
+                }
+            },
         )
-        try:
-            org, plan = setup_scratch_org(scratch_org.pk)
-        except Exception:
-            context = f"{plan.version.product.slug}/{plan.version.label}/{plan.slug}"
-            logger.info(
-                "Scratch org creation failed.",
-                extra={
-                    "context": {
-                        "event": JobType.TEST_JOB,
-                        "context": context,
-                        "status": JobLogStatus.ERROR,
-                    }
-                },
-            )
-            raise
-        run_preflight_checks_sync(org, release_test=True)
-        run_plan_steps(org, release_test=True)
-        delete_scratch_org(scratch_org)
+        raise
+    preflight_result = run_preflight_checks_sync(org, release_test=True)
+    job = run_plan_steps(org, release_test=True)
+    delete_scratch_org(scratch_org)
+    return preflight_result, job
@@ -0,0 +1,206 @@
+import json
+import logging
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from itertools import islice
+from pathlib import Path
+from unittest.mock import patch
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import connections
+from django.test.utils import override_settings
+
+from metadeploy.api.management.commands.run_plan import run_plan
+from metadeploy.api.management.commands.schedule_release_test import get_plans_to_test
+from metadeploy.api.models import Plan
+
+logger = logging.getLogger(__name__)
+
+PASSED = "passed"
+FAILED = "failed"
+ERROR = "error"
+SKIPPED = "skipped"
+
+PROJECT_CONFIG = """\
+project:
+    name: ReleaseTest
+    package:
+        name: ReleaseTest
+        api_version: "55.0"
+"""
+
+
+@contextmanager
+def offline_services():
+    """
+    Stand in for GitHub and Salesforce: scratch orgs and flows are fast-forwarded
+    (see METADEPLOY_FAST_FORWARD), and every plan checks out an empty CumulusCI
+    project instead of its repository.
+    """
+    with tempfile.TemporaryDirectory() as project_dir:
+        (Path(project_dir) / "cumulusci.yml").write_text(PROJECT_CONFIG)
+        with override_settings(METADEPLOY_FAST_FORWARD=True), patch(
+            "metadeploy.api.jobs.local_github_checkout",
+            return_value=nullcontext(project_dir),
+        ):
+            yield project_dir
+
+
+def run_plan_test(plan_id: str, offline: bool = False) -> dict:
+    """Run one plan's release test, in a pool process, and summarize how it
+    went. Never raises, so one broken plan can't take the pool down."""
+    start = time.monotonic()
+    outcome = {"plan": plan_id, "status": ERROR, "error": None}
+    try:
+        with offline_services() if offline else nullcontext():
+            preflight_result, job = run_plan(Plan.objects.get(id=plan_id))
+        preflight_result.refresh_from_db()
+        job.refresh_from_db()
+        if preflight_result.has_any_errors():
+            outcome["status"] = FAILED
+            outcome["error"] = "Preflight checks failed."
+        elif job.status != job.Status.complete:
+            outcome["status"] = FAILED
+            outcome["error"] = job.exception or f"Job {job.status}."
+        else:
+            outcome["status"] = PASSED
+    except Exception as e:
+        outcome["error"] = str(e)
+    finally:
+        connections.close_all()
+    outcome["duration"] = round(time.monotonic() - start, 1)
+    return outcome
+
+
+def run_release_tests(
+    plan_ids, *, processes, max_failures=0, offline=False
+) -> list[dict]:
+    """
+    Run the release tests for plan_ids in a pool of processes, a few at a time.
+
+    Once max_failures plans have failed (if it is set), plans that haven't
+    started yet are skipped. With offline, no plan talks to GitHub or
+    Salesforce. Returns one outcome per plan, in plan_ids order.
+    """
+    test_plan = partial(run_plan_test, offline=offline)
+    # Each pool process opens its own database connections:
+    connections.close_all()
+    to_start = iter(plan_ids)
+    outcomes = {}
+    failures = 0
+    with ProcessPoolExecutor(
+        max_workers=processes, initializer=django.setup
+    ) as executor:
+        running = {
+            executor.submit(test_plan, plan_id)
+            for plan_id in islice(to_start, processes)
+        }
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                outcome = future.result()
+                outcomes[outcome["plan"]] = outcome
+                failures += outcome["status"] != PASSED
+            if max_failures and failures >= max_failures:
+                continue
+            running |= {
+                executor.submit(test_plan, plan_id)
+                for plan_id in islice(to_start, len(done))
+            }
+    return [
+        outcomes.get(plan_id)
+        or {"plan": plan_id, "status": SKIPPED, "error": None, "duration": None}
+        for plan_id in plan_ids
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the release tests for several plans concurrently, each against its "
+        "own scratch org, and reports on all of them."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "plan_ids",
+            nargs="*",
+            help="Plans to test. Defaults to every plan due a regression test.",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=settings.RELEASE_TEST_PROCESSES,
+            help="How many plans to test at once.",
+        )
+        parser.add_argument(
+            "--max-failures",
+            type=int,
+            default=settings.RELEASE_TEST_MAX_FAILURES,
+            help="Skip the remaining plans after this many fail (0 to run them all).",
+        )
+        parser.add_argument(
+            "--offline",
+            action="store_true",
+            help=(
+                "Fake the scratch orgs, GitHub checkouts and flows, to try the "
+                "command out without Salesforce."
+            ),
+        )
+        parser.add_argument(
+            "--report", help="Also write the report to this file, as JSON."
+        )
+
+    def handle(
+        self, *args, plan_ids, processes, max_failures, offline, report, **options
+    ):
+        if not plan_ids:
+            plan_ids = [str(plan.id) for plan in get_plans_to_test()]
+        if not plan_ids:
+            self.stdout.write("No plans found for regression testing.")
+            return
+
+        start = time.monotonic()
+        outcomes = run_release_tests(
+            plan_ids, processes=processes, max_failures=max_failures, offline=offline
+        )
+        counts = {
+            status: sum(outcome["status"] == status for outcome in outcomes)
+            for status in (PASSED, FAILED, ERROR, SKIPPED)
+        }
+        duration = round(time.monotonic() - start, 1)
+
+        for outcome in outcomes:
+            line = f"{outcome['plan']}: {outcome['status']}"
+            if outcome["duration"] is not None:
+                line += f" in {outcome['duration']}s"
+            if outcome["error"]:
+                line += f" ({outcome['error']})"
+            self.stdout.write(line)
+        summary = ", ".join(f"{count} {status}" for status, count in counts.items())
+        self.stdout.write(f"Tested {len(outcomes)} plan(s) in {duration}s: {summary}")
+        logger.info(
+            "Release tests finished.",
+            extra={
+                "context": {
+                    "event": "release_test_report",
+                    "plans": len(outcomes),
+                    "duration": duration,
+                    **counts,
+                }
+            },
+        )
+        if report:
+            with open(report, "w") as f:
+                json.dump(
+                    {"duration": duration, **counts, "plans": outcomes}, f, indent=2
+                )
+
+        if counts[FAILED] or counts[ERROR]:
+            raise CommandError(
+                f"{counts[FAILED] + counts[ERROR]} release test(s) did not pass."
+            )
@@ -22,23 +22,23 @@ logger = logging.getLogger(__name__)
 
 
 def execute_release_test() -> None:
-    """For each plan to test, make an API call to Heroku
-    to spin up a one-off dyno, and run the plan against
-    a fresh scratch org."""
+    """Make an API call to Heroku to spin up a one-off dyno,
+    which runs every plan to test against its own fresh
+    scratch org, several at a time (see run_release_tests)."""
     plans_to_test = get_plans_to_test()
     if not plans_to_test:
         logger.info("No plans found for regression testing.")
         return
 
     check_settings()
-    for plan in plans_to_test:
-        command = f"python ./manage.py run_plan {str(plan.id)}"
-        resp = start_job_in_one_off_dyno(command)
-        if resp.status_code > 299:
-            logger.error(
-                f"One-off dyno could not be started: {resp.status_code} : {resp.text}"
-            )
-            raise HTTPError("An internal server error occurred.")
+    plan_ids = " ".join(str(plan.id) for plan in plans_to_test)
+    command = f"python ./manage.py run_release_tests {plan_ids}"
+    resp = start_job_in_one_off_dyno(command)
+    if resp.status_code > 299:
+        logger.error(
+            f"One-off dyno could not be started: {resp.status_code} : {resp.text}"
+        )
+        raise HTTPError("An internal server error occurred.")
 
 
 def get_plans_to_test() -> list[Plan]:
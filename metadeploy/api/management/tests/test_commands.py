@@ -1,5 +1,7 @@
+import json
 import logging
 import re
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import ExitStack
 from unittest import mock
 from unittest.mock import patch
@@ -7,16 +9,20 @@ from unittest.mock import patch
 import pytest
 from cumulusci.core.config import OrgConfig
 from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.core.exceptions import ImproperlyConfigured
 from django.core.management import call_command
 from django.core.management.base import CommandError
 from requests.exceptions import HTTPError
 
+from metadeploy.api.management.commands.run_release_tests import run_plan_test
 from metadeploy.api.management.commands.schedule_release_test import (
     execute_release_test,
     get_plans_to_test,
 )
-from metadeploy.api.models import Job, Plan, PreflightResult, ScratchOrg
+from metadeploy.api.models import Job, Plan, PreflightResult, ScratchOrg, Version
+
+User = get_user_model()
 
 
 @pytest.mark.django_db()
@@ -44,7 +50,7 @@ def test_run_plan(plan_factory):
         stack.enter_context(
             patch(
                 "metadeploy.api.jobs.create_scratch_org_on_sf",
-                return_value=(org_config, None, None),
+                return_value=(org_config, None, org_config),
             )
         )
         stack.enter_context(patch("metadeploy.api.jobs.delete_scratch_org_on_sf"))
@@ -118,11 +124,16 @@ def test_get_plans_to_test(plan_template_factory, plan_factory):
 @mock.patch("metadeploy.api.management.commands.schedule_release_test.requests.post")
 def test_schedule_release_test__happy_path(post, plan_template_factory, plan_factory):
     template = plan_template_factory()
-    plan_factory(plan_template=template)
+    plan = plan_factory(plan_template=template)
 
     post.return_value = mock.Mock(status_code=200, text="Fatal Error")
     execute_release_test()
 
+    assert post.call_count == 1
+    assert post.call_args.kwargs["json"]["command"] == (
+        f"python ./manage.py run_release_tests {plan.id}"
+    )
+
 
 @pytest.mark.django_db
 @mock.patch("metadeploy.api.management.commands.schedule_release_test.requests.post")
@@ -163,3 +174,183 @@ def test_schedule_release_test__no_heroku_token(plan_template_factory, plan_fact
             ),
         ):
             execute_release_test()
+
+
+@pytest.mark.django_db
+def test_check_plan_metadata__ok(step_factory, capsys):
+    step_factory(is_required=True)
+
+    call_command("check_plan_metadata")
+
+    assert "up to date" in capsys.readouterr().out
+
+
+@pytest.mark.django_db
+def test_check_plan_metadata__mismatch(step_factory):
+    plan = step_factory(is_required=True).plan
+    Plan.objects.filter(pk=plan.pk).update(
+        required_step_pks=[], requires_preflight=True
+    )
+
+    with pytest.raises(CommandError, match="Found 2 out-of-date field"):
+        call_command("check_plan_metadata")
+
+
+@pytest.mark.django_db
+def test_check_plan_metadata__fix(step_factory):
+    step = step_factory(is_required=True, plan__tier="primary")
+    plan = step.plan
+    Plan.objects.filter(pk=plan.pk).update(required_step_pks=[])
+    Version.objects.filter(pk=plan.version.pk).update(primary_plan=None)
+
+    call_command("check_plan_metadata", fix=True)
+
+    plan.refresh_from_db()
+    plan.version.refresh_from_db()
+    assert plan.required_step_ids == [step.id]
+    assert plan.version.primary_plan == plan
+    call_command("check_plan_metadata")
+
+
+@pytest.mark.django_db
+def test_archive_results(capsys, mocker, job_factory):
+    archive_old_results = mocker.patch(
+        "metadeploy.api.management.commands.archive_results.archive_old_results",
+        return_value=[("archives/job-2020-01-20240101T000000.jsonl.gz", 1)],
+    )
+
+    call_command("archive_results", days=30)
+
+    archive_old_results.assert_called_once_with(days=30, dry_run=False)
+    assert "Archived 1 row(s) to 1 file(s)." in capsys.readouterr().out
+
+
+class TestRunReleaseTests:
+    @pytest.fixture(autouse=True)
+    def thread_pool(self):
+        # Stand-in plan runs don't need their own processes:
+        with patch(
+            "metadeploy.api.management.commands.run_release_tests.ProcessPoolExecutor",
+            ThreadPoolExecutor,
+        ):
+            yield
+
+    @staticmethod
+    def fake_run_plan_test(failing=()):
+        def run_plan_test(plan_id, offline=False):
+            status = "failed" if plan_id in failing else "passed"
+            return {"plan": plan_id, "status": status, "error": None, "duration": 1.0}
+
+        return patch(
+            "metadeploy.api.management.commands.run_release_tests.run_plan_test",
+            side_effect=run_plan_test,
+        )
+
+    def test_report(self, tmp_path, capsys):
+        report = tmp_path / "report.json"
+        with self.fake_run_plan_test():
+            call_command("run_release_tests", "a", "b", report=str(report))
+
+        out = capsys.readouterr().out
+        assert "a: passed in 1.0s" in out
+        assert "2 passed, 0 failed, 0 error, 0 skipped" in out
+        assert [p["plan"] for p in json.loads(report.read_text())["plans"]] == [
+            "a",
+            "b",
+        ]
+
+    def test_failures(self):
+        with self.fake_run_plan_test(failing={"b"}):
+            with pytest.raises(CommandError, match="1 release test"):
+                call_command("run_release_tests", "a", "b", "c")
+
+    def test_max_failures(self, capsys):
+        with self.fake_run_plan_test(failing={"a", "b", "c"}) as run_plan_test:
+            with pytest.raises(CommandError):
+                call_command(
+                    "run_release_tests", "a", "b", "c", processes=1, max_failures=1
+                )
+
+        assert run_plan_test.call_count == 1
+        assert "2 skipped" in capsys.readouterr().out
+
+    @pytest.mark.django_db
+    def test_no_plans(self, capsys):
+        call_command("run_release_tests")
+
+        assert "No plans found" in capsys.readouterr().out
+
+
+@pytest.mark.django_db
+def test_run_plan_test__offline(plan_factory, step_factory):
+    plan = plan_factory(preflight_checks=[{"when": "False", "action": "error"}])
+    step_factory(plan=plan)
+
+    # Closing connections would end the test's transaction:
+    with patch("metadeploy.api.management.commands.run_release_tests.connections"):
+        outcome = run_plan_test(str(plan.id), offline=True)
+
+    assert outcome["status"] == "passed", outcome["error"]
+    job = Job.objects.get()
+    assert job.is_release_test
+    assert job.status == Job.Status.complete
+    assert not ScratchOrg.objects.exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_run_release_tests__offline(plan_factory, step_factory, tmp_path):
+    plan_ids = []
+    for _ in range(3):
+        plan = plan_factory()
+        step_factory(plan=plan)
+        plan_ids.append(str(plan.id))
+    report = tmp_path / "report.json"
+
+    # The missing plan fails at once, before the second process frees up:
+    with pytest.raises(CommandError, match="1 release test"):
+        call_command(
+            "run_release_tests",
+            "missing",
+            *plan_ids,
+            processes=2,
+            max_failures=1,
+            offline=True,
+            report=str(report),
+        )
+
+    results = json.loads(report.read_text())
+    assert set(results) == {"duration", "passed", "failed", "error", "skipped", "plans"}
+    assert [p["plan"] for p in results["plans"]] == ["missing", *plan_ids]
+    assert all(
+        set(p) == {"plan", "status", "error", "duration"} for p in results["plans"]
+    )
+    missing, first, *rest = results["plans"]
+    assert missing["status"] == "error"
+    assert first["status"] == "passed", first["error"]
+    assert rest[-1]["status"] == "skipped"
+    assert results["error"] == 1
+    assert results["passed"] + results["skipped"] == 3
+    assert Job.objects.filter(status=Job.Status.complete).count() == results["passed"]
+
+
+def test_benchmark_throughput__not_debug(settings):
+    settings.DEBUG = False
+    with pytest.raises(CommandError, match="local development"):
+        call_command("benchmark_throughput")
+
+
+@pytest.mark.django_db(transaction=True)
+def test_benchmark_throughput(settings, user_factory, capsys):
+    settings.DEBUG = True
+    bystander = user_factory(username="load-test-bystander")
+
+    call_command("benchmark_throughput", users=2, steps=1, workers=[1, 2])
+
+    results = json.loads(capsys.readouterr().out)
+    assert results["parameters"]["workers"] == [1, 2]
+    assert [run["workers"] for run in results["runs"]] == [1, 2]
+    for run in results["runs"]:
+        assert run["jobs"] == run["completed"] == 2
+        assert run["jobs_per_second"] > 0
+    assert not Job.objects.exists()
+    assert list(User.objects.filter(username__startswith="load-test-")) == [bystander]
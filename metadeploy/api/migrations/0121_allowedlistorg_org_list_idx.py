@@ -0,0 +1,17 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0120_auto_20220527_1507"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="allowedlistorg",
+            index=models.Index(
+                fields=["org_id", "allowed_list"], name="allowedlistorg_org_list_idx"
+            ),
+        ),
+    ]
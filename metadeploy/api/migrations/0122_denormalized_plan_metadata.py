@@ -0,0 +1,102 @@
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_denormalized_fields(apps, schema_editor):
+    """
+    Fill in the step-derived Plan fields and the Version plan pointers, mirroring
+    Plan.compute_step_metadata() and Version.compute_plan_pointers().
+    """
+    Plan = apps.get_model("api", "Plan")
+    Version = apps.get_model("api", "Version")
+
+    for plan in Plan.objects.all():
+        steps = plan.steps.values_list("id", "is_required", "task_config")
+        has_step_checks = any(
+            (task_config or {}).get("checks") for _, _, task_config in steps
+        )
+        plan.requires_preflight = bool(plan.preflight_checks) or has_step_checks
+        plan.required_step_pks = [
+            int(step_id) for step_id, is_required, _ in steps if is_required
+        ]
+        plan.save(update_fields=["requires_preflight", "required_step_pks"])
+
+    for version in Version.objects.all():
+        plans = version.plan_set.order_by("-created_at")
+        version.primary_plan = plans.filter(tier="primary").first()
+        version.secondary_plan = plans.filter(tier="secondary").first()
+        version.additional_plan_pks = [
+            int(pk)
+            for pk in version.plan_set.filter(tier="additional")
+            .order_by("plan_template_id", "order_key", "-created_at")
+            .distinct("plan_template_id")
+            .values_list("id", flat=True)
+        ]
+        version.save(
+            update_fields=["primary_plan", "secondary_plan", "additional_plan_pks"]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0121_allowedlistorg_org_list_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="plan",
+            name="requires_preflight",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name="plan",
+            name="required_step_pks",
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.BigIntegerField(),
+                blank=True,
+                default=list,
+                editable=False,
+                size=None,
+            ),
+        ),
+        migrations.AddField(
+            model_name="version",
+            name="primary_plan",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="api.plan",
+            ),
+        ),
+        migrations.AddField(
+            model_name="version",
+            name="secondary_plan",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="api.plan",
+            ),
+        ),
+        migrations.AddField(
+            model_name="version",
+            name="additional_plan_pks",
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.BigIntegerField(),
+                blank=True,
+                default=list,
+                editable=False,
+                size=None,
+            ),
+        ),
+        migrations.RunPython(
+            populate_denormalized_fields, reverse_code=migrations.RunPython.noop
+        ),
+    ]
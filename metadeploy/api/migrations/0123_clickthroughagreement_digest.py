@@ -0,0 +1,45 @@
+import hashlib
+
+from django.db import migrations, models
+
+
+def populate_digests(apps, schema_editor):
+    """
+    Fill in ClickThroughAgreement.digest, folding any agreements with identical
+    text into the oldest one so the digest can be unique.
+    """
+    ClickThroughAgreement = apps.get_model("api", "ClickThroughAgreement")
+    Job = apps.get_model("api", "Job")
+
+    ids_by_digest = {}
+    for agreement in ClickThroughAgreement.objects.order_by("id").iterator():
+        digest = hashlib.sha256(agreement.text.encode()).hexdigest()
+        if digest in ids_by_digest:
+            original_id = ids_by_digest[digest]
+            Job.objects.filter(click_through_agreement_id=agreement.id).update(
+                click_through_agreement_id=original_id
+            )
+            Job.objects.filter(master_service_agreement_id=agreement.id).update(
+                master_service_agreement_id=original_id
+            )
+            agreement.delete()
+        else:
+            ids_by_digest[digest] = agreement.id
+            agreement.digest = digest
+            agreement.save(update_fields=["digest"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0122_denormalized_plan_metadata"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="clickthroughagreement",
+            name="digest",
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(populate_digests, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0123_clickthroughagreement_digest"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="clickthroughagreement",
+            name="digest",
+            field=models.CharField(editable=False, max_length=64, unique=True),
+        ),
+    ]
@@ -0,0 +1,150 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def count_status_in_results(results, status_name):
+    count = 0
+    for results_list in results.values():
+        for result in results_list:
+            try:
+                if result["status"] == status_name:
+                    count += 1
+            except TypeError:
+                pass
+    return count
+
+
+def populate_step_results(apps, schema_editor):
+    """
+    Fill in the error/warning counts and StepResult rows for existing jobs and
+    preflights, one row per outcome in their results JSON.
+    """
+    StepResult = apps.get_model("api", "StepResult")
+    for model_name, field_name in (
+        ("Job", "job"),
+        ("PreflightResult", "preflight_result"),
+    ):
+        model = apps.get_model("api", model_name)
+        for instance in model.objects.exclude(results={}).iterator():
+            instance.error_count = count_status_in_results(instance.results, "error")
+            instance.warning_count = count_status_in_results(instance.results, "warn")
+            instance.save(update_fields=["error_count", "warning_count"])
+            StepResult.objects.bulk_create(
+                StepResult(
+                    **{field_name: instance},
+                    step_key=str(step_key),
+                    position=position,
+                    status=str(outcome.get("status") or ""),
+                    message=outcome.get("message"),
+                    logs=outcome.get("logs"),
+                )
+                for step_key, outcomes in instance.results.items()
+                for position, outcome in enumerate(outcomes)
+                if isinstance(outcome, dict)
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0124_clickthroughagreement_digest_unique"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="error_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="warning_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="preflightresult",
+            name="error_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="preflightresult",
+            name="warning_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name="StepResult",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("step_key", models.CharField(max_length=64)),
+                ("position", models.PositiveSmallIntegerField(default=0)),
+                ("status", models.CharField(blank=True, max_length=64)),
+                ("message", models.TextField(blank=True, null=True)),
+                ("logs", models.TextField(blank=True, null=True)),
+                (
+                    "job",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="step_results",
+                        to="api.job",
+                    ),
+                ),
+                (
+                    "preflight_result",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="step_results",
+                        to="api.preflightresult",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("step_key", "position"),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="stepresult",
+            constraint=models.CheckConstraint(
+                check=models.Q(
+                    models.Q(
+                        ("job__isnull", False), ("preflight_result__isnull", True)
+                    ),
+                    models.Q(
+                        ("job__isnull", True), ("preflight_result__isnull", False)
+                    ),
+                    _connector="OR",
+                ),
+                name="stepresult_single_parent",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="stepresult",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("job__isnull", False)),
+                fields=("job", "step_key", "position"),
+                name="stepresult_job_step_uniq",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="stepresult",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("preflight_result__isnull", False)),
+                fields=("preflight_result", "step_key", "position"),
+                name="stepresult_preflight_step_uniq",
+            ),
+        ),
+        migrations.RunPython(
+            populate_step_results, reverse_code=migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,67 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0125_stepresult"),
+        ("socialaccount", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(
+                condition=models.Q(("status", "started")),
+                fields=["org_id"],
+                name="job_org_started_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(
+                condition=models.Q(("enqueued_at__isnull", True)),
+                fields=["created_at"],
+                name="job_unenqueued_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(
+                condition=models.Q(("status", "complete")),
+                fields=["plan", "-created_at"],
+                name="job_plan_complete_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="preflightresult",
+            index=models.Index(
+                condition=models.Q(("is_valid", True), ("status", "complete")),
+                fields=["org_id", "plan", "-created_at"],
+                name="preflight_most_recent_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="preflightresult",
+            index=models.Index(
+                condition=models.Q(("status", "started")),
+                fields=["org_id"],
+                name="preflight_org_started_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="scratchorg",
+            index=models.Index(fields=["uuid"], name="scratchorg_uuid_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="scratchorg",
+            index=models.Index(fields=["org_id"], name="scratchorg_org_id_idx"),
+        ),
+        # SocialAccount belongs to allauth, so its index for expire_oauth_tokens()
+        # is managed by hand:
+        migrations.RunSQL(
+            "CREATE INDEX IF NOT EXISTS socialaccount_last_login_idx "
+            "ON socialaccount_socialaccount (last_login)",
+            reverse_sql="DROP INDEX IF EXISTS socialaccount_last_login_idx",
+        ),
+    ]
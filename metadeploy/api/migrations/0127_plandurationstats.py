@@ -0,0 +1,51 @@
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0126_hot_lookup_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stepresult",
+            name="duration",
+            field=models.FloatField(
+                blank=True, help_text="How long the step took, in seconds.", null=True
+            ),
+        ),
+        migrations.CreateModel(
+            name="PlanDurationStats",
+            fields=[
+                (
+                    "plan",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="duration_stats",
+                        serialize=False,
+                        to="api.plan",
+                    ),
+                ),
+                (
+                    "durations",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.FloatField(),
+                        blank=True,
+                        default=list,
+                        size=None,
+                    ),
+                ),
+                ("step_durations", models.JSONField(blank=True, default=dict)),
+                ("p50", models.FloatField(blank=True, null=True)),
+                ("p90", models.FloatField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name_plural": "plan duration stats",
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0127_plandurationstats"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="preflightresult",
+            index=models.Index(
+                condition=models.Q(("is_valid", True)),
+                fields=["created_at"],
+                name="preflight_valid_created_idx",
+            ),
+        ),
+    ]
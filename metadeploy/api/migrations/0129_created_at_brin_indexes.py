@@ -0,0 +1,24 @@
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0128_preflight_valid_created_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="job",
+            index=django.contrib.postgres.indexes.BrinIndex(
+                fields=["created_at"], name="job_created_brin"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="preflightresult",
+            index=django.contrib.postgres.indexes.BrinIndex(
+                fields=["created_at"], name="preflight_created_brin"
+            ),
+        ),
+    ]
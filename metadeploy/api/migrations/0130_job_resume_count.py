@@ -0,0 +1,22 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0129_created_at_brin_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="resume_count",
+            field=models.PositiveSmallIntegerField(
+                default=0,
+                editable=False,
+                help_text=(
+                    "How many times the job was resumed after its worker restarted."
+                ),
+            ),
+        ),
+    ]
@@ -0,0 +1,35 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0130_job_resume_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="retry_of",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                help_text="The failed job whose remaining steps this job retries.",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="retries",
+                to="api.job",
+            ),
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="commit_sha",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                help_text="The commit the job's steps were run from.",
+                max_length=40,
+            ),
+        ),
+    ]
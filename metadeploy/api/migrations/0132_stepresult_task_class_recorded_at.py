@@ -0,0 +1,32 @@
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0131_job_retry_of_commit_sha"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stepresult",
+            name="task_class",
+            field=models.CharField(
+                blank=True,
+                help_text="dotted module path to the BaseTask implementation that ran",
+                max_length=2048,
+            ),
+        ),
+        migrations.AddField(
+            model_name="stepresult",
+            name="recorded_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name="stepresult",
+            index=django.contrib.postgres.indexes.BrinIndex(
+                fields=["recorded_at"], name="stepresult_recorded_brin"
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations, models
+
+import metadeploy.tracing
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0132_stepresult_task_class_recorded_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="trace_id",
+            field=models.CharField(
+                blank=True,
+                default=metadeploy.tracing.current_trace_id,
+                editable=False,
+                help_text="The trace of the request that created the job.",
+                max_length=32,
+            ),
+        ),
+    ]
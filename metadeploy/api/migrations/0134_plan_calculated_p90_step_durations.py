@@ -0,0 +1,56 @@
+import math
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list, as in api.models."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def populate_plan_durations(apps, schema_editor):
+    """Copy the p90 and per-step medians of existing duration stats to plans."""
+    Plan = apps.get_model("api", "Plan")
+    PlanDurationStats = apps.get_model("api", "PlanDurationStats")
+    for stats in PlanDurationStats.objects.iterator():
+        Plan.objects.filter(pk=stats.plan_id).update(
+            calculated_p90_duration=None if stats.p90 is None else int(stats.p90),
+            calculated_step_durations={
+                step_key: round(percentile(durations, 0.5))
+                for step_key, durations in stats.step_durations.items()
+                if len(durations) >= settings.MINIMUM_JOBS_FOR_AVERAGE
+            },
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0133_job_trace_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="plan",
+            name="calculated_p90_duration",
+            field=models.IntegerField(
+                blank=True,
+                editable=False,
+                help_text="Nine in ten successful jobs finish within this many seconds.",
+                null=True,
+                verbose_name="90th percentile duration of a plan (seconds)",
+            ),
+        ),
+        migrations.AddField(
+            model_name="plan",
+            name="calculated_step_durations",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                editable=False,
+                help_text="The median duration of each step (seconds), by step id.",
+            ),
+        ),
+        migrations.RunPython(populate_plan_durations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def delete_preflight_step_results(apps, schema_editor):
+    """
+    Drop the StepResult rows 0125 copied out of preflights: nothing reads them,
+    and preflights keep their outcomes in PreflightResult.results.
+    """
+    StepResult = apps.get_model("api", "StepResult")
+    StepResult.objects.filter(preflight_result__isnull=False).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0134_plan_calculated_p90_step_durations"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="stepresult",
+            name="stepresult_single_parent",
+        ),
+        migrations.RemoveConstraint(
+            model_name="stepresult",
+            name="stepresult_preflight_step_uniq",
+        ),
+        migrations.RemoveConstraint(
+            model_name="stepresult",
+            name="stepresult_job_step_uniq",
+        ),
+        migrations.RunPython(
+            delete_preflight_step_results, reverse_code=migrations.RunPython.noop
+        ),
+        migrations.RemoveField(
+            model_name="stepresult",
+            name="preflight_result",
+        ),
+        migrations.AlterField(
+            model_name="stepresult",
+            name="job",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="step_results",
+                to="api.job",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="stepresult",
+            constraint=models.UniqueConstraint(
+                fields=("job", "step_key", "position"),
+                name="stepresult_job_step_uniq",
+            ),
+        ),
+    ]
@@ -1,8 +1,10 @@
+import hashlib
 import logging
+import math
 import uuid
-from statistics import median
 from typing import Union
 
+from allauth.socialaccount.models import SocialToken
 from asgiref.sync import async_to_sync
 from colorfield.fields import ColorField
 from cumulusci.core.config import FlowConfig
@@ -17,12 +19,19 @@ from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.models import UserManager as BaseUserManager
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import BrinIndex
 from django.contrib.sites.models import Site
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MaxValueValidator, MinValueValidator, RegexValidator
-from django.db import models
-from django.db.models import Count, F, Func, JSONField, Q
+from django.db import connections, models, transaction
+from django.db.models import Case, Count, F, Func, JSONField, Prefetch, Q, Value, When
+from django.db.models.functions import Concat
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 from hashid_field import HashidAutoField
 from model_utils import Choices, FieldTracker
@@ -32,8 +41,10 @@ from sfdo_template_helpers.crypto import fernet_decrypt
 from sfdo_template_helpers.fields import MarkdownField as BaseMarkdownField
 from sfdo_template_helpers.slugs import AbstractSlug, SlugMixin
 
+from .. import tracing
+from .artifacts import evict_deploy_artifacts
 from .belvedere_utils import convert_to_18
-from .constants import ERROR, HIDE, OPTIONAL, ORGANIZATION_DETAILS, SKIP
+from .constants import ERROR, HIDE, OK, OPTIONAL, ORGANIZATION_DETAILS, SKIP, WARN
 from .flows import JobFlowCallback, PreflightFlowCallback
 from .push import (
     notify_org_changed,
@@ -107,6 +118,13 @@ class AllowedListOrg(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=("org_id", "allowed_list"), name="allowedlistorg_org_list_idx"
+            )
+        ]
+
     def save(self, *args, **kwargs):
         if len(self.org_id) == 15:
             self.org_id = convert_to_18(self.org_id)
@@ -122,12 +140,12 @@ class AllowedListAccessMixin(models.Model):
     )
 
     def is_visible_to(self, user):
-        return not self.visible_to or (
+        return not self.visible_to_id or (
             user.is_authenticated
             and (
                 user.is_superuser
+                or self.visible_to_id in user.allowed_list_ids
                 or user.full_org_type in self.visible_to.org_type
-                or self.visible_to.orgs.filter(org_id=user.org_id).exists()
             )
         )
 
@@ -146,75 +164,164 @@ class UserManager(BaseUserManager):
     pass
 
 
+class SalesforceIdentity:
+    """
+    An immutable snapshot of the Salesforce identity stored on a user's SocialAccount.
+
+    Built once per User instance so that the many properties read while serializing
+    or validating don't each re-query the account. Tokens are kept encrypted until
+    first asked for, and then decrypted only once.
+    """
+
+    __slots__ = (
+        "username",
+        "org_id",
+        "oauth_id",
+        "instance_url",
+        "org_name",
+        "org_type",
+        "full_org_type",
+        "_encrypted_token",
+        "_token",
+    )
+
+    def __init__(self, extra_data, token=None):
+        set_ = super().__setattr__
+        set_("username", extra_data.get("preferred_username"))
+        set_("org_id", extra_data.get("organization_id"))
+        set_("oauth_id", extra_data.get("id"))
+        set_("instance_url", extra_data.get("instance_url"))
+        try:
+            org_details = extra_data[ORGANIZATION_DETAILS] or {}
+        except KeyError:
+            org_details = {}
+        set_("org_name", org_details.get("Name"))
+        set_("org_type", org_details.get("OrganizationType"))
+        set_(
+            "full_org_type",
+            self._get_full_org_type(
+                org_type=org_details.get("OrganizationType"),
+                is_sandbox=org_details.get("IsSandbox"),
+                has_expiration=org_details.get("TrialExpirationDate") is not None,
+            ),
+        )
+        set_(
+            "_encrypted_token",
+            (token.token, token.token_secret) if token else (None, None),
+        )
+        set_("_token", None)
+
+    @classmethod
+    def from_social_account(cls, account):
+        if account is None:
+            return cls({})
+        # Relies on the tokens having been prefetched by User.social_account:
+        tokens = account.socialtoken_set.all()
+        return cls(account.extra_data, tokens[0] if tokens else None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    @staticmethod
+    def _get_full_org_type(*, org_type, is_sandbox, has_expiration):
+        if org_type is None or is_sandbox is None:
+            return None
+        if org_type == "Developer Edition" and not is_sandbox:
+            return ORG_TYPES.Developer
+        if org_type != "Developer Edition" and not is_sandbox:
+            return ORG_TYPES.Production
+        if is_sandbox and not has_expiration:
+            return ORG_TYPES.Sandbox
+        if is_sandbox and has_expiration:
+            return ORG_TYPES.Scratch
+
+    @property
+    def token(self):
+        if self._token is None:
+            token, token_secret = self._encrypted_token
+            if token is None:
+                decrypted = (None, None)
+            else:
+                decrypted = (fernet_decrypt(token), fernet_decrypt(token_secret))
+            super().__setattr__("_token", decrypted)
+        return self._token
+
+
 class User(HashIdMixin, AbstractUser):
     objects = UserManager()
 
+    # Per-instance memoized values. A User instance lives for a single request or
+    # job (and is reset per websocket message), so these are effectively
+    # request-scoped. Call clear_cached_org_data() after changing the account.
+    cached_org_properties = ("social_account", "sf_identity", "allowed_list_ids")
+
     def subscribable_by(self, user, session):
         return self == user
 
+    def clear_cached_org_data(self):
+        for name in self.cached_org_properties:
+            self.__dict__.pop(name, None)
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.clear_cached_org_data()
+
+    @cached_property
+    def social_account(self):
+        return self.socialaccount_set.prefetch_related(
+            Prefetch("socialtoken_set", queryset=SocialToken.objects.order_by("pk"))
+        ).first()
+
+    @cached_property
+    def sf_identity(self):
+        return SalesforceIdentity.from_social_account(self.social_account)
+
     @property
     def sf_username(self):
-        if self.social_account:
-            return self.social_account.extra_data.get("preferred_username")
-
-    def _get_org_property(self, key):
-        try:
-            return self.social_account.extra_data[ORGANIZATION_DETAILS][key]
-        except (AttributeError, KeyError):
-            return None
+        return self.sf_identity.username
 
     @property
     def org_id(self):
-        if self.social_account:
-            return self.social_account.extra_data.get("organization_id")
+        return self.sf_identity.org_id
 
     @property
     def oauth_id(self):
-        if self.social_account:
-            return self.social_account.extra_data.get("id")
+        return self.sf_identity.oauth_id
 
     @property
     def org_name(self):
-        return self._get_org_property("Name")
+        return self.sf_identity.org_name
 
     @property
     def org_type(self):
-        return self._get_org_property("OrganizationType")
+        return self.sf_identity.org_type
 
     @property
     def full_org_type(self):
-        org_type = self._get_org_property("OrganizationType")
-        is_sandbox = self._get_org_property("IsSandbox")
-        has_expiration = self._get_org_property("TrialExpirationDate") is not None
-        if org_type is None or is_sandbox is None:
-            return None
-        if org_type == "Developer Edition" and not is_sandbox:
-            return ORG_TYPES.Developer
-        if org_type != "Developer Edition" and not is_sandbox:
-            return ORG_TYPES.Production
-        if is_sandbox and not has_expiration:
-            return ORG_TYPES.Sandbox
-        if is_sandbox and has_expiration:
-            return ORG_TYPES.Scratch
+        return self.sf_identity.full_org_type
+
+    @cached_property
+    def allowed_list_ids(self):
+        """
+        IDs of every AllowedList that explicitly includes this user's org, loaded in
+        one query so that repeated visibility checks can be answered from memory.
+        """
+        org_id = self.org_id
+        if not org_id:
+            return frozenset()
+        return frozenset(
+            AllowedListOrg.objects.filter(org_id=org_id).values_list(
+                "allowed_list_id", flat=True
+            )
+        )
 
     @property
     def instance_url(self):
-        try:
-            return self.social_account.extra_data["instance_url"]
-        except (AttributeError, KeyError):
-            return None
+        return self.sf_identity.instance_url
 
     @property
     def token(self):
-        account = self.social_account
-        if account and account.socialtoken_set.exists():
-            token = self.social_account.socialtoken_set.first()
-            return (fernet_decrypt(token.token), fernet_decrypt(token.token_secret))
-        return (None, None)
-
-    @property
-    def social_account(self):
-        return self.socialaccount_set.first()
+        return self.sf_identity.token
 
     @property
     def valid_token_for(self):
@@ -372,9 +479,52 @@ class Version(HashIdMixin, TranslatableModel):
     )
     is_listed = models.BooleanField(default=True)
 
+    # Denormalized pointers to the plans shown for this version, kept current by
+    # Plan.save() and plan deletes (see refresh_plan_pointers) and verified by
+    # the check_plan_metadata management command:
+    primary_plan = models.ForeignKey(
+        "Plan",
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.SET_NULL,
+        related_name="+",
+    )
+    secondary_plan = models.ForeignKey(
+        "Plan",
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.SET_NULL,
+        related_name="+",
+    )
+    additional_plan_pks = ArrayField(
+        models.BigIntegerField(), blank=True, default=list, editable=False
+    )
+
+    tracker = FieldTracker(fields=("commit_ish", "is_listed"))
+
     class Meta:
         unique_together = (("product", "label"),)
 
+    def save(self, *args, **kwargs):
+        # Packages built for this version can't be used once it points at
+        # another commit or is withdrawn:
+        retired = self.pk and (
+            self.tracker.has_changed("commit_ish")
+            or (self.tracker.has_changed("is_listed") and not self.is_listed)
+        )
+        ret = super().save(*args, **kwargs)
+        if retired:
+            evict_deploy_artifacts(self.id)
+        return ret
+
+    def delete(self, *args, **kwargs):
+        version_id = self.id
+        ret = super().delete(*args, **kwargs)
+        evict_deploy_artifacts(version_id)
+        return ret
+
     def natural_key(self):
         return (self.product, self.label)
 
@@ -382,27 +532,38 @@ class Version(HashIdMixin, TranslatableModel):
         return f"{self.product}, Version {self.label}"
 
     @property
-    def primary_plan(self):
-        return (
-            self.plan_set.filter(tier=Plan.Tier.primary).order_by("-created_at").first()
+    def additional_plans(self):
+        return Plan.objects.filter(id__in=self.additional_plan_pks).order_by(
+            "plan_template_id", "order_key"
         )
 
-    @property
-    def secondary_plan(self):
-        return (
-            self.plan_set.filter(tier=Plan.Tier.secondary)
-            .order_by("-created_at")
-            .first()
-        )
+    def compute_plan_pointers(self):
+        """
+        Work out which plans this version points to, from its plans' tiers.
 
-    @property
-    def additional_plans(self):
+        Returns a dict of the denormalized field values.
+        """
+        plans = self.plan_set.order_by("-created_at")
+        primary_plan = plans.filter(tier=Plan.Tier.primary).first()
+        secondary_plan = plans.filter(tier=Plan.Tier.secondary).first()
         # get the most recently created plan for each plan template
-        return (
+        additional_plan_pks = (
             self.plan_set.filter(tier=Plan.Tier.additional)
             .order_by("plan_template_id", "order_key", "-created_at")
             .distinct("plan_template_id")
+            .values_list("id", flat=True)
         )
+        return {
+            "primary_plan_id": primary_plan.id if primary_plan else None,
+            "secondary_plan_id": secondary_plan.id if secondary_plan else None,
+            "additional_plan_pks": [int(pk) for pk in additional_plan_pks],
+        }
+
+    def refresh_plan_pointers(self):
+        values = self.compute_plan_pointers()
+        for name, value in values.items():
+            setattr(self, name, value)
+        Version.objects.filter(pk=self.pk).update(**values)
 
     def get_translation_strategy(self):
         return "fields", f"{self.product.slug}:version:{self.label}"
@@ -512,9 +673,41 @@ class Plan(HashIdMixin, SlugMixin, AllowedListAccessMixin, TranslatableModel):
         validators=[MinValueValidator(0)],
         help_text="The duration between the enqueueing of a job and its successful completion.",
     )
+    calculated_p90_duration = models.IntegerField(
+        "90th percentile duration of a plan (seconds)",
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Nine in ten successful jobs finish within this many seconds.",
+    )
+    calculated_step_durations = JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="The median duration of each step (seconds), by step id.",
+    )
+    # Denormalized from this plan's steps, kept current by Plan.save() and
+    # Step.save() (see refresh_step_metadata) and verified by the
+    # check_plan_metadata management command:
+    requires_preflight = models.BooleanField(default=False, editable=False)
+    required_step_pks = ArrayField(
+        models.BigIntegerField(), blank=True, default=list, editable=False
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # The fields that decide which versions point to this plan, and how:
+    tracker = FieldTracker(
+        fields=(
+            "version",
+            "tier",
+            "plan_template",
+            "order_key",
+            "is_listed",
+            "visible_to",
+        )
+    )
+
     slug_class = PlanSlug
     slug_field_name = "title"
 
@@ -532,7 +725,8 @@ class Plan(HashIdMixin, SlugMixin, AllowedListAccessMixin, TranslatableModel):
 
     @property
     def required_step_ids(self):
-        return self.steps.filter(is_required=True).values_list("id", flat=True)
+        to_python = Step._meta.pk.to_python
+        return [to_python(pk) for pk in self.required_step_pks]
 
     @property
     def slug_parent(self):
@@ -542,17 +736,29 @@ class Plan(HashIdMixin, SlugMixin, AllowedListAccessMixin, TranslatableModel):
     def slug_queryset(self):
         return self.plan_template.planslug_set
 
-    @property
-    def average_duration(self):
-        durations = [
-            (job.success_at - job.enqueued_at)
-            for job in Job.objects.filter(plan=self, status=Job.Status.complete)
+    def get_recent_durations(self):
+        """
+        Durations in seconds of the most recent completed jobs for this plan, oldest
+        first. This reads job history, so prefer the incrementally maintained
+        PlanDurationStats.
+        """
+        jobs = (
+            Job.objects.filter(plan=self, status=Job.Status.complete)
             .exclude(Q(success_at__isnull=True) | Q(enqueued_at__isnull=True))
-            .order_by("-created_at")[: settings.AVERAGE_JOB_WINDOW]
+            .order_by("-created_at")
+            .values_list("enqueued_at", "success_at")[: settings.AVERAGE_JOB_WINDOW]
+        )
+        return [
+            (success_at - enqueued_at).total_seconds()
+            for enqueued_at, success_at in list(jobs)[::-1]
         ]
+
+    @property
+    def average_duration(self):
+        durations = self.get_recent_durations()
         if len(durations) < settings.MINIMUM_JOBS_FOR_AVERAGE:
             return None
-        return median(durations).total_seconds()
+        return percentile(durations, 0.5)
 
     @property
     def scratch_org_duration(self):
@@ -564,13 +770,44 @@ class Plan(HashIdMixin, SlugMixin, AllowedListAccessMixin, TranslatableModel):
     def __str__(self):
         return f"{self.version}, Plan {self.title}"
 
-    @property
-    def requires_preflight(self):
-        has_plan_checks = bool(self.preflight_checks)
-        has_step_checks = any(
-            step.task_config.get("checks") for step in self.steps.iterator()
-        )
-        return has_plan_checks or has_step_checks
+    def compute_step_metadata(self):
+        """
+        Work out the values this plan denormalizes from its steps.
+
+        Returns a dict of the denormalized field values.
+        """
+        has_step_checks = False
+        required_step_pks = []
+        if self.pk:
+            steps = self.steps.values_list("id", "is_required", "task_config")
+            for step_id, is_required, task_config in steps:
+                has_step_checks = has_step_checks or bool(
+                    (task_config or {}).get("checks")
+                )
+                if is_required:
+                    required_step_pks.append(int(step_id))
+        return {
+            "requires_preflight": bool(self.preflight_checks) or has_step_checks,
+            "required_step_pks": required_step_pks,
+        }
+
+    def refresh_step_metadata(self):
+        values = self.compute_step_metadata()
+        for name, value in values.items():
+            setattr(self, name, value)
+        Plan.objects.filter(pk=self.pk).update(**values)
+
+    def _refresh_version_pointers(self):
+        # The plan may have moved between versions or tiers, so refresh any version
+        # still pointing at it as well as its current one:
+        stale_versions = Version.objects.filter(
+            Q(primary_plan=self)
+            | Q(secondary_plan=self)
+            | Q(additional_plan_pks__contains=[int(self.pk)])
+        ).exclude(pk=self.version_id)
+        for version in stale_versions:
+            version.refresh_plan_pointers()
+        self.version.refresh_plan_pointers()
 
     def get_translation_strategy(self):
         return (
@@ -598,7 +835,14 @@ class Plan(HashIdMixin, SlugMixin, AllowedListAccessMixin, TranslatableModel):
             )
 
     def save(self, *args, **kwargs):
+        for name, value in self.compute_step_metadata().items():
+            setattr(self, name, value)
+        moved = self._state.adding or any(
+            self.tracker.has_changed(field) for field in self.tracker.fields
+        )
         super().save(*args, **kwargs)
+        if moved:
+            self._refresh_version_pointers()
 
         from ..adminapi.translations import update_translations
 
@@ -607,6 +851,13 @@ class Plan(HashIdMixin, SlugMixin, AllowedListAccessMixin, TranslatableModel):
         update_translations(self)
 
 
+@receiver(post_delete, sender=Plan)
+def refresh_version_pointers_after_plan_delete(sender, instance, **kwargs):
+    # Covers queryset deletes too, which skip Plan.delete(). The pointers to
+    # the plan are already nulled; point the version at whatever plan is next:
+    Version.objects.get(pk=instance.version_id).refresh_plan_pointers()
+
+
 class DottedArray(Func):
     """Turns a step number into an array of ints for sorting.
 
@@ -695,17 +946,217 @@ class Step(HashIdMixin, TranslatableModel):
 
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
+        self.plan.refresh_step_metadata()
 
         from ..adminapi.translations import update_translations
 
         update_translations(self)
 
+    def delete(self, *args, **kwargs):
+        plan = self.plan
+        ret = super().delete(*args, **kwargs)
+        plan.refresh_step_metadata()
+        return ret
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def summarize_durations(values) -> dict:
+    """The median, 95th percentile and maximum of some durations, to 0.1."""
+    values = list(values)
+    if not values:
+        return {"p50": None, "p95": None, "max": None}
+    return {
+        "p50": round(percentile(values, 0.5), 1),
+        "p95": round(percentile(values, 0.95), 1),
+        "max": round(max(values), 1),
+    }
+
+
+class PlanDurationStats(models.Model):
+    """
+    Rolling job duration statistics for a plan, updated as each job completes.
+
+    The most recent ``AVERAGE_JOB_WINDOW`` durations are kept as a ring buffer,
+    for the plan as a whole and for each of its steps.
+    """
+
+    plan = models.OneToOneField(
+        Plan, on_delete=models.CASCADE, primary_key=True, related_name="duration_stats"
+    )
+    # Seconds, oldest first:
+    durations = ArrayField(models.FloatField(), blank=True, default=list)
+    # Step key (as in Job.results) to a list of seconds, oldest first:
+    step_durations = JSONField(default=dict, blank=True)
+    p50 = models.FloatField(null=True, blank=True)
+    p90 = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "plan duration stats"
+
+    def __str__(self):
+        return f"Duration stats for {self.plan_id}"
+
+    @staticmethod
+    def _append(window, value):
+        size = settings.AVERAGE_JOB_WINDOW
+        return (window + [value])[-size:]
+
+    def _update_percentiles(self):
+        if len(self.durations) < settings.MINIMUM_JOBS_FOR_AVERAGE:
+            self.p50 = self.p90 = None
+        else:
+            self.p50 = percentile(self.durations, 0.5)
+            self.p90 = percentile(self.durations, 0.9)
+
+    @property
+    def step_p50s(self):
+        return {
+            step_key: percentile(durations, 0.5)
+            for step_key, durations in self.step_durations.items()
+            if durations
+        }
+
+    @property
+    def step_etas(self):
+        """The median whole seconds of the steps with enough recorded runs."""
+        return {
+            step_key: round(percentile(durations, 0.5))
+            for step_key, durations in self.step_durations.items()
+            if len(durations) >= settings.MINIMUM_JOBS_FOR_AVERAGE
+        }
+
+    @classmethod
+    def record_job(cls, job):
+        """Add a completed job's total and per-step durations to its plan's stats."""
+        if not (job.enqueued_at and job.success_at):
+            return None
+        duration = (job.success_at - job.enqueued_at).total_seconds()
+        step_durations = dict(
+            job.step_results.filter(duration__isnull=False).values_list(
+                "step_key", "duration"
+            )
+        )
+
+        with transaction.atomic():
+            stats, created = cls.objects.select_for_update().get_or_create(
+                plan_id=job.plan_id
+            )
+            if created:
+                # Seed from history, which already includes this job:
+                stats.durations = job.plan.get_recent_durations()
+            else:
+                stats.durations = cls._append(stats.durations, duration)
+            for step_key, step_duration in step_durations.items():
+                stats.step_durations[step_key] = cls._append(
+                    stats.step_durations.get(step_key, []), step_duration
+                )
+            stats._update_percentiles()
+            stats.save()
+            Plan.objects.filter(pk=job.plan_id).update(
+                calculated_average_duration=(
+                    None if stats.p50 is None else int(stats.p50)
+                ),
+                calculated_p90_duration=None if stats.p90 is None else int(stats.p90),
+                calculated_step_durations=stats.step_etas,
+            )
+        return stats
+
+
+# Agreement ids by digest, shared by every process. Deleting an agreement drops
+# its entry; the timeout bounds how long one removed some other way can linger:
+AGREEMENT_ID_CACHE_KEY = "click-through-agreement:{digest}"
+AGREEMENT_ID_CACHE_TIMEOUT = 60 * 60
+
+
+class ClickThroughAgreementQuerySet(models.QuerySet):
+    def get_id_for_text(self, text):
+        """
+        Return the id of the agreement with exactly this text, creating it if
+        needed. Agreements are looked up by the digest of their text, and the
+        result is cached.
+        """
+        digest = ClickThroughAgreement.get_digest(text)
+        key = AGREEMENT_ID_CACHE_KEY.format(digest=digest)
+        agreement_id = cache.get(key)
+        if agreement_id is None:
+            agreement, _ = self.get_or_create(digest=digest, defaults={"text": text})
+            agreement_id = agreement.id
+            cache.set(key, agreement_id, AGREEMENT_ID_CACHE_TIMEOUT)
+        return agreement_id
+
 
 class ClickThroughAgreement(models.Model):
+    objects = ClickThroughAgreementQuerySet.as_manager()
+
     text = models.TextField()
+    digest = models.CharField(max_length=64, unique=True, editable=False)
+
+    tracker = FieldTracker(fields=("digest",))
+
+    @staticmethod
+    def get_digest(text):
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    @staticmethod
+    def clear_cache():
+        cache.delete_pattern(AGREEMENT_ID_CACHE_KEY.format(digest="*"))
+
+    def save(self, *args, **kwargs):
+        self.digest = self.get_digest(self.text)
+        old_digest = self.tracker.previous("digest")
+        super().save(*args, **kwargs)
+        if old_digest and old_digest != self.digest:
+            cache.delete(AGREEMENT_ID_CACHE_KEY.format(digest=old_digest))
+
 
+@receiver(post_delete, sender=ClickThroughAgreement)
+def forget_deleted_agreement(sender, instance, **kwargs):
+    # Covers queryset and admin bulk deletes, for every process at once:
+    cache.delete(AGREEMENT_ID_CACHE_KEY.format(digest=instance.digest))
 
-class Job(HashIdMixin, models.Model):
+
+class StepResultsMixin(models.Model):
+    """
+    Shared by Job and PreflightResult, whose ``results`` map each step's key to a
+    list of outcomes. The error and warning totals are kept as columns rather
+    than counted on each read.
+    """
+
+    error_count = models.PositiveIntegerField(default=0, editable=False)
+    warning_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        abstract = True
+
+    @staticmethod
+    def count_status_in_results(results, status_name):
+        count = 0
+        for results_list in results.values():
+            for result in results_list:
+                try:
+                    if result["status"] == status_name:
+                        count += 1
+                except TypeError:
+                    pass
+        return count
+
+    def get_results(self):
+        """The outcomes of each step, in the shape of the results JSON."""
+        return self.results
+
+    def update_result_counts(self):
+        results = self.get_results()
+        self.error_count = self.count_status_in_results(results, ERROR)
+        self.warning_count = self.count_status_in_results(results, WARN)
+
+
+class Job(HashIdMixin, StepResultsMixin, models.Model):
     Status = Choices("started", "complete", "failed", "canceled")
     tracker = FieldTracker(fields=("results", "status"))
 
@@ -750,6 +1201,57 @@ class Job(HashIdMixin, models.Model):
         related_name="msa_jobs",
     )
     is_release_test = models.BooleanField(default=False)
+    resume_count = models.PositiveSmallIntegerField(
+        default=0,
+        editable=False,
+        help_text="How many times the job was resumed after its worker restarted.",
+    )
+    retry_of = models.ForeignKey(
+        "self",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="retries",
+        help_text="The failed job whose remaining steps this job retries.",
+    )
+    commit_sha = models.CharField(
+        max_length=40,
+        blank=True,
+        editable=False,
+        help_text="The commit the job's steps were run from.",
+    )
+    trace_id = models.CharField(
+        max_length=32,
+        blank=True,
+        default=tracing.current_trace_id,
+        editable=False,
+        help_text="The trace of the request that created the job.",
+    )
+
+    class Meta:
+        indexes = [
+            # Running job for an org (job admission, org serialization):
+            models.Index(
+                fields=("org_id",),
+                condition=Q(status="started"),
+                name="job_org_started_idx",
+            ),
+            # Jobs waiting for the enqueuer:
+            models.Index(
+                fields=("created_at",),
+                condition=Q(enqueued_at__isnull=True),
+                name="job_unenqueued_idx",
+            ),
+            # Recent completed jobs for a plan (average duration):
+            models.Index(
+                fields=("plan", "-created_at"),
+                condition=Q(status="complete"),
+                name="job_plan_complete_idx",
+            ),
+            # Time-range scans (archival, admin date filter):
+            BrinIndex(fields=("created_at",), name="job_created_brin"),
+        ]
 
     @property
     def org_name(self):
@@ -781,11 +1283,81 @@ class Job(HashIdMixin, models.Model):
         scratch_org = ScratchOrg.objects.get_from_session(session)
         return scratch_org and scratch_org.org_id == self.org_id
 
+    def get_results(self):
+        """
+        The results JSON, which holds the outcomes set when the job was created
+        (hidden steps), overlaid with the outcomes recorded as StepResults while
+        it runs.
+        """
+        if self.pk is None:
+            return self.results
+        recorded = {}
+        for step_result in self.step_results.all():
+            recorded.setdefault(step_result.step_key, []).append(
+                step_result.as_result()
+            )
+        return {**self.results, **recorded}
+
+    def record_step_result(self, step_key, *, position=0, **values):
+        """Create or update the single StepResult row for one step outcome."""
+        StepResult.objects.update_or_create(
+            job=self, step_key=step_key, position=position, defaults=values
+        )
+
+    def append_step_logs(self, step_key, content):
+        """Append a line to the logs of a step's outcome, in one query."""
+        updated = StepResult.objects.filter(
+            job=self, step_key=step_key, position=0
+        ).update(
+            logs=Case(
+                When(logs__isnull=True, then=Value(content)),
+                default=Concat("logs", Value(f"\n{content}")),
+                output_field=models.TextField(),
+            )
+        )
+        if not updated:
+            StepResult.objects.create(job=self, step_key=step_key, logs=content)
+
+    def completed_step_results(self):
+        """The StepResults checkpointing the steps this job has completed."""
+        return self.step_results.filter(status=OK, position=0)
+
+    def _completed_step_keys(self):
+        return set(self.completed_step_results().values_list("step_key", flat=True))
+
     def skip_steps(self):
+        """
+        The step_nums of the plan's steps to skip: those not selected for this
+        job, and those it already completed before being resumed.
+        """
+        selected = set(self.steps.all())
+        completed = self._completed_step_keys()
         return [
-            step.step_num for step in set(self.plan.steps.all()) - set(self.steps.all())
+            step.step_num
+            for step in self.plan.steps.all()
+            if step not in selected or str(step.id) in completed
         ]
 
+    def remaining_steps(self):
+        """The steps selected for this job that it didn't complete."""
+        completed = self._completed_step_keys()
+        return [step for step in self.steps.all() if str(step.id) not in completed]
+
+    def prepare_resume(self):
+        """
+        Hand this job back to the enqueuer after its worker was interrupted, if it
+        hasn't already been resumed JOB_MAX_RESUMES times. It stays started, and
+        its rerun skips the steps it already completed. The caller saves.
+
+        Returns whether the job will be resumed.
+        """
+        if self.resume_count >= settings.JOB_MAX_RESUMES:
+            return False
+        self.enqueued_at = None
+        self.job_id = None
+        self.resume_count += 1
+        return True
+
     def _push_if_condition(self, condition, fn):
         if condition:
             async_to_sync(fn)(self)
@@ -799,6 +1371,13 @@ class Job(HashIdMixin, models.Model):
         results_has_changed = "results" in changed and self.results != {}
         self._push_if_condition(results_has_changed, notify_post_task)
 
+    def push_results_changed(self):
+        """Push the job's results after recording a step's outcome or logs."""
+        try:
+            async_to_sync(notify_post_task)(self)
+        except RuntimeError as error:  # pragma: no cover
+            logger.warn(f"RuntimeError: {error}")
+
     def push_if_has_stopped_running(self, changed):
         has_stopped_running = "status" in changed and self.status != Job.Status.started
         self._push_if_condition(has_stopped_running, notify_post_job)
@@ -807,21 +1386,23 @@ class Job(HashIdMixin, models.Model):
         is_new = self._state.adding
         changed = self.tracker.changed()
 
+        if is_new or "results" in changed:
+            self.update_result_counts()
+
         if is_new:
-            ctt, _ = ClickThroughAgreement.objects.get_or_create(
-                text=self.plan.version.product.click_through_agreement
+            agreements = ClickThroughAgreement.objects
+            self.click_through_agreement_id = agreements.get_id_for_text(
+                self.plan.version.product.click_through_agreement
             )
-            self.click_through_agreement = ctt
 
             # If this is a scratch org job and we have an MSA configured,
             # persist that too.
             if self.is_scratch:
                 profile = SiteProfile.objects.first()
                 if profile and profile.master_agreement:
-                    msa, _ = ClickThroughAgreement.objects.get_or_create(
-                        text=profile.master_agreement
+                    self.master_service_agreement_id = agreements.get_id_for_text(
+                        profile.master_agreement
                     )
-                    self.master_service_agreement = msa
 
         ret = super().save(*args, **kwargs)
 
@@ -854,10 +1435,16 @@ class Job(HashIdMixin, models.Model):
             preflight.save()
 
     def run(self, ctx, plan, steps, org):
+        callbacks = JobFlowCallback(self)
         flow_coordinator = FlowCoordinator.from_steps(
-            ctx.project_config, steps, name="default", callbacks=JobFlowCallback(self)
+            ctx.project_config, steps, name="default", callbacks=callbacks
         )
-        flow_coordinator.run(org)
+        try:
+            flow_coordinator.run(org)
+        finally:
+            # post_flow normally detaches the log handlers, but the flow can fail
+            # after pre_flow and before post_flow is guaranteed to run.
+            callbacks.stop_capture()
 
 
 class PreflightResultQuerySet(models.QuerySet):
@@ -867,8 +1454,47 @@ class PreflightResultQuerySet(models.QuerySet):
             kwargs.update({"is_valid": True, "status": PreflightResult.Status.complete})
         return self.filter(**kwargs).order_by("-created_at").first()
 
+    def expire(self, *, created_before, limit):
+        """
+        Invalidate up to ``limit`` valid preflights created before ``created_before``
+        with a single UPDATE ... RETURNING. Any still marked as started have stalled
+        (e.g. from a dyno restart), so they are also canceled.
 
-class PreflightResult(models.Model):
+        This bypasses save(), so no notifications are sent. Returns a list of
+        ``(id, org_id, was_started)`` for the expired preflights.
+        """
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        sql = f"""
+            UPDATE {table} AS preflight
+            SET is_valid = false,
+                status = CASE
+                    WHEN expired.status = %(started)s THEN %(canceled)s
+                    ELSE expired.status
+                END,
+                edited_at = %(now)s
+            FROM (
+                SELECT id, status FROM {table}
+                WHERE is_valid AND created_at <= %(created_before)s
+                LIMIT %(limit)s
+                FOR UPDATE SKIP LOCKED
+            ) AS expired
+            WHERE preflight.id = expired.id
+            RETURNING preflight.id, preflight.org_id, expired.status = %(started)s
+        """
+        params = {
+            "started": PreflightResult.Status.started,
+            "canceled": PreflightResult.Status.canceled,
+            "now": timezone.now(),
+            "created_before": created_before,
+            "limit": limit,
+        }
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+
+class PreflightResult(StepResultsMixin, models.Model):
     Status = Choices("started", "complete", "failed", "canceled")
 
     tracker = FieldTracker(fields=("status", "is_valid"))
@@ -905,6 +1531,30 @@ class PreflightResult(models.Model):
     exception = models.TextField(null=True)
     is_release_test = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # PreflightResult.objects.most_recent():
+            models.Index(
+                fields=("org_id", "plan", "-created_at"),
+                condition=Q(is_valid=True, status="complete"),
+                name="preflight_most_recent_idx",
+            ),
+            # Running preflight for an org (org serialization):
+            models.Index(
+                fields=("org_id",),
+                condition=Q(status="started"),
+                name="preflight_org_started_idx",
+            ),
+            # Valid preflights due to expire:
+            models.Index(
+                fields=("created_at",),
+                condition=Q(is_valid=True),
+                name="preflight_valid_created_idx",
+            ),
+            # Time-range scans (archival, admin date filter):
+            BrinIndex(fields=("created_at",), name="preflight_created_brin"),
+        ]
+
     @property
     def instance_url(self):
         if self.user:
@@ -979,6 +1629,7 @@ class PreflightResult(models.Model):
         is_new = self._state.adding
         changed = self.tracker.changed()
 
+        self.update_result_counts()
         ret = super().save(*args, **kwargs)
 
         try:
@@ -994,14 +1645,71 @@ class PreflightResult(models.Model):
 
     def run(self, ctx, plan, steps, org):
         flow_config = FlowConfig({"checks": plan.preflight_checks, "steps": {}})
+        callbacks = PreflightFlowCallback(self)
         flow_coordinator = PreflightFlowCoordinator(
             ctx.project_config,
             flow_config,
             name="preflight",
-            callbacks=PreflightFlowCallback(self),
+            callbacks=callbacks,
         )
         flow_coordinator.steps = steps
-        flow_coordinator.run(org)
+        try:
+            flow_coordinator.run(org)
+        finally:
+            callbacks.stop_capture()
+
+
+class StepResult(models.Model):
+    """
+    A single outcome of a job's step, recorded (and its logs appended to) on its
+    own as the step runs rather than by rewriting the job's ``results`` JSON.
+
+    Preflight outcomes are written once, when the preflight finishes, so they
+    stay in PreflightResult.results.
+    """
+
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name="step_results")
+    # The key used in the results JSON: a Step id, or "plan" for plan-level checks
+    step_key = models.CharField(max_length=64)
+    position = models.PositiveSmallIntegerField(default=0)
+    status = models.CharField(max_length=64, blank=True)
+    # Null where the outcome has no such key, so the JSON shape round-trips:
+    message = models.TextField(null=True, blank=True)
+    logs = models.TextField(null=True, blank=True)
+    duration = models.FloatField(
+        null=True, blank=True, help_text="How long the step took, in seconds."
+    )
+    task_class = models.CharField(
+        max_length=2048,
+        blank=True,
+        help_text="dotted module path to the BaseTask implementation that ran",
+    )
+    recorded_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ("step_key", "position")
+        indexes = [
+            # Time-range scans (step timing reports):
+            BrinIndex(fields=("recorded_at",), name="stepresult_recorded_brin"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=("job", "step_key", "position"),
+                name="stepresult_job_step_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.step_key}[{self.position}]: {self.status}"
+
+    def as_result(self):
+        """This outcome in the shape used by the results JSON."""
+        result = {"status": self.status} if self.status else {}
+        if self.message is not None:
+            result["message"] = self.message
+        if self.logs is not None:
+            result["logs"] = self.logs
+        return result
 
 
 class ScratchOrgQuerySet(models.QuerySet):
@@ -1044,6 +1752,12 @@ class ScratchOrg(HashIdMixin, models.Model):
 
     objects = ScratchOrgQuerySet.as_manager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=("uuid",), name="scratchorg_uuid_idx"),
+            models.Index(fields=("org_id",), name="scratchorg_org_id_idx"),
+        ]
+
     def clean_config(self):
         banned_keys = {"email", "access_token", "refresh_token"}
         if self.config:
@@ -1117,6 +1831,7 @@ class ScratchOrg(HashIdMixin, models.Model):
             org_name=org_name or self.plan.org_config_name,
             keychain=keychain,
             sbx_login=True,
+            org_id=self.org_id,
         )
         return org_config
 
@@ -24,12 +24,14 @@ Websocket notifications you can subscribe to:
         PREFLIGHT_STARTED
         JOB_STARTED
 """
+import asyncio
 import logging
 
 from asgiref.sync import sync_to_async
 from channels.layers import get_channel_layer
 from django.utils.translation import gettext_lazy as _
 
+from .. import tracing
 from ..consumer_utils import get_set_message_semaphore
 from .constants import CHANNELS_GROUP_NAME
 from .hash_url import convert_org_id_to_key
@@ -72,12 +74,26 @@ async def push_serializable(instance, serializer, type_, group_name=None):
         "serializer": serializer_name,
         "inner_type": type_,
     }
+    trace = tracing.inject()
+    if trace:
+        # The consumer serializes the instance as part of the same trace:
+        message["trace"] = trace
     await push_message(group_name, message)
 
 
-async def user_token_expired(user):
+async def user_tokens_expired(user_ids):
+    """Tell each of several users that their token is no longer valid."""
     message = {"type": "USER_TOKEN_INVALID"}
-    await push_message_about_instance(user, message)
+    group_names = [CHANNELS_GROUP_NAME.format(model="user", id=id) for id in user_ids]
+    await asyncio.gather(
+        *(
+            push_message(
+                group_name,
+                {"type": "notify", "group": group_name, "content": message},
+            )
+            for group_name in group_names
+        )
+    )
 
 
 async def preflight_completed(preflight):
@@ -120,6 +136,37 @@ async def preflight_invalidated(preflight):
     )
 
 
+async def preflights_expired(preflight_ids, canceled_ids=(), org_ids=()):
+    """
+    Push the notifications for a batch of preflights that expire_preflights()
+    invalidated in bulk: PREFLIGHT_CANCELED for the ones that had stalled,
+    PREFLIGHT_INVALIDATED for all of them, and one ORG_CHANGED per affected org
+    rather than one per preflight.
+    """
+    from .models import PreflightResult
+    from .serializers import PreflightResultSerializer
+
+    # push_serializable only needs the model and id; the consumer serializes the
+    # preflight itself for each subscriber.
+    await asyncio.gather(
+        *(
+            push_serializable(
+                PreflightResult(id=id), PreflightResultSerializer, "PREFLIGHT_CANCELED"
+            )
+            for id in canceled_ids
+        ),
+        *(
+            push_serializable(
+                PreflightResult(id=id),
+                PreflightResultSerializer,
+                "PREFLIGHT_INVALIDATED",
+            )
+            for id in preflight_ids
+        ),
+        *(notify_org_id_changed(org_id) for org_id in org_ids),
+    )
+
+
 async def report_error(user):
     message = {
         "type": "BACKEND_ERROR",
@@ -150,10 +197,11 @@ async def notify_post_job(job):
 
 
 async def notify_org_result_changed(result):
+    await notify_org_id_changed(result.org_id)
 
-    type_ = "ORG_CHANGED"
-    org_id = result.org_id
 
+async def notify_org_id_changed(org_id):
+    type_ = "ORG_CHANGED"
     data = await serialize_org(org_id)
 
     group_name = CHANNELS_GROUP_NAME.format(
@@ -0,0 +1,117 @@
+"""
+Telemetry on the RQ queues and their workers, for deciding when to add or
+remove worker dynos.
+
+Wait and run times come from the RQ jobs that started or ended in the last
+QUEUE_METRICS_WINDOW seconds: the ones still running, and the finished and
+failed ones RQ still remembers.
+"""
+from statistics import mean
+
+import django_rq
+from django.conf import settings
+from rq.job import Job as RQJob
+from rq.registry import FailedJobRegistry, FinishedJobRegistry, StartedJobRegistry
+from rq.utils import current_timestamp, utcnow
+from rq.worker import Worker, WorkerStatus
+
+from .models import Job, summarize_durations
+
+QUEUE_NAMES = ("default", "short")
+
+
+def _recent_failed_job_ids(queue, window):
+    """
+    The failed jobs that may have ended in the last window seconds, to be
+    narrowed down by their ended_at.
+
+    A failed job's score in the registry is when it ended plus its failure_ttl,
+    so it is never less than when it ended.
+    """
+    registry = FailedJobRegistry(queue=queue)
+    job_ids = registry.connection.zrangebyscore(
+        registry.key, current_timestamp() - window, "+inf"
+    )
+    return [job_id.decode() for job_id in job_ids]
+
+
+def queue_metrics(name) -> dict:
+    """Depth, wait times, workers, failure rate and backlog ETA of one queue."""
+    queue = django_rq.get_queue(name)
+    connection = queue.connection
+    window = settings.QUEUE_METRICS_WINDOW
+    now = utcnow()
+
+    depth = len(queue)
+    oldest = next(
+        (job for job in RQJob.fetch_many(queue.get_job_ids(0, 0), connection) if job),
+        None,
+    )
+    oldest_age = (
+        round((now - oldest.enqueued_at).total_seconds(), 1)
+        if oldest and oldest.enqueued_at
+        else None
+    )
+
+    started_ids = StartedJobRegistry(queue=queue).get_job_ids()
+    finished_ids = set(FinishedJobRegistry(queue=queue).get_job_ids())
+    failed_ids = set(_recent_failed_job_ids(queue, window))
+    jobs = [
+        job
+        for job in RQJob.fetch_many(
+            [*started_ids, *finished_ids, *failed_ids], connection
+        )
+        if job
+    ]
+    waits = [
+        (job.started_at - job.enqueued_at).total_seconds()
+        for job in jobs
+        if job.started_at
+        and job.enqueued_at
+        and (now - job.started_at).total_seconds() <= window
+    ]
+    ended = [
+        job
+        for job in jobs
+        if job.ended_at and (now - job.ended_at).total_seconds() <= window
+    ]
+    finished = [job for job in ended if job.id in finished_ids and job.started_at]
+    failed = [job for job in ended if job.id in failed_ids]
+    run_times = [(job.ended_at - job.started_at).total_seconds() for job in finished]
+
+    workers = [
+        worker
+        for worker in Worker.all(queue=queue)
+        if queue.name in worker.queue_names()
+    ]
+    busy = sum(worker.get_state() == WorkerStatus.BUSY for worker in workers)
+    outcomes = len(finished) + len(failed)
+    backlog_eta = (
+        round(depth * mean(run_times) / len(workers), 1)
+        if run_times and workers
+        else None
+    )
+
+    metrics = {
+        "depth": depth,
+        "oldest_job_age": oldest_age,
+        "wait": summarize_durations(waits),
+        "run_time": summarize_durations(run_times),
+        "workers": {"busy": busy, "idle": len(workers) - busy},
+        "finished": len(finished),
+        "failed": len(failed),
+        "failure_rate": round(len(failed) / outcomes, 3) if outcomes else None,
+        "backlog_eta": backlog_eta,
+    }
+    if name == "default":
+        # Jobs waiting in the database for the enqueuer:
+        metrics["pending_jobs"] = Job.objects.filter(enqueued_at=None).count()
+    return metrics
+
+
+def all_queue_metrics() -> dict:
+    return {
+        "window": settings.QUEUE_METRICS_WINDOW,
+        "max_queue_length": settings.MAX_QUEUE_LENGTH,
+        "queues": {name: queue_metrics(name) for name in QUEUE_NAMES},
+    }
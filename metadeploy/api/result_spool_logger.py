@@ -1,12 +1,18 @@
+import time
 from logging import Handler
 
 from ansi2html import Ansi2HTMLConverter
 
+# At most how often, in seconds, new log lines are pushed to the frontend. The
+# flow callback pushes once more when each step ends:
+PUSH_INTERVAL = 2
+
 
 class ResultSpoolLogger(Handler):
     def __init__(self, *args, result=None, **kwargs):
         self.result = result
         self.current_key = None
+        self.pushed_at = None
         super().__init__(*args, **kwargs)
 
     def emit(self, record):
@@ -15,18 +21,8 @@ class ResultSpoolLogger(Handler):
         msg = self.format(record)
         conv = Ansi2HTMLConverter(scheme="osx", inline=True)
         msg = conv.convert(msg, full=False)
-        try:
-            content = f"\n{msg}"
-            self.result.results[self.current_key][0]["logs"] += content
-        except KeyError as e:
-            content = msg
-            # If the missing key is "logs", we have a dict at
-            # current_key, so just add the logs key:
-            if e.args[0] == "logs":
-                self.result.results[self.current_key][0]["logs"] = content
-            # Otherwise, we don't have a dict there, so let's add one,
-            # and start it with the logs key:
-            else:
-                self.result.results[self.current_key] = [{"logs": content}]
-        # Websocket triggered on save automatically if results changes:
-        self.result.save()
+        self.result.append_step_logs(self.current_key, msg)
+        now = time.monotonic()
+        if self.pushed_at is None or now - self.pushed_at >= PUSH_INTERVAL:
+            self.pushed_at = now
+            self.result.push_results_changed()
@@ -4,6 +4,7 @@ Salesforce utilities
 
 
 import json
+import logging
 import os
 import time
 from datetime import datetime
@@ -14,12 +15,17 @@ from cumulusci.oauth.client import OAuth2Client, OAuth2ClientConfig
 from cumulusci.oauth.salesforce import jwt_session
 from cumulusci.tasks.salesforce.org_settings import DeployOrgSettings
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils.translation import gettext_lazy as _
 from requests.exceptions import HTTPError
 from rq import get_current_job
+from sfdo_template_helpers.crypto import fernet_decrypt, fernet_encrypt
 from simple_salesforce import Salesforce as SimpleSalesforce
 
+logger = logging.getLogger(__name__)
+
 # Salesforce connected app
 # Assign these locally, for brevity:
 SF_CALLBACK_URL = settings.SFDX_CLIENT_CALLBACK_URL
@@ -28,6 +34,13 @@ SF_CLIENT_ID = settings.SFDX_CLIENT_ID
 SF_CLIENT_SECRET = settings.SFDX_CLIENT_SECRET
 SFDX_SIGNUP_INSTANCE = settings.SFDX_SIGNUP_INSTANCE
 
+ORG_TOKEN_CACHE_KEY = "org-token:{org_id}"
+ORG_TOKEN_LOCK_KEY = "org-token-lock:{org_id}"
+ORG_TOKEN_REFRESHES_SAVED_KEY = "org-token:refreshes-saved"
+# Longest we expect a token refresh to take, and so how long other workers wait
+# for one before refreshing themselves:
+ORG_TOKEN_LOCK_TIMEOUT = 60
+
 
 class ScratchOrgError(Exception):
     pass
@@ -98,14 +111,52 @@ def _get_org_details(*, cci, org_name, project_path):
 
 
 def refresh_access_token(
-    *, scratch_org, config, org_name, keychain=None, sbx_login=False
+    *, scratch_org, config, org_name, keychain=None, sbx_login=False, org_id=None
 ):
     """Refresh the JWT.
 
     Construct a new OrgConfig because ScratchOrgConfig tries to use sfdx
     which we don't want now -- this is a total hack which I'll try to
     smooth over with some improvements in CumulusCI
+
+    If an org_id is given, an access token cached by an earlier refresh
+    for that org is reused until shortly before it expires, and
+    concurrent refreshes for the same org are collapsed into one across
+    workers.
     """
+    kwargs = {
+        "scratch_org": scratch_org,
+        "config": config,
+        "org_name": org_name,
+        "keychain": keychain,
+        "sbx_login": sbx_login,
+    }
+    if not org_id or not settings.ORG_TOKEN_LIFETIME:
+        return _refresh_access_token(**kwargs)
+
+    cached = get_cached_org_config(org_id)
+    if cached is None:
+        lock = cache.lock(
+            ORG_TOKEN_LOCK_KEY.format(org_id=org_id), timeout=ORG_TOKEN_LOCK_TIMEOUT
+        )
+        acquired = lock.acquire(blocking_timeout=ORG_TOKEN_LOCK_TIMEOUT)
+        try:
+            # Another worker may have refreshed the token while we waited:
+            cached = get_cached_org_config(org_id)
+            if cached is None:
+                org_config = _refresh_access_token(**kwargs)
+                cache_org_config(org_id, org_config)
+                _log_org_token(org_id, reused=False)
+                return org_config
+        finally:
+            if acquired:
+                lock.release()
+
+    _log_org_token(org_id, reused=True)
+    return OrgConfig(cached, org_name, keychain=keychain)
+
+
+def _refresh_access_token(*, scratch_org, config, org_name, keychain, sbx_login):
     try:
         org_config = OrgConfig(config, org_name, keychain=keychain)
         org_config.refresh_oauth_token(keychain, is_sandbox=sbx_login)
@@ -114,6 +165,58 @@ def refresh_access_token(
         _handle_sf_error(err, scratch_org=scratch_org)
 
 
+def _org_token_timeout(config):
+    """Seconds until a freshly refreshed token should no longer be reused."""
+    timeout = settings.ORG_TOKEN_LIFETIME - settings.ORG_TOKEN_REFRESH_MARGIN
+    try:
+        # Salesforce reports when the token was issued, in milliseconds:
+        issued_at = int(config["issued_at"]) / 1000
+    except (KeyError, TypeError, ValueError):
+        return timeout
+    return int(timeout - max(0, time.time() - issued_at))
+
+
+def cache_org_config(org_id, org_config):
+    """Cache an org config holding a fresh access token, encrypted, for
+    refresh_access_token to reuse."""
+    config = dict(org_config.config)
+    timeout = _org_token_timeout(config)
+    if not org_id or not config.get("access_token") or timeout <= 0:
+        return
+    cache.set(
+        ORG_TOKEN_CACHE_KEY.format(org_id=org_id),
+        fernet_encrypt(json.dumps(config, cls=DjangoJSONEncoder)),
+        timeout,
+    )
+
+
+def get_cached_org_config(org_id):
+    """Return the cached org config dict for an org, or None."""
+    encrypted = cache.get(ORG_TOKEN_CACHE_KEY.format(org_id=org_id))
+    if encrypted is None:
+        return None
+    return json.loads(fernet_decrypt(encrypted))
+
+
+def _log_org_token(org_id, *, reused):
+    if reused:
+        cache.add(ORG_TOKEN_REFRESHES_SAVED_KEY, 0, timeout=None)
+        refreshes_saved = cache.incr(ORG_TOKEN_REFRESHES_SAVED_KEY)
+    else:
+        refreshes_saved = cache.get(ORG_TOKEN_REFRESHES_SAVED_KEY, 0)
+    logger.info(
+        f"{'Reused' if reused else 'Refreshed'} access token for org {org_id}",
+        extra={
+            "context": {
+                "event": "org_token",
+                "org_id": org_id,
+                "reused": reused,
+                "refreshes_saved": refreshes_saved,
+            }
+        },
+    )
+
+
 def _deploy_org_settings(*, cci, org_name, scratch_org_config, scratch_org):
     """Deploy org settings via Metadata API.
 
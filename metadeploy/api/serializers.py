@@ -1,14 +1,16 @@
 from collections import OrderedDict
 
 from django.contrib.auth import get_user_model
+from django.db.models import OuterRef, Subquery
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 from rest_framework.fields import SkipField
-from rest_framework.relations import PKOnlyObject
+from rest_framework.relations import MANY_RELATION_KWARGS, PKOnlyObject
 from rest_framework.utils.urls import replace_query_param
 
-from .constants import ERROR, HIDE, WARN
+from ..instrumentation import SerializerTimingMixin
+from .constants import ERROR, HIDE
 from .models import (
     ORG_TYPES,
     SUPPORTED_ORG_TYPES,
@@ -47,28 +49,62 @@ class IdOnlyField(serializers.Field):
         return self.model.objects.get(pk=data)
 
 
-class ErrorWarningCountMixin:
-    @staticmethod
-    def _count_status_in_results(results, status_name):
-        count = 0
-        for results_list in results.values():
-            for result in results_list:
-                try:
-                    if result["status"] == status_name:
-                        count += 1
-                except TypeError:
-                    pass
-        return count
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """
+    Looks up all of the related objects in one query, rather than one query per
+    primary key.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, "__iter__"):
+            self.fail("not_a_list", input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail("empty")
+
+        child = self.child_relation
+        pks = [
+            child.pk_field.to_internal_value(item) if child.pk_field else item
+            for item in data
+        ]
+        found = {obj.pk: obj for obj in child.get_queryset().filter(pk__in=pks)}
+        # Anything not found falls back to the child's own lookup, which raises
+        # the appropriate validation error:
+        return [
+            found[pk] if pk in found else child.to_internal_value(item)
+            for pk, item in zip(pks, data)
+        ]
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {"child_relation": cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
 
+
+class ErrorWarningCountMixin:
     def get_error_count(self, obj):
         if obj.status == self.Meta.model.Status.started:
             return 0
-        return self._count_status_in_results(obj.results, ERROR)
+        return obj.error_count
 
     def get_warning_count(self, obj):
         if obj.status == self.Meta.model.Status.started:
             return 0
-        return self._count_status_in_results(obj.results, WARN)
+        return obj.warning_count
+
+
+class StepResultsField(serializers.JSONField):
+    """
+    A job's results, which it records as StepResults while it runs, in the shape
+    of the results JSON the frontend has always received.
+    """
+
+    def get_attribute(self, instance):
+        return instance.get_results()
 
 
 class CircumspectSerializerMixin:
@@ -114,7 +150,7 @@ class CircumspectSerializerMixin:
         return ret
 
 
-class FullUserSerializer(serializers.ModelSerializer):
+class FullUserSerializer(SerializerTimingMixin, serializers.ModelSerializer):
     id = serializers.CharField(read_only=True)
     is_production_org = serializers.SerializerMethodField()
     username = serializers.SerializerMethodField()
@@ -169,7 +205,9 @@ class StepSerializer(serializers.ModelSerializer):
         )
 
 
-class PlanSerializer(CircumspectSerializerMixin, serializers.ModelSerializer):
+class PlanSerializer(
+    SerializerTimingMixin, CircumspectSerializerMixin, serializers.ModelSerializer
+):
     id = serializers.CharField(read_only=True)
     version = serializers.PrimaryKeyRelatedField(
         read_only=True, pk_field=serializers.CharField()
@@ -179,8 +217,13 @@ class PlanSerializer(CircumspectSerializerMixin, serializers.ModelSerializer):
     title = serializers.CharField()
     preflight_message = serializers.SerializerMethodField()
     not_allowed_instructions = serializers.SerializerMethodField()
-    requires_preflight = serializers.SerializerMethodField()
     average_duration = serializers.SerializerMethodField()
+    p90_duration = serializers.IntegerField(
+        source="calculated_p90_duration", read_only=True
+    )
+    step_durations = serializers.JSONField(
+        source="calculated_step_durations", read_only=True
+    )
 
     class Meta:
         model = Plan
@@ -198,11 +241,13 @@ class PlanSerializer(CircumspectSerializerMixin, serializers.ModelSerializer):
             "is_listed",
             "not_allowed_instructions",
             "average_duration",
+            "p90_duration",
+            "step_durations",
             "requires_preflight",
             "supported_orgs",
             "scratch_org_duration",
         )
-        circumspect_fields = ("steps", "preflight_message")
+        circumspect_fields = ("steps", "preflight_message", "step_durations")
 
     def get_preflight_message(self, obj):
         return (
@@ -221,9 +266,6 @@ class PlanSerializer(CircumspectSerializerMixin, serializers.ModelSerializer):
             return getattr(obj.version.product.visible_to, "description_markdown", None)
         return getattr(obj.visible_to, "description_markdown", None)
 
-    def get_requires_preflight(self, obj):
-        return obj.requires_preflight
-
     def get_average_duration(self, obj):
         """Plan.average_duration is an expensive query,
         so we prefer the already calculated value if available."""
@@ -251,7 +293,7 @@ class PlanSerializer(CircumspectSerializerMixin, serializers.ModelSerializer):
         return data
 
 
-class VersionSerializer(serializers.ModelSerializer):
+class VersionSerializer(SerializerTimingMixin, serializers.ModelSerializer):
     id = serializers.CharField(read_only=True)
     product = serializers.PrimaryKeyRelatedField(
         read_only=True, pk_field=serializers.CharField()
@@ -274,7 +316,7 @@ class VersionSerializer(serializers.ModelSerializer):
         )
 
 
-class ProductCategorySerializer(serializers.ModelSerializer):
+class ProductCategorySerializer(SerializerTimingMixin, serializers.ModelSerializer):
     description = serializers.CharField(source="description_markdown")
     first_page = serializers.SerializerMethodField()
 
@@ -321,7 +363,9 @@ class ProductCategorySerializer(serializers.ModelSerializer):
         return qs
 
 
-class ProductSerializer(CircumspectSerializerMixin, serializers.ModelSerializer):
+class ProductSerializer(
+    SerializerTimingMixin, CircumspectSerializerMixin, serializers.ModelSerializer
+):
     id = serializers.CharField(read_only=True)
     category = serializers.CharField(source="category.title")
     most_recent_version = VersionSerializer()
@@ -373,7 +417,9 @@ class ProductSerializer(CircumspectSerializerMixin, serializers.ModelSerializer)
         return getattr(obj.visible_to, "description_markdown", None)
 
 
-class JobSerializer(ErrorWarningCountMixin, serializers.ModelSerializer):
+class JobSerializer(
+    SerializerTimingMixin, ErrorWarningCountMixin, serializers.ModelSerializer
+):
     id = serializers.CharField(read_only=True)
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
     org_name = serializers.SerializerMethodField()
@@ -388,9 +434,10 @@ class JobSerializer(ErrorWarningCountMixin, serializers.ModelSerializer):
     plan = serializers.PrimaryKeyRelatedField(
         queryset=Plan.objects.all(), pk_field=serializers.CharField()
     )
-    steps = serializers.PrimaryKeyRelatedField(
+    steps = BulkPrimaryKeyRelatedField(
         queryset=Step.objects.all(), many=True, pk_field=serializers.CharField()
     )
+    results = StepResultsField(required=False)
     error_count = serializers.SerializerMethodField()
     warning_count = serializers.SerializerMethodField()
 
@@ -501,29 +548,87 @@ class JobSerializer(ErrorWarningCountMixin, serializers.ModelSerializer):
         return obj.plan.slug
 
     @staticmethod
-    def _has_valid_preflight(most_recent_preflight, plan):
-        if not plan.requires_preflight:
+    def _get_admission(*, org_id, plan):
+        """
+        Fetch everything needed to decide whether a new job may start, in a single
+        query: the plan's denormalized step metadata, the org's most recent valid
+        preflight for the plan, and any job already running against the org.
+
+        Returns a tuple of (plan values, most recent preflight or None, pending job
+        id or None).
+        """
+        preflights = PreflightResult.objects.filter(
+            org_id=org_id,
+            plan=OuterRef("pk"),
+            is_valid=True,
+            status=PreflightResult.Status.complete,
+        ).order_by("-created_at")
+        pending_jobs = Job.objects.filter(status=Job.Status.started, org_id=org_id)
+        admission = (
+            Plan.objects.filter(pk=plan.pk)
+            .annotate(
+                preflight_pk=Subquery(preflights.values("pk")[:1]),
+                preflight_results=Subquery(preflights.values("results")[:1]),
+                preflight_error_count=Subquery(preflights.values("error_count")[:1]),
+                pending_job_pk=Subquery(pending_jobs.values("pk")[:1]),
+            )
+            .values(
+                "requires_preflight",
+                "required_step_pks",
+                "preflight_pk",
+                "preflight_results",
+                "preflight_error_count",
+                "pending_job_pk",
+            )
+            .get()
+        )
+        preflight = None
+        if admission["preflight_pk"] is not None:
+            preflight = PreflightResult(
+                pk=admission["preflight_pk"],
+                org_id=org_id,
+                plan=plan,
+                results=admission["preflight_results"],
+                error_count=admission["preflight_error_count"],
+            )
+        return admission, preflight, admission["pending_job_pk"]
+
+    @staticmethod
+    def _has_valid_preflight(most_recent_preflight, *, requires_preflight, steps=None):
+        """
+        Whether the preflight allows the job to run. When retrying a job, only
+        the errors for its remaining ``steps`` (and the plan itself) count.
+        """
+        if not requires_preflight:
             return True
 
         if not most_recent_preflight:
             return False
 
-        return not most_recent_preflight.has_any_errors()
+        if steps is None:
+            return not most_recent_preflight.error_count
+
+        step_keys = {str(step.id) for step in steps} | {"plan"}
+        return not any(
+            isinstance(result, dict) and result.get("status") == ERROR
+            for step_key, results in most_recent_preflight.results.items()
+            if step_key in step_keys
+            for result in results
+        )
 
     @staticmethod
-    def _has_valid_steps(*, plan, steps, preflight):
+    def _has_valid_steps(*, required_step_pks, steps, preflight, completed_steps=()):
         """
         Every set in this method is a set of numeric Step PKs, from the
         local database.
         """
-        required_steps = set(plan.required_step_ids)
+        to_python = Step._meta.pk.to_python
+        required_steps = {to_python(pk) for pk in required_step_pks}
         if preflight:
             required_steps -= set(preflight.optional_step_ids)
+        required_steps -= {s.id for s in completed_steps}
         return not set(required_steps) - {s.id for s in steps}
 
-    def _pending_job_exists(self, *, org_id):
-        return Job.objects.filter(status=Job.Status.started, org_id=org_id).first()
-
     def validate_plan(self, value):
         if not value.is_visible_to(self.context["request"].user):
             raise serializers.ValidationError(
@@ -562,29 +667,39 @@ class JobSerializer(ErrorWarningCountMixin, serializers.ModelSerializer):
         if not org_id:
             raise serializers.ValidationError(_("No valid org."))
 
-        most_recent_preflight = PreflightResult.objects.most_recent(
-            org_id=org_id, plan=plan
-        )
-        no_valid_preflight = not self.instance and not self._has_valid_preflight(
-            most_recent_preflight, plan=plan
-        )
-        if no_valid_preflight:
-            raise serializers.ValidationError(_("No valid preflight."))
-
-        invalid_steps = not self.instance and not self._has_valid_steps(
-            plan=plan, steps=steps, preflight=most_recent_preflight
-        )
-        if invalid_steps:
-            raise serializers.ValidationError(_("Invalid steps for plan."))
+        pending_job_id = None
+        if not self.instance:
+            # A retry only runs, and only needs a preflight for, the steps the
+            # failed job didn't complete:
+            retry_of = self.context.get("retry_of")
+            admission, most_recent_preflight, pending_job_id = self._get_admission(
+                org_id=org_id, plan=plan
+            )
+            if not self._has_valid_preflight(
+                most_recent_preflight,
+                requires_preflight=admission["requires_preflight"],
+                steps=steps if retry_of else None,
+            ):
+                raise serializers.ValidationError(_("No valid preflight."))
+
+            completed_steps = []
+            if retry_of:
+                completed_steps = set(retry_of.steps.all()) - set(steps)
+            if not self._has_valid_steps(
+                required_step_pks=admission["required_step_pks"],
+                steps=steps,
+                preflight=most_recent_preflight,
+                completed_steps=completed_steps,
+            ):
+                raise serializers.ValidationError(_("Invalid steps for plan."))
 
         if "results" in data:
             self._validate_results(data)
 
-        pending_job = not self.instance and self._pending_job_exists(org_id=org_id)
-        if pending_job:
+        if pending_job_id:
             raise serializers.ValidationError(
                 _(
-                    f"Pending job {pending_job.id} exists. Please try again later, or "
+                    f"Pending job {pending_job_id} exists. Please try again later, or "
                     f"cancel that job."
                 )
             )
@@ -608,7 +723,9 @@ class JobSerializer(ErrorWarningCountMixin, serializers.ModelSerializer):
         return data
 
 
-class PreflightResultSerializer(ErrorWarningCountMixin, serializers.ModelSerializer):
+class PreflightResultSerializer(
+    SerializerTimingMixin, ErrorWarningCountMixin, serializers.ModelSerializer
+):
     id = serializers.CharField(read_only=True)
     plan = IdOnlyField(read_only=True)
     user = IdOnlyField(read_only=True)
@@ -620,7 +737,7 @@ class PreflightResultSerializer(ErrorWarningCountMixin, serializers.ModelSeriali
         return (
             obj.is_valid
             and obj.status == PreflightResult.Status.complete
-            and self._count_status_in_results(obj.results, ERROR) == 0
+            and obj.error_count == 0
         )
 
     class Meta:
@@ -651,7 +768,7 @@ class PreflightResultSerializer(ErrorWarningCountMixin, serializers.ModelSeriali
         }
 
 
-class JobSummarySerializer(serializers.ModelSerializer):
+class JobSummarySerializer(SerializerTimingMixin, serializers.ModelSerializer):
     id = serializers.CharField(read_only=True)
     product_slug = serializers.CharField(source="plan.version.product.slug")
     version_label = serializers.CharField(source="plan.version.label")
@@ -674,13 +791,13 @@ class JobSummarySerializer(serializers.ModelSerializer):
         return None
 
 
-class OrgSerializer(serializers.Serializer):
+class OrgSerializer(SerializerTimingMixin, serializers.Serializer):
     org_id = serializers.CharField()
     current_job = JobSummarySerializer()
     current_preflight = IdOnlyField()
 
 
-class SiteSerializer(serializers.ModelSerializer):
+class SiteSerializer(SerializerTimingMixin, serializers.ModelSerializer):
     welcome_text = serializers.CharField(source="welcome_text_markdown")
     copyright_notice = serializers.CharField(source="copyright_notice_markdown")
     master_agreement = serializers.CharField(source="master_agreement_markdown")
@@ -699,7 +816,7 @@ class SiteSerializer(serializers.ModelSerializer):
         )
 
 
-class ScratchOrgSerializer(serializers.ModelSerializer):
+class ScratchOrgSerializer(SerializerTimingMixin, serializers.ModelSerializer):
     class Meta:
         model = ScratchOrg
         fields = (
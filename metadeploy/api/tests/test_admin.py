@@ -1,6 +1,9 @@
+from datetime import timedelta
+
 import pytest
 from django.contrib.admin.sites import AdminSite
 from django.test import RequestFactory
+from django.utils import timezone
 
 from ..admin import (
     AllowedListOrgAdmin,
@@ -8,8 +11,9 @@ from ..admin import (
     MetadeployTranslatableAdmin,
     PlanAdmin,
     PlanMixin,
+    RecentlyCreatedFilter,
 )
-from ..models import AllowedListOrg, Plan
+from ..models import AllowedListOrg, Job, Plan
 
 
 class Dummy:
@@ -110,3 +114,31 @@ class TestSocialTokenAdmin:
         # redirected back to model list
         assert response.status_code == 302
         assert response.url == "/admin/socialaccount/socialtoken/"
+
+
+@pytest.mark.django_db
+class TestRecentlyCreatedFilter:
+    def get_filter(self, params):
+        request = RequestFactory().get("/", params)
+        return RecentlyCreatedFilter(request, dict(params), Job, None)
+
+    def test_defaults_to_recent(self, job_factory):
+        recent = job_factory()
+        old = job_factory()
+        Job.objects.filter(pk=old.pk).update(
+            created_at=timezone.now() - timedelta(days=60)
+        )
+
+        queryset = self.get_filter({}).queryset(None, Job.objects.all())
+
+        assert list(queryset) == [recent]
+
+    def test_all(self, job_factory):
+        job_factory()
+
+        queryset = self.get_filter({"created": "all"}).queryset(None, Job.objects.all())
+
+        assert queryset.count() == 1
+
+    def test_unknown_value(self):
+        assert self.get_filter({"created": "bogus"}).value() == "30"
@@ -0,0 +1,159 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+from cumulusci.core.tasks import BaseTask
+from cumulusci.tasks.salesforce import Deploy
+
+from ..artifacts import (
+    CachedPackageZipMixin,
+    evict_deploy_artifacts,
+    supports_artifact_cache,
+    with_artifact_cache,
+)
+
+COMMIT_SHA = "0123456789abcdef0123456789abcdef01234567"
+
+
+class FakeDeploy:
+    def __init__(self, **options):
+        self.options = {"namespace_inject": None, **options}
+        self.builds = 0
+
+    def _get_package_zip(self, path):
+        self.builds += 1
+        return "UEsFBgAAAAAAAAAAAAAAAAAAAAAAAA=="
+
+    def _has_namespaced_package(self, namespace):
+        return False
+
+    def _is_namespaced_org(self, namespace):
+        return False
+
+
+@pytest.fixture
+def cached_deploy_class(tmp_path):
+    (tmp_path / "src").mkdir()
+
+    class CachedFakeDeploy(CachedPackageZipMixin, FakeDeploy):
+        artifact_version_id = "v1"
+        artifact_commit_sha = COMMIT_SHA
+        artifact_repo_root = str(tmp_path)
+
+    yield CachedFakeDeploy
+    evict_deploy_artifacts("v1")
+
+
+class TestCachedPackageZip:
+    def test_reuses_package(self, cached_deploy_class, tmp_path):
+        first = cached_deploy_class(path="src")
+        second = cached_deploy_class(path="src")
+        path = str(tmp_path / "src")
+
+        assert first._get_package_zip(path) == second._get_package_zip(path)
+        assert (first.builds, second.builds) == (1, 0)
+
+    def test_options_change_key(self, cached_deploy_class, tmp_path):
+        first = cached_deploy_class(path="src")
+        second = cached_deploy_class(path="src", namespace_tokenize="ns")
+        path = str(tmp_path / "src")
+
+        first._get_package_zip(path)
+        second._get_package_zip(path)
+        assert (first.builds, second.builds) == (1, 1)
+
+    def test_outside_checkout(self, cached_deploy_class, tmp_path_factory):
+        path = str(tmp_path_factory.mktemp("source"))
+        task = cached_deploy_class(path=path)
+
+        task._get_package_zip(path)
+        task._get_package_zip(path)
+        assert task.builds == 2
+
+    def test_too_large(self, cached_deploy_class, tmp_path, settings):
+        settings.DEPLOY_ARTIFACT_MAX_SIZE = 10
+        task = cached_deploy_class(path="src")
+        path = str(tmp_path / "src")
+
+        task._get_package_zip(path)
+        task._get_package_zip(path)
+        assert task.builds == 2
+
+    def test_evicted(self, cached_deploy_class, tmp_path):
+        path = str(tmp_path / "src")
+        cached_deploy_class(path="src")._get_package_zip(path)
+        evict_deploy_artifacts("v1")
+
+        task = cached_deploy_class(path="src")
+        task._get_package_zip(path)
+        assert task.builds == 1
+
+
+class TestWithArtifactCache:
+    def test_deploy(self, tmp_path):
+        task_class = with_artifact_cache(
+            Deploy,
+            version=MagicMock(id="v1"),
+            commit_sha=COMMIT_SHA,
+            repo_root=tmp_path,
+        )
+
+        assert issubclass(task_class, CachedPackageZipMixin)
+        assert issubclass(task_class, Deploy)
+        assert task_class.artifact_repo_root == str(tmp_path)
+
+    def test_other_task(self, tmp_path):
+        assert (
+            with_artifact_cache(
+                BaseTask,
+                version=MagicMock(id="v1"),
+                commit_sha=COMMIT_SHA,
+                repo_root=tmp_path,
+            )
+            is BaseTask
+        )
+
+    def test_no_commit_sha(self, tmp_path):
+        assert (
+            with_artifact_cache(
+                Deploy, version=MagicMock(id="v1"), commit_sha="", repo_root=tmp_path
+            )
+            is Deploy
+        )
+
+    def test_changed_internals(self, tmp_path):
+        class ChangedDeploy(Deploy):
+            def _get_package_zip(self, path, options):
+                pass  # pragma: nocover
+
+        assert supports_artifact_cache(Deploy)
+        assert not supports_artifact_cache(ChangedDeploy)
+        assert (
+            with_artifact_cache(
+                ChangedDeploy,
+                version=MagicMock(id="v1"),
+                commit_sha=COMMIT_SHA,
+                repo_root=tmp_path,
+            )
+            is ChangedDeploy
+        )
+
+
+@pytest.mark.django_db
+class TestVersionEviction:
+    def test_commit_ish_changed(self, version_factory):
+        version = version_factory()
+        with patch("metadeploy.api.models.evict_deploy_artifacts") as evict:
+            version.label = "2.0"
+            version.save()
+            assert not evict.called
+
+            version.commit_ish = "other"
+            version.save()
+            evict.assert_called_once_with(version.id)
+
+    def test_unlisted(self, version_factory):
+        version = version_factory()
+        with patch("metadeploy.api.models.evict_deploy_artifacts") as evict:
+            version.is_listed = False
+            version.save()
+            evict.assert_called_once_with(version.id)
@@ -0,0 +1,129 @@
+"""
+Micro-benchmarks of the hot paths: rendering the catalog, redacting logs,
+enqueueing jobs, and spooling and formatting log lines.
+
+They are skipped in normal test runs. ``yarn test:py:benchmark`` runs them,
+saves the results under .benchmarks/, and fails if any benchmark's mean is
+more than 20% slower than the previously saved run.
+"""
+import logging
+from datetime import datetime
+
+import pytest
+import pytz
+
+from metadeploy.logfmt import LogfmtFormatter
+
+from ..belvedere_utils import obscure_salesforce_log
+from ..jobs import enqueuer
+from ..models import Job, Plan, Product
+from ..result_spool_logger import ResultSpoolLogger
+from ..serializers import JobSerializer, PlanSerializer, ProductSerializer
+
+pytestmark = [pytest.mark.benchmark, pytest.mark.django_db]
+
+CATALOG_SIZE = 50
+STEPS_PER_PLAN = 10
+PENDING_JOBS = 1000
+
+LOG_LINE = (
+    "\x1b[32mDeploying\x1b[0m package 04t1U000007Cj2DQAS to 00D1U0000009n0cUAA: "
+    "Organization Name: Acme Corp\nOrganization ID: 00D1U0000009n0cUAA "
+    "(Required: 12, Available: 3) Please include this ErrorId if you contact "
+    "support: 1234567890-12345 (-123456789)\n"
+)
+
+
+@pytest.fixture
+def context(rf, user_factory):
+    request = rf.get("/")
+    request.user = user_factory()
+    return {"request": request}
+
+
+@pytest.fixture
+def catalog(plan_factory, step_factory):
+    plans = [plan_factory() for _ in range(CATALOG_SIZE)]
+    for plan in plans:
+        for _ in range(STEPS_PER_PLAN):
+            step_factory(plan=plan)
+    return plans
+
+
+def render(serializer_class, instances, context):
+    # The user's org data is memoized per request:
+    context["request"].user.clear_cached_org_data()
+    return serializer_class(instances, many=True, context=context).data
+
+
+def test_product_serializer(benchmark, catalog, context):
+    products = list(Product.objects.all())
+    benchmark(render, ProductSerializer, products, context)
+
+
+def test_plan_serializer(benchmark, catalog, context):
+    plans = list(Plan.objects.all())
+    benchmark(render, PlanSerializer, plans, context)
+
+
+def test_job_serializer(benchmark, catalog, context, job_factory):
+    user = context["request"].user
+    for plan in catalog:
+        steps = list(plan.steps.all())
+        job_factory(
+            user=user,
+            plan=plan,
+            org_id=user.org_id,
+            steps=steps,
+            results={str(step.id): [{"status": "ok"}] for step in steps},
+        )
+    jobs = list(Job.objects.all())
+    benchmark(render, JobSerializer, jobs, context)
+
+
+def test_obscure_salesforce_log(benchmark):
+    benchmark(obscure_salesforce_log, LOG_LINE * 5000)
+
+
+def test_enqueuer(benchmark, mocker, plan_factory, user_factory):
+    delay = mocker.patch("metadeploy.api.jobs.run_flows_job.delay")
+    delay.return_value.enqueued_at = datetime(2018, 10, 1, 12, 0, 0, 0, pytz.UTC)
+    user = user_factory()
+    plan = plan_factory()
+    Job.objects.bulk_create(
+        Job(user=user, plan=plan, org_id=f"00D{i:015d}") for i in range(PENDING_JOBS)
+    )
+
+    def unclaim():
+        Job.objects.update(enqueued_at=None, job_id=None)
+
+    benchmark.pedantic(enqueuer, setup=unclaim, rounds=3)
+    assert delay.call_count == 3 * PENDING_JOBS
+
+
+def test_result_spool_logger_emit(benchmark, job_factory):
+    job = job_factory(results={"step": [{"logs": ""}]}, org_id="00Dxxxxxxxxxxxxxxx")
+    handler = ResultSpoolLogger(result=job)
+    handler.current_key = "step"
+    record = logging.LogRecord(
+        "cumulusci", logging.INFO, "module", 1, LOG_LINE, (), None
+    )
+
+    benchmark(handler.emit, record)
+
+
+def test_logfmt_formatter(benchmark):
+    formatter = LogfmtFormatter()
+    record = logging.LogRecord(
+        "metadeploy", logging.INFO, "module", 1, "Job 1234 succeeded", (), None
+    )
+    record.job_id = "294fc6d2-0f3c-4877-b849-54184724b6b2"
+    record.context = {
+        "event": "job",
+        "context": "product/1.0/plan",
+        "status": "success",
+        "duration": 123.4,
+        "is_release_test": False,
+    }
+
+    benchmark(formatter.format, record)
@@ -1,10 +1,15 @@
-from datetime import timedelta
+import gzip
+import json
+import logging
+from datetime import datetime, timedelta
 
 import pytest
+from django.core.files.storage import FileSystemStorage, InMemoryStorage
 from django.utils import timezone
 from rest_framework.authtoken.models import Token
 
 from ..cleanup import (
+    archive_old_results,
     cleanup_user_data,
     clear_old_exceptions,
     delete_old_users,
@@ -12,7 +17,7 @@ from ..cleanup import (
     expire_oauth_tokens,
     fix_dead_jobs_status,
 )
-from ..models import User
+from ..models import Job, PreflightResult, StepResult, User
 
 
 @pytest.mark.django_db
@@ -32,6 +37,41 @@ def test_expire_oauth_tokens(user_factory):
     assert user2.social_account.extra_data == {}
 
 
+@pytest.mark.django_db
+def test_expire_oauth_tokens__chunked(mocker, settings, user_factory):
+    settings.CLEANUP_CHUNK_SIZE = 2
+    push = mocker.patch(
+        "metadeploy.api.cleanup.user_tokens_expired", new_callable=mocker.AsyncMock
+    )
+    staff_user = user_factory(is_staff=True)
+    users = [user_factory() for _ in range(2)] + [staff_user]
+    for user in users:
+        user.socialaccount_set.update(last_login=timezone.now() - timedelta(minutes=30))
+
+    assert expire_oauth_tokens() == 3
+
+    assert push.call_count == 2
+    notified = {user_id for call in push.call_args_list for user_id in call.args[0]}
+    assert notified == {str(user.id) for user in users}
+    for user in users:
+        user.refresh_from_db()
+        assert user.valid_token_for is None
+    assert staff_user.social_account.extra_data != {}
+
+
+@pytest.mark.django_db
+def test_cleanup_user_data__logs_timings(caplog):
+    with caplog.at_level(logging.INFO, logger="metadeploy.api.cleanup"):
+        cleanup_user_data()
+
+    record = next(
+        r for r in caplog.records if r.message == "cleanup_user_data finished"
+    )
+    assert record.context["event"] == "cleanup_user_data"
+    assert "expire_oauth_tokens_ms" in record.context
+    assert record.context["delete_old_users_count"] == 0
+
+
 @pytest.mark.django_db
 def test_expire_oauth_tokens_with_started_job(job_factory):
     job = job_factory(org_id="00Dxxxxxxxxxxxxxxx")
@@ -50,7 +90,7 @@ def test_delete_old_users(user_factory):
     old_user = user_factory(last_login=two_months_ago)
     staff_user = user_factory(last_login=two_months_ago, is_staff=True)
 
-    delete_old_users()
+    assert delete_old_users() == 1
 
     # make sure only the old user was deleted
     new_user.refresh_from_db()
@@ -59,6 +99,19 @@ def test_delete_old_users(user_factory):
         old_user.refresh_from_db()
 
 
+@pytest.mark.django_db
+def test_delete_old_users__chunked(settings, user_factory):
+    settings.CLEANUP_CHUNK_SIZE = 2
+    two_months_ago = timezone.now() - timedelta(days=60)
+    for _ in range(5):
+        user_factory(last_login=two_months_ago)
+    new_user = user_factory()
+
+    assert delete_old_users() == 5
+    assert not User.objects.filter(last_login__lte=two_months_ago).exists()
+    new_user.refresh_from_db()
+
+
 @pytest.mark.django_db
 def test_clear_old_exceptions(job_factory):
     half_year_ago = timezone.now() - timedelta(days=180)
@@ -76,9 +129,9 @@ def test_clear_old_exceptions(job_factory):
 
 
 @pytest.mark.django_db
-def test_fix_dead_jobs_status(job_factory):
+def test_fix_dead_jobs_status(job_factory, settings):
     two_hours_ago = timezone.now() - timedelta(hours=2)
-    old_job = job_factory(status="started")
+    old_job = job_factory(status="started", resume_count=settings.JOB_MAX_RESUMES)
     old_job.enqueued_at = two_hours_ago
     old_job.save()
 
@@ -88,6 +141,19 @@ def test_fix_dead_jobs_status(job_factory):
     assert old_job.status == "canceled"
 
 
+@pytest.mark.django_db
+def test_fix_dead_jobs_status__resume(job_factory):
+    two_hours_ago = timezone.now() - timedelta(hours=2)
+    old_job = job_factory(status="started", enqueued_at=two_hours_ago)
+
+    fix_dead_jobs_status()
+
+    old_job.refresh_from_db()
+    assert old_job.status == "started"
+    assert old_job.enqueued_at is None
+    assert old_job.resume_count == 1
+
+
 @pytest.mark.django_db
 def test_expire_api_access_tokens(token_factory):
     # set token creation time to two days ago
@@ -106,3 +172,90 @@ def test_expire_api_access_tokens(token_factory):
     # token should now be expired, and thus, deleted
     expire_api_access_tokens_older_than_days(1)
     assert Token.objects.count() == 0
+
+
+@pytest.mark.django_db
+def test_archive_old_results(job_factory, preflight_result_factory, user_factory):
+    storage = InMemoryStorage()
+    old = timezone.make_aware(datetime(2020, 1, 15))
+    user = user_factory()
+    old_job = job_factory(
+        status=Job.Status.complete, user=user, org_id=user.org_id, log="Secret"
+    )
+    old_job.record_step_result("1", status="error", message="Org detail", logs="x")
+    running_job = job_factory(status=Job.Status.started)
+    new_job = job_factory(status=Job.Status.complete)
+    old_preflight = preflight_result_factory(
+        status=PreflightResult.Status.complete,
+        results={"plan": [{"status": "warn", "message": "Org detail"}]},
+    )
+    Job.objects.filter(pk__in=[old_job.pk, running_job.pk]).update(created_at=old)
+    PreflightResult.objects.filter(pk=old_preflight.pk).update(created_at=old)
+
+    archives = archive_old_results(storage=storage, days=30)
+
+    (job_name, job_count), (preflight_name, preflight_count) = archives
+    assert job_name.startswith("archives/job-2020-01-")
+    assert preflight_name.startswith("archives/preflightresult-2020-01-")
+    assert (job_count, preflight_count) == (1, 1)
+    with storage.open(job_name) as f:
+        (record,) = [json.loads(line) for line in gzip.open(f, "rt")]
+    assert record["pk"] == str(old_job.pk)
+    assert record["step_results"][0]["step_key"] == "1"
+    assert record["step_results"][0]["status"] == "error"
+    assert not {"user", "org_id", "log", "exception"} & set(record["fields"])
+    assert not {"message", "logs"} & set(record["step_results"][0])
+    with storage.open(preflight_name) as f:
+        (record,) = [json.loads(line) for line in gzip.open(f, "rt")]
+    assert record["fields"]["results"] == {"plan": [{"status": "warn"}]}
+
+    assert set(Job.objects.values_list("pk", flat=True)) == {
+        running_job.pk,
+        new_job.pk,
+    }
+    assert not PreflightResult.objects.exists()
+    assert not StepResult.objects.filter(job_id=old_job.pk).exists()
+
+
+@pytest.mark.django_db
+def test_archive_old_results__local_filesystem(tmp_path, job_factory):
+    old_job = job_factory(status=Job.Status.complete)
+    Job.objects.filter(pk=old_job.pk).update(
+        created_at=timezone.now() - timedelta(days=400)
+    )
+
+    archives = archive_old_results(storage=FileSystemStorage(location=tmp_path))
+
+    assert [count for _, count in archives] == [1]
+    assert (tmp_path / archives[0][0]).exists()
+    assert Job.objects.filter(pk=old_job.pk).exists()
+
+
+@pytest.mark.django_db
+def test_archive_old_results__not_stored(mocker, job_factory):
+    storage = InMemoryStorage()
+    mocker.patch.object(storage, "exists", return_value=False)
+    old_job = job_factory(status=Job.Status.complete)
+    Job.objects.filter(pk=old_job.pk).update(
+        created_at=timezone.now() - timedelta(days=400)
+    )
+
+    with pytest.raises(OSError, match="was not stored intact"):
+        archive_old_results(storage=storage)
+
+    assert Job.objects.filter(pk=old_job.pk).exists()
+
+
+@pytest.mark.django_db
+def test_archive_old_results__dry_run(job_factory):
+    storage = InMemoryStorage()
+    old_job = job_factory(status=Job.Status.complete)
+    Job.objects.filter(pk=old_job.pk).update(
+        created_at=timezone.now() - timedelta(days=400)
+    )
+
+    archives = archive_old_results(storage=storage, dry_run=True)
+
+    assert [count for _, count in archives] == [1]
+    assert not storage.exists(archives[0][0])
+    assert Job.objects.filter(pk=old_job.pk).exists()
@@ -1,4 +1,6 @@
+import json
 import logging
+import threading
 from unittest.mock import MagicMock, sentinel
 
 import pytest
@@ -72,7 +74,7 @@ class TestJobFlow:
             callbacks.post_task(stepspec, result)
         callbacks.post_flow(permanent_org_coordinator)
 
-        assert job.results == {str(step.id): [{"status": "ok"}] for step in steps}
+        assert job.get_results() == {str(step.id): [{"status": "ok"}] for step in steps}
         # Permanent orgs SHOULD NOT call the Salesforce API to reset the user password
         permanent_org_coordinator.org_config.salesforce_client.restful.assert_not_called()
 
@@ -94,10 +96,44 @@ class TestJobFlow:
             callbacks.post_task(stepspec, result)
         callbacks.post_flow(scratch_org_coordinator)
 
-        assert job.results == {str(step.id): [{"status": "ok"}] for step in steps}
+        assert job.get_results() == {str(step.id): [{"status": "ok"}] for step in steps}
         # Scratch orgs SHOULD call the Salesforce API to reset the user password
         scratch_org_coordinator.org_config.salesforce_client.restful.assert_called()
 
+    def test_post_flow__password_reset_fails(
+        self, plan_factory, job_factory, scratch_org_factory
+    ):
+        plan = plan_factory()
+        job = job_factory(plan=plan, org_id="00Dxxxxxxxxxxxxxxx")
+        callbacks = JobFlowCallback(job)
+        scratch_org = scratch_org_factory(plan=plan)
+        coordinator = MagicMock(**{"org_config.org_id": scratch_org.org_id})
+        coordinator.org_config.salesforce_client.restful.side_effect = Exception
+
+        logger = callbacks.pre_flow(coordinator)
+        with pytest.raises(Exception):
+            callbacks.post_flow(coordinator)
+
+        assert callbacks.handler not in logger.handlers
+        assert callbacks.result_handler not in logger.handlers
+
+    def test_capture__other_threads_ignored(self, job_factory):
+        job = job_factory(org_id="00Dxxxxxxxxxxxxxxx")
+        callbacks = JobFlowCallback(job)
+
+        logger = callbacks.pre_flow(sentinel.flow_coordinator)
+        logger.info("from this flow")
+        other = threading.Thread(target=logger.info, args=("from another flow",))
+        other.start()
+        other.join()
+        callbacks.stop_capture()
+        callbacks.stop_capture()
+
+        log = callbacks.string_buffer.getvalue()
+        assert "from this flow" in log
+        assert "from another flow" not in log
+        assert callbacks.handler not in logger.handlers
+
     def test_post_task__exception(
         self, mocker, user_factory, plan_factory, step_factory, job_factory
     ):
@@ -117,9 +153,31 @@ class TestJobFlow:
         callbacks.post_task(step, step.result)
         callbacks.post_flow(coordinator)
 
-        assert job.results == {
+        assert job.get_results() == {
             str(steps[0].id): [{"status": "error", "message": "Some error"}]
         }
+        assert job.error_count == 1
+        assert job.results == {}
+
+    def test_post_task__timing(self, caplog, plan_factory, step_factory, job_factory):
+        caplog.set_level("INFO")
+        plan = plan_factory()
+        step = step_factory(plan=plan, step_num="1", task_class="cumulusci.Task")
+        job = job_factory(plan=plan, steps=[step], org_id="00Dxxxxxxxxxxxxxxx")
+        callbacks = JobFlowCallback(job)
+        stepspec = MagicMock(step_num="1", task_name="deploy")
+
+        callbacks.pre_flow(MagicMock())
+        callbacks.pre_task(stepspec)
+        callbacks.post_task(stepspec, MagicMock(exception=None))
+
+        step_result = job.step_results.get()
+        assert step_result.task_class == "cumulusci.Task"
+        assert step_result.duration >= 0
+        log_record = next(r for r in caplog.records if "took" in r.message)
+        assert log_record.context["event"] == "step_timing"
+        assert log_record.context["task_class"] == "cumulusci.Task"
+        assert log_record.context["plan"] == plan.slug
 
 
 class TestPreflightFlow:
@@ -159,6 +217,7 @@ class TestPreflightFlow:
             step4.id: [{"status": "optional", "message": ""}],
             step5.id: [{"status": "skip", "message": "skip 1"}],
         }
+        assert (pfr.error_count, pfr.warning_count) == (1, 1)
 
     @pytest.mark.django_db
     def test_post_flow__multiple_results_for_single_step_saved(
@@ -207,3 +266,42 @@ class TestPreflightFlow:
         step.result = MagicMock(exception=ValueError("A value error."))
         with pytest.raises(ValueError, match="A value error."):
             callbacks.post_task(step, step.result)
+
+    @pytest.mark.django_db
+    def test_post_task__timing(self, caplog, plan_factory, preflight_result_factory):
+        caplog.set_level("INFO")
+        pfr = preflight_result_factory(plan=plan_factory(), org_id="00Dxxxxxxxxxxxxxxx")
+        callbacks = PreflightFlowCallback(pfr)
+        step = MagicMock(
+            step_num="1",
+            task_name="get_installed_packages",
+            task_config={"class_path": "cumulusci.tasks.preflight.GetPackages"},
+        )
+
+        callbacks.pre_task(step)
+        callbacks.post_task(step, MagicMock(exception=None))
+
+        log_record = next(r for r in caplog.records if "took" in r.message)
+        assert (
+            log_record.context["task_class"] == "cumulusci.tasks.preflight.GetPackages"
+        )
+        assert log_record.context["status"] == "ok"
+
+    @pytest.mark.django_db
+    def test_post_task__traced(
+        self, settings, tmp_path, plan_factory, preflight_result_factory
+    ):
+        settings.TRACING_EXPORTER = "json"
+        settings.TRACING_JSON_PATH = str(tmp_path / "traces.jsonl")
+        pfr = preflight_result_factory(plan=plan_factory(), org_id="00Dxxxxxxxxxxxxxxx")
+        callbacks = PreflightFlowCallback(pfr)
+        step = MagicMock(step_num="1", task_name="get_installed_packages")
+
+        callbacks.pre_task(step)
+        with pytest.raises(ValueError):
+            callbacks.post_task(step, MagicMock(exception=ValueError("Oops")))
+
+        with open(settings.TRACING_JSON_PATH) as f:
+            span = json.loads(f.read())
+        assert span["name"] == "step 1"
+        assert span["error"] == "ValueError: Oops"
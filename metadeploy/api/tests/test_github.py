@@ -1,9 +1,11 @@
+import os
+import zipfile
 from contextlib import ExitStack
 from unittest.mock import patch
 
 import pytest
 
-from ..github import local_github_checkout
+from ..github import get_checkout_sha, local_github_checkout
 
 
 @pytest.mark.django_db
@@ -17,9 +19,45 @@ def test_local_github_checkout(product_factory):
     product_factory(repo_url="https://github.com/SalesforceFoundation/gem-foo")
 
     with ExitStack() as stack:
-        stack.enter_context(patch("metadeploy.api.github.os"))
         stack.enter_context(patch("metadeploy.api.github.get_github_api_for_repo"))
-        stack.enter_context(patch("metadeploy.api.github.download_extract_github"))
+        stack.enter_context(
+            patch("metadeploy.api.github.download_extract_github_from_repo")
+        )
 
         with local_github_checkout("SalesforceFoundation", "gem") as repo_root:
             assert isinstance(repo_root, str)
+
+
+@pytest.mark.django_db
+def test_local_github_checkout__records_sha(product_factory):
+    product_factory(repo_url="https://github.com/SalesforceFoundation/gem")
+    sha = "0123456789abcdef0123456789abcdef01234567"
+
+    def archive(format, path, ref):
+        # A zipball as GitHub serves it: one top-level folder, which
+        # download_extract_github_from_repo strips via zip_subfolder.
+        top = f"SalesforceFoundation-gem-{ref[:7]}/"
+        with zipfile.ZipFile(path, "w") as zf:
+            zf.writestr(top, "")
+            zf.writestr(f"{top}cumulusci.yml", "")
+        return True
+
+    with ExitStack() as stack:
+        get_github_api = stack.enter_context(
+            patch("metadeploy.api.github.get_github_api_for_repo")
+        )
+        repo = get_github_api.return_value.repository.return_value
+        repo.default_branch = "main"
+        repo.commit.return_value.sha = sha
+        repo.archive.side_effect = archive
+
+        with local_github_checkout("SalesforceFoundation", "gem") as repo_root:
+            assert get_checkout_sha(repo_root) == sha
+            assert os.path.exists(os.path.join(repo_root, "cumulusci.yml"))
+
+    repo.commit.assert_called_once_with("main")
+    assert repo.archive.call_args.kwargs["ref"] == sha
+
+
+def test_get_checkout_sha__missing(tmp_path):
+    assert get_checkout_sha(str(tmp_path)) is None
@@ -13,12 +13,12 @@ from django.utils.timezone import make_aware
 from rq.worker import StopRequested
 
 from config.settings.base import MINIMUM_JOBS_FOR_AVERAGE
+from metadeploy import instrumentation
 from metadeploy.api.belvedere_utils import convert_to_18
 from metadeploy.api.constants import ERROR
 
 from ..flows import StopFlowException
 from ..jobs import (
-    calculate_average_plan_runtime,
     create_scratch_org,
     delete_org_on_error,
     delete_scratch_org,
@@ -26,9 +26,12 @@ from ..jobs import (
     expire_preflights,
     finalize_result,
     preflight,
+    preload_job_modules,
+    report_step_timings,
     run_flows,
+    step_timing_histogram,
 )
-from ..models import Job, PreflightResult
+from ..models import Job, PlanDurationStats, PreflightResult
 
 
 @pytest.mark.django_db
@@ -114,6 +117,73 @@ def test_enqueuer(mocker, job_factory):
     assert job.job_id is not None
 
 
+@pytest.mark.django_db
+def test_enqueuer__claimed(mocker, job_factory):
+    delay = mocker.patch("metadeploy.api.jobs.run_flows_job.delay")
+    job = job_factory(org_id="00Dxxxxxxxxxxxxxxx")
+    mocker.patch(
+        "metadeploy.api.models.Job.objects.filter",
+        side_effect=[[job], Job.objects.none()],
+    )
+
+    enqueuer()
+
+    assert not delay.called
+
+
+@pytest.mark.django_db
+def test_enqueuer__delay_fails(mocker, caplog, job_factory):
+    mocker.patch("metadeploy.api.jobs.run_flows_job.delay", side_effect=ConnectionError)
+    job = job_factory(org_id="00Dxxxxxxxxxxxxxxx")
+
+    with pytest.raises(ConnectionError):
+        enqueuer()
+
+    job.refresh_from_db()
+    assert job.enqueued_at is None
+    assert job.job_id is None
+    log_record = next(r for r in caplog.records if "Failed to enqueue" in r.message)
+    assert log_record.context["event"] == "job_enqueue_failed"
+
+
+@pytest.mark.django_db
+def test_enqueuer__resume(mocker, caplog, plan_factory, step_factory, job_factory):
+    caplog.set_level("INFO")
+    delay = mocker.patch("metadeploy.api.jobs.run_flows_job.delay")
+    delay.return_value.enqueued_at = timezone.now()
+    plan = plan_factory()
+    done, remaining = (step_factory(plan=plan, step_num=str(i)) for i in (1, 2))
+    job = job_factory(
+        plan=plan, steps=[done, remaining], org_id="00Dxxxxxxxxxxxxxxx", resume_count=1
+    )
+    job.record_step_result(str(done.id), status="ok", duration=90.0)
+
+    enqueuer()
+
+    job.refresh_from_db()
+    assert delay.call_args.kwargs["skip_steps"] == ["1"]
+    assert delay.call_args.kwargs["job_id"] == str(job.job_id)
+    log_record = next(r for r in caplog.records if "Resuming" in r.message)
+    assert log_record.context["event"] == "job_resumed"
+    assert log_record.context["skipped_steps"] == 1
+    assert log_record.context["time_saved"] == 90
+
+
+@pytest.mark.django_db
+def test_run_flows__superseded(mocker, job_factory):
+    local_github_checkout = mocker.patch("metadeploy.api.jobs.local_github_checkout")
+    mocker.patch("metadeploy.api.jobs.get_current_job").return_value.id = "another"
+    job = job_factory(
+        org_id="00Dxxxxxxxxxxxxxxx", job_id="294fc6d2-0f3c-4877-b849-54184724b6b2"
+    )
+
+    run_flows(plan=job.plan, skip_steps=[], result_class=Job, result_id=job.id)
+
+    assert not local_github_checkout.called
+    job.refresh_from_db()
+    assert job.status == Job.Status.started
+
+
 @pytest.mark.django_db
 def test_preflight(mocker, user_factory, plan_factory, preflight_result_factory):
     run_flows = mocker.patch("metadeploy.api.jobs.run_flows")
@@ -185,6 +255,65 @@ def test_expire_preflights(user_factory, plan_factory, preflight_result_factory)
     assert preflight4.is_valid
 
 
+@pytest.mark.django_db
+def test_expire_preflights__batches(
+    mocker,
+    settings,
+    user_factory,
+    plan_factory,
+    preflight_result_factory,
+    django_capture_on_commit_callbacks,
+):
+    settings.PREFLIGHT_EXPIRY_BATCH_SIZE = 2
+    preflights_expired = mocker.patch(
+        "metadeploy.api.jobs.preflights_expired", new_callable=mocker.AsyncMock
+    )
+    user = user_factory()
+    plan = plan_factory()
+    started = [
+        preflight_result_factory(
+            user=user, plan=plan, status=PreflightResult.Status.started, org_id=org_id
+        )
+        for org_id in ("00Dxxxxxxxxxxxxxx1", "00Dxxxxxxxxxxxxxx1")
+    ]
+    complete = preflight_result_factory(
+        user=user,
+        plan=plan,
+        status=PreflightResult.Status.complete,
+        org_id="00Dxxxxxxxxxxxxxx2",
+    )
+    PreflightResult.objects.update(
+        created_at=timezone.now()
+        - timedelta(minutes=settings.PREFLIGHT_LIFETIME_MINUTES + 1)
+    )
+
+    with django_capture_on_commit_callbacks(execute=True):
+        assert expire_preflights() == 3
+
+    assert not PreflightResult.objects.filter(is_valid=True).exists()
+    assert set(
+        PreflightResult.objects.filter(
+            status=PreflightResult.Status.canceled
+        ).values_list("id", flat=True)
+    ) == {preflight.id for preflight in started}
+
+    # One push per batch; the stalled preflights share an org, which is only
+    # notified once:
+    assert preflights_expired.call_count == 2
+    invalidated = [
+        id for call in preflights_expired.call_args_list for id in call.args[0]
+    ]
+    assert sorted(invalidated) == sorted([p.id for p in started] + [complete.id])
+    canceled_calls = [call.kwargs for call in preflights_expired.call_args_list]
+    assert sorted(
+        id for kwargs in canceled_calls for id in kwargs["canceled_ids"]
+    ) == sorted(p.id for p in started)
+    assert ["00Dxxxxxxxxxxxxxx1"] in [kwargs["org_ids"] for kwargs in canceled_calls]
+    assert all(
+        "00Dxxxxxxxxxxxxxx2" not in kwargs["org_ids"] for kwargs in canceled_calls
+    )
+
+
 @pytest.mark.django_db
 def test_delete_org_on_error(scratch_org_factory):
     scratch_org = scratch_org_factory(org_id="00Dxxxxxxxxxxxxxxx")
@@ -209,6 +338,7 @@ def test_finalize_result_worker_died(job_factory, caplog):
         org_id="00Dxxxxxxxxxxxxxxx",
         plan__version__product__title="Test Product",
         plan__version__label="1.0",
+        resume_count=settings.JOB_MAX_RESUMES,
     )
     try:
         with finalize_result(job):
@@ -226,6 +356,43 @@ def test_finalize_result_worker_died(job_factory, caplog):
     assert "duration" in log_record.context
 
 
+@pytest.mark.django_db
+def test_finalize_result__instrumented(job_factory, caplog):
+    caplog.set_level("INFO")
+    job = job_factory(org_id="00Dxxxxxxxxxxxxxxx")
+    with instrumentation.collect(force=True):
+        with finalize_result(job):
+            pass
+
+    log_record = next(r for r in caplog.records if "succeeded" in r.message)
+    assert isinstance(log_record.context["duration"], float)
+    assert "db_queries" in log_record.context
+
+
+@pytest.mark.django_db
+def test_finalize_result_worker_died__resume(job_factory, caplog):
+    job = job_factory(
+        org_id="00Dxxxxxxxxxxxxxxx",
+        enqueued_at=timezone.now(),
+        job_id="294fc6d2-0f3c-4877-b849-54184724b6b2",
+    )
+    with pytest.raises(StopRequested):
+        with finalize_result(job):
+            raise StopRequested()
+
+    job.refresh_from_db()
+    assert job.status == job.Status.started
+    assert job.enqueued_at is None
+    assert job.job_id is None
+    assert job.resume_count == 1
+
+    log_record = next(r for r in caplog.records if "interrupted" in r.message)
+    assert (
+        log_record.message == f"Job {job.id} interrupted by dyno restart, will resume"
+    )
+    assert log_record.context["status"] == "resumed"
+
+
 @pytest.mark.django_db
 def test_finalize_result_canceled_job(job_factory, caplog):
     # User-requested job cancellation.
@@ -617,41 +784,122 @@ class TestCreateScratchOrg:
 
 
 @pytest.mark.django_db
-class TestCalculateAveragePlanRuntime:
-    def test_calculate_average_plan_runtime(self, plan_factory, job_factory):
+class TestPlanDurationStats:
+    def finish_job(self, job_factory, plan, *, minutes=60):
+        job = job_factory(
+            plan=plan,
+            org_id="00Dxxxxxxxxxxxxxxx",
+            enqueued_at=timezone.now() - timedelta(minutes=minutes),
+        )
+        with finalize_result(job):
+            pass
+        return job
+
+    def test_finalize_result_records_duration(self, plan_factory, job_factory):
+        plan = plan_factory()
+        for _ in range(MINIMUM_JOBS_FOR_AVERAGE):
+            self.finish_job(job_factory, plan)
+
+        plan.refresh_from_db()
+        assert plan.calculated_average_duration == pytest.approx(3600, abs=5)
+        stats = plan.duration_stats
+        assert len(stats.durations) == MINIMUM_JOBS_FOR_AVERAGE
+        assert stats.p90 == pytest.approx(3600, abs=5)
+        assert plan.calculated_p90_duration == pytest.approx(3600, abs=5)
+
+    def test_step_etas(self, plan_factory, job_factory):
         plan = plan_factory()
-        plan.save()
         for _ in range(MINIMUM_JOBS_FOR_AVERAGE):
             job = job_factory(
                 plan=plan,
-                status="complete",
-                # give a runtime of one hour
-                enqueued_at=datetime(2020, 1, 1, 0, 0, 0),
-                success_at=datetime(2020, 1, 1, 1, 0, 0),
+                org_id="00Dxxxxxxxxxxxxxxx",
+                enqueued_at=timezone.now() - timedelta(minutes=5),
             )
-            job.save()
+            job.record_step_result("step", status="ok", duration=12.4)
+            with finalize_result(job):
+                pass
 
-        assert plan.calculated_average_duration is None
-        calculate_average_plan_runtime()
         plan.refresh_from_db()
-        assert plan.calculated_average_duration == 3600
+        assert plan.calculated_step_durations == {"step": 12}
 
-    def test_calculate_average_plan_runtime__minimum_jobs_not_present(
-        self, plan_factory, job_factory
-    ):
+    def test_minimum_jobs_not_present(self, plan_factory, job_factory):
         plan = plan_factory()
-        plan.save()
         for _ in range(MINIMUM_JOBS_FOR_AVERAGE - 1):
-            job = job_factory(
-                plan=plan,
-                status="complete",
-                # give a runtime of one hour
-                enqueued_at=datetime(2020, 1, 1, 0, 0, 0),
-                success_at=datetime(2020, 1, 1, 1, 0, 0),
-            )
-            job.save()
+            self.finish_job(job_factory, plan)
 
-        assert plan.calculated_average_duration is None
-        calculate_average_plan_runtime()
         plan.refresh_from_db()
         assert plan.calculated_average_duration is None
+        assert plan.duration_stats.p50 is None
+
+    def test_window(self, plan_factory, job_factory):
+        plan = plan_factory()
+        for minutes in range(1, settings.AVERAGE_JOB_WINDOW + 3):
+            self.finish_job(job_factory, plan, minutes=minutes)
+
+        durations = plan.duration_stats.durations
+        assert len(durations) == settings.AVERAGE_JOB_WINDOW
+        assert durations[-1] == pytest.approx(
+            60 * (settings.AVERAGE_JOB_WINDOW + 2), abs=5
+        )
+
+    def test_step_durations(self, plan_factory, job_factory):
+        plan = plan_factory()
+        job = job_factory(
+            plan=plan,
+            org_id="00Dxxxxxxxxxxxxxxx",
+            enqueued_at=timezone.now() - timedelta(minutes=5),
+        )
+        job.record_step_result("step", status="ok", duration=12.5)
+        with finalize_result(job):
+            pass
+
+        assert plan.duration_stats.step_p50s == {"step": 12.5}
+
+    def test_failed_job_not_recorded(self, plan_factory, job_factory):
+        plan = plan_factory()
+        job = job_factory(plan=plan, org_id="00Dxxxxxxxxxxxxxxx")
+        with pytest.raises(ValueError):
+            with finalize_result(job):
+                raise ValueError()
+
+        assert not PlanDurationStats.objects.filter(plan=plan).exists()
+
+
+@pytest.mark.django_db
+def test_preload_job_modules(step_factory):
+    step_factory(task_class="cumulusci.tasks.util.Sleep")
+    step_factory(task_class="cumulusci.tasks.util.Sleep")
+    step_factory(task_class="tasks.only_in_the_repo.Task")
+
+    assert preload_job_modules() == 1
+
+
+class TestReportStepTimings:
+    def test_histogram(self):
+        histogram = step_timing_histogram([0.5, 4, 20, 20, 4000])
+
+        assert histogram["count"] == 5
+        assert histogram["p50"] == 20
+        assert histogram["p90"] == 4000
+        assert histogram["max"] == 4000
+        assert (histogram["le_1"], histogram["le_15"], histogram["le_3600"]) == (
+            1,
+            2,
+            4,
+        )
+
+    @pytest.mark.django_db
+    def test_report(self, caplog, job_factory):
+        caplog.set_level("INFO")
+        job = job_factory(org_id="00Dxxxxxxxxxxxxxxx")
+        job.record_step_result("1", status="ok", duration=2.0, task_class="a.Task")
+        job.record_step_result("2", status="ok", duration=4.0, task_class="a.Task")
+        job.record_step_result("3", status="ok", duration=9.0, task_class="b.Task")
+        job.record_step_result("4", status="ok")
+
+        assert report_step_timings() == 2
+        log_record = next(r for r in caplog.records if r.message.startswith("a.Task"))
+        assert log_record.context["event"] == "step_timing_histogram"
+        assert log_record.context["plan"] == job.plan.slug
+        assert log_record.context["count"] == 2
+        assert log_record.context["le_5"] == 2
@@ -1,3 +1,4 @@
+import hashlib
 from contextlib import ExitStack
 from datetime import timedelta
 from unittest import mock
@@ -12,12 +13,16 @@ from config.settings.base import MINIMUM_JOBS_FOR_AVERAGE
 
 from ..models import (
     SUPPORTED_ORG_TYPES,
+    ClickThroughAgreement,
     Job,
+    Plan,
     PreflightResult,
     ScratchOrg,
     SiteProfile,
     Step,
     Version,
+    percentile,
+    summarize_durations,
 )
 
 
@@ -125,6 +130,7 @@ class TestUser:
         assert user.org_name == "Sample Org"
 
         user.socialaccount_set.all().delete()
+        user.refresh_from_db()
         assert user.org_name is None
 
     def test_org_type(self, user_factory):
@@ -132,6 +138,7 @@ class TestUser:
         assert user.org_type == "Developer Edition"
 
         user.socialaccount_set.all().delete()
+        user.refresh_from_db()
         assert user.org_type is None
 
     def test_social_account(self, user_factory):
@@ -140,6 +147,7 @@ class TestUser:
         assert user.social_account == user.socialaccount_set.first()
 
         user.socialaccount_set.all().delete()
+        user.refresh_from_db()
         assert user.social_account is None
 
     def test_instance_url(self, user_factory):
@@ -147,6 +155,7 @@ class TestUser:
         assert user.instance_url == "https://example.com"
 
         user.socialaccount_set.all().delete()
+        user.refresh_from_db()
         assert user.instance_url is None
 
     def test_token(self, user_factory):
@@ -154,6 +163,7 @@ class TestUser:
         assert user.token == ("0123456789abcdef", "secret.0123456789abcdef")
 
         user.socialaccount_set.all().delete()
+        user.refresh_from_db()
         assert user.token == (None, None)
 
     def test_valid_token_for(self, user_factory):
@@ -161,8 +171,35 @@ class TestUser:
         assert user.valid_token_for == "00Dxxxxxxxxxxxxxxx"
 
         user.socialaccount_set.first().socialtoken_set.all().delete()
+        user.clear_cached_org_data()
         assert user.valid_token_for is None
 
+    def test_sf_identity__loaded_once(self, user_factory, django_assert_num_queries):
+        user = user_factory()
+        user.clear_cached_org_data()
+        # One query for the account, one for its prefetched tokens:
+        with django_assert_num_queries(2):
+            assert user.org_id == "00Dxxxxxxxxxxxxxxx"
+            assert user.full_org_type == "Developer"
+            assert user.instance_url == "https://example.com"
+            assert user.valid_token_for == "00Dxxxxxxxxxxxxxxx"
+            assert user.token == ("0123456789abcdef", "secret.0123456789abcdef")
+
+    def test_sf_identity__token_decrypted_once(self, user_factory, mocker):
+        user = user_factory()
+        user.clear_cached_org_data()
+        decrypt = mocker.patch(
+            "metadeploy.api.models.fernet_decrypt", side_effect=lambda value: value
+        )
+        user.token
+        user.token
+        assert decrypt.call_count == 2
+
+    def test_sf_identity__immutable(self, user_factory):
+        user = user_factory()
+        with pytest.raises(AttributeError):
+            user.sf_identity.org_id = "00Dyyyyyyyyyyyyyyy"
+
     def test_full_org_type(self, user_factory, social_account_factory):
         user = user_factory(socialaccount_set=[])
         social_account_factory(
@@ -284,6 +321,58 @@ class TestVersion:
         )
         assert list(version.additional_plans) == [plan2]
 
+    def test_plan_pointers__tier_change(self, version_factory, plan_factory):
+        version = version_factory()
+        plan = plan_factory(version=version, tier="primary")
+        assert version.primary_plan == plan
+
+        plan.tier = "secondary"
+        plan.save()
+        version.refresh_from_db()
+        assert version.primary_plan is None
+        assert version.secondary_plan == plan
+
+    def test_plan_pointers__version_change(self, version_factory, plan_factory):
+        old_version = version_factory()
+        new_version = version_factory(product=old_version.product)
+        plan = plan_factory(version=old_version, tier="additional")
+        assert old_version.additional_plan_pks == [int(plan.pk)]
+
+        plan.version = new_version
+        plan.save()
+        old_version.refresh_from_db()
+        new_version.refresh_from_db()
+        assert old_version.additional_plan_pks == []
+        assert list(new_version.additional_plans) == [plan]
+
+    def test_plan_pointers__delete(self, version_factory, plan_factory):
+        version = version_factory()
+        plan = plan_factory(version=version, tier="primary")
+        plan.delete()
+        version.refresh_from_db()
+        assert version.primary_plan is None
+
+    def test_plan_pointers__delete_falls_back(self, version_factory, plan_factory):
+        version = version_factory()
+        older = plan_factory(version=version, tier="primary")
+        plan = plan_factory(version=version, tier="primary")
+        assert version.primary_plan == plan
+
+        Plan.objects.filter(pk=plan.pk).delete()
+        version.refresh_from_db()
+        assert version.primary_plan == older
+
+    def test_plan_pointers__unrelated_save(self, plan_factory):
+        plan = plan_factory()
+        with mock.patch.object(Plan, "_refresh_version_pointers") as refresh:
+            plan.commit_ish = "feature/other"
+            plan.save()
+            assert not refresh.called
+
+            plan.tier = "secondary"
+            plan.save()
+            assert refresh.called
+
 
 @pytest.mark.django_db
 def test_product_category_str(product_category_factory):
@@ -445,6 +534,44 @@ class TestPlan:
         assert not plan.is_visible_to(user)
         assert scratch_plan.is_visible_to(user)
 
+    def test_is_visible_to__memoized(
+        self,
+        allowed_list_factory,
+        allowed_list_org_factory,
+        plan_factory,
+        user_factory,
+        django_assert_num_queries,
+    ):
+        allowed_list = allowed_list_factory()
+        other_list = allowed_list_factory()
+        allowed_list_org_factory(allowed_list=allowed_list, org_id="00Dxxxxxxxxxxxxxxx")
+        plans = [plan_factory(visible_to=allowed_list) for _ in range(3)]
+        hidden_plan = plan_factory(visible_to=other_list)
+        user = user_factory()
+
+        assert plans[0].is_visible_to(user)
+        assert user.full_org_type == "Developer"
+        with django_assert_num_queries(0):
+            assert all(plan.is_visible_to(user) for plan in plans)
+
+        # Only the AllowedList itself is loaded to check the org type:
+        with django_assert_num_queries(1):
+            assert not hidden_plan.is_visible_to(user)
+
+    def test_is_visible_to__cache_cleared(
+        self, allowed_list_factory, allowed_list_org_factory, plan_factory, user_factory
+    ):
+        allowed_list = allowed_list_factory()
+        plan = plan_factory(visible_to=allowed_list)
+        user = user_factory()
+        assert not plan.is_visible_to(user)
+
+        allowed_list_org_factory(allowed_list=allowed_list, org_id="00Dxxxxxxxxxxxxxxx")
+        assert not plan.is_visible_to(user)
+
+        user.clear_cached_org_data()
+        assert plan.is_visible_to(user)
+
     def test_plan_post_install_markdown(self, plan_factory):
         msg = "This is a *sample* with some<script src='bad.js'></script> bad tags."
         plan = plan_factory(post_install_message_additional=msg)
@@ -497,6 +624,59 @@ class TestPlan:
             invalid_plan.clean()
 
 
+def test_percentile():
+    assert percentile([3, 1, 2, 10], 0.5) == 2
+    assert percentile([3, 1, 2, 10], 0.9) == 10
+    assert percentile([5], 0.1) == 5
+
+
+def test_summarize_durations():
+    assert summarize_durations([]) == {"p50": None, "p95": None, "max": None}
+    assert summarize_durations([2.0]) == {"p50": 2.0, "p95": 2.0, "max": 2.0}
+    assert summarize_durations(x / 10 for x in range(1, 21)) == {
+        "p50": 1.0,
+        "p95": 1.9,
+        "max": 2.0,
+    }
+
+
+@pytest.mark.django_db
+class TestPlanStepMetadata:
+    def test_requires_preflight__plan_checks(self, plan_factory):
+        plan = plan_factory(preflight_checks=[{"when": "True", "action": "error"}])
+        assert plan.requires_preflight
+
+    def test_requires_preflight__step_checks(self, plan_factory, step_factory):
+        plan = plan_factory()
+        assert not plan.requires_preflight
+
+        step_factory(plan=plan, task_config={"checks": [{"when": "True"}]})
+        assert plan.requires_preflight
+        plan.refresh_from_db()
+        assert plan.requires_preflight
+
+    def test_required_step_ids(self, plan_factory, step_factory):
+        plan = plan_factory()
+        required = step_factory(plan=plan, is_required=True)
+        optional = step_factory(plan=plan, is_required=False)
+        plan.refresh_from_db()
+        assert plan.required_step_ids == [required.id]
+
+        optional.is_required = True
+        optional.save()
+        required.delete()
+        plan.refresh_from_db()
+        assert plan.required_step_ids == [optional.id]
+
+    def test_required_step_ids__no_query(
+        self, django_assert_num_queries, plan_factory, step_factory
+    ):
+        plan = step_factory(is_required=True).plan
+        with django_assert_num_queries(0):
+            assert len(plan.required_step_ids) == 1
+            assert not plan.requires_preflight
+
+
 @pytest.mark.django_db
 class TestStep:
     def test_str(self, step_factory):
@@ -599,6 +779,75 @@ class TestJob:
         assert job.master_service_agreement
         assert job.master_service_agreement.text == "MSA"
 
+    def test_click_through_agreement__deduplicated(
+        self, django_assert_num_queries, plan_factory, job_factory
+    ):
+        plan = plan_factory(version__product__click_through_agreement="Test")
+        job1 = job_factory(plan=plan, org_id="00Dxxxxxxxxxxxxxxx")
+        job2 = job_factory(plan=plan, org_id="00Dxxxxxxxxxxxxxxx")
+
+        assert job1.click_through_agreement_id == job2.click_through_agreement_id
+        assert ClickThroughAgreement.objects.count() == 1
+        with django_assert_num_queries(0):
+            assert (
+                ClickThroughAgreement.objects.get_id_for_text("Test")
+                == job1.click_through_agreement_id
+            )
+
+    def test_click_through_agreement__digest(self):
+        agreement = ClickThroughAgreement.objects.create(text="Test")
+        assert agreement.digest == hashlib.sha256(b"Test").hexdigest()
+
+        agreement.text = "Changed"
+        agreement.save()
+        assert ClickThroughAgreement.objects.get_id_for_text("Test") != agreement.id
+
+    def test_click_through_agreement__deleted(self):
+        agreement_id = ClickThroughAgreement.objects.get_id_for_text("Test")
+        ClickThroughAgreement.objects.filter(id=agreement_id).delete()
+
+        new_id = ClickThroughAgreement.objects.get_id_for_text("Test")
+        assert new_id != agreement_id
+        assert ClickThroughAgreement.objects.filter(id=new_id).exists()
+
+    def test_result_counts(self, job_factory):
+        job = job_factory(
+            org_id="00Dxxxxxxxxxxxxxxx",
+            results={
+                "a": [{"status": "error"}, {"status": "warn"}],
+                "b": [{"status": "warn"}, "not a result"],
+            },
+        )
+        assert (job.error_count, job.warning_count) == (1, 2)
+
+        job.results["a"] = [{"status": "ok"}]
+        job.save()
+        job.refresh_from_db()
+        assert (job.error_count, job.warning_count) == (0, 1)
+
+    def test_record_step_result(self, job_factory):
+        job = job_factory(org_id="00Dxxxxxxxxxxxxxxx")
+        job.record_step_result("a", status="ok")
+        job.record_step_result("a", status="error", message="Oops")
+
+        assert job.step_results.count() == 1
+        assert job.get_results() == {"a": [{"status": "error", "message": "Oops"}]}
+
+    def test_get_results(self, job_factory):
+        job = job_factory(
+            org_id="00Dxxxxxxxxxxxxxxx",
+            results={"a": [{"status": "hide"}], "b": [{"status": "hide"}]},
+        )
+        job.record_step_result("b", status="ok")
+        job.append_step_logs("c", "Deploying")
+        job.append_step_logs("c", "Done")
+
+        assert job.get_results() == {
+            "a": [{"status": "hide"}],
+            "b": [{"status": "ok"}],
+            "c": [{"logs": "Deploying\nDone"}],
+        }
+
     def test_skip_steps(self, plan_factory, step_factory, job_factory):
         plan = plan_factory()
         step1 = step_factory(plan=plan, path="task1")
@@ -608,6 +857,25 @@ class TestJob:
 
         assert job.skip_steps() == [step2.step_num]
 
+    def test_skip_steps__completed(self, plan_factory, step_factory, job_factory):
+        plan = plan_factory()
+        step1 = step_factory(plan=plan, path="task1", step_num="1")
+        step2 = step_factory(plan=plan, path="task2", step_num="2")
+        job = job_factory(plan=plan, steps=[step1, step2], org_id="00Dxxxxxxxxxxxxxxx")
+        job.record_step_result(str(step1.id), status="ok")
+        job.record_step_result(str(step2.id), status="error")
+
+        assert job.skip_steps() == ["1"]
+
+    def test_prepare_resume(self, job_factory, settings):
+        settings.JOB_MAX_RESUMES = 1
+        job = job_factory(org_id="00Dxxxxxxxxxxxxxxx", enqueued_at=timezone.now())
+
+        assert job.prepare_resume()
+        assert job.enqueued_at is None
+        assert job.resume_count == 1
+        assert not job.prepare_resume()
+
     def test_invalidate_related_preflight(self, job_factory, preflight_result_factory):
         job = job_factory(org_id="00Dxxxxxxxxxxxxxxx")
         preflight = preflight_result_factory(
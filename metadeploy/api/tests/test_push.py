@@ -4,10 +4,14 @@ import pytest
 from asgiref.sync import sync_to_async
 from channels.layers import get_channel_layer
 
+from ... import tracing
+from ...consumer_utils import message_to_hash
 from ..push import (
     job_started,
     notify_org_changed,
     notify_org_result_changed,
+    preflights_expired,
+    push_serializable,
     report_error,
 )
 
@@ -34,6 +38,24 @@ async def test_report_error(mocker, user_factory):
     assert push_message.called
 
 
+@pytest.mark.asyncio
+async def test_push_serializable__trace(mocker, settings, tmp_path):
+    settings.TRACING_EXPORTER = "json"
+    settings.TRACING_JSON_PATH = str(tmp_path / "traces.jsonl")
+    push_message = mocker.patch("metadeploy.api.push.push_message", new=AsyncMock())
+    instance = MagicMock(id=1)
+    instance._meta.model_name = "job"
+    with tracing.span("outer") as span:
+        await push_serializable(instance, MagicMock, "JOB_COMPLETED")
+
+    message = push_message.call_args.args[1]
+    assert message["trace"] == {"trace_id": span.trace_id, "span_id": span.span_id}
+    # Messages that differ only in their trace are still deduplicated:
+    assert message_to_hash(message) == message_to_hash(
+        {k: v for k, v in message.items() if k != "trace"}
+    )
+
+
 @pytest.mark.django_db(transaction=True)
 @pytest.mark.asyncio
 async def test_notify_org_result_changed(
@@ -51,6 +73,23 @@ async def test_notify_org_result_changed(
     gcl.assert_called()
 
 
+@pytest.mark.asyncio
+async def test_preflights_expired(mocker):
+    push_message = mocker.patch("metadeploy.api.push.push_message", new=AsyncMock())
+    notify_org_id_changed = mocker.patch(
+        "metadeploy.api.push.notify_org_id_changed", new=AsyncMock()
+    )
+    await preflights_expired([1, 2], canceled_ids=[2], org_ids=["00Dxxxxxxxxxxxxxxx"])
+
+    inner_types = [call.args[1]["inner_type"] for call in push_message.call_args_list]
+    assert sorted(inner_types) == [
+        "PREFLIGHT_CANCELED",
+        "PREFLIGHT_INVALIDATED",
+        "PREFLIGHT_INVALIDATED",
+    ]
+    notify_org_id_changed.assert_called_once_with("00Dxxxxxxxxxxxxxxx")
+
+
 @pytest.mark.django_db(transaction=True)
 @pytest.mark.asyncio
 async def test_notify_org_changed__error(mocker, scratch_org_factory):
@@ -64,7 +103,6 @@ async def test_notify_org_changed__error(mocker, scratch_org_factory):
 @pytest.mark.django_db(transaction=True)
 @pytest.mark.asyncio
 async def test_notify_org_changed__async(mocker, scratch_org_factory):
-
     from ..serializers import ScratchOrgSerializer
 
     scratch_org_factory = sync_to_async(scratch_org_factory)
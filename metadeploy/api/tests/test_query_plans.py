@@ -0,0 +1,94 @@
+"""
+Check that the hottest lookups are served by an index.
+
+Postgres will happily sequentially scan the tiny tables seeded here, so each test
+disables sequential scans for its transaction: the planner then only falls back
+to one when no usable index exists.
+"""
+from datetime import timedelta
+
+import pytest
+from allauth.socialaccount.models import SocialToken
+from django.db import connection
+from django.utils import timezone
+
+from ..models import Job, PreflightResult, ScratchOrg
+
+ORG_ID = "00Dxxxxxxxxxxxxxxx"
+
+
+def assert_no_seq_scan(queryset, table):
+    with connection.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+    plan = queryset.explain()
+    assert f"Seq Scan on {table}" not in plan, plan
+
+
+@pytest.fixture
+def seeded(user_factory, plan_factory, job_factory, preflight_result_factory):
+    user = user_factory()
+    plan = plan_factory()
+    for status in (Job.Status.started, Job.Status.complete, Job.Status.failed):
+        job_factory(user=user, plan=plan, org_id=ORG_ID, status=status)
+        preflight_result_factory(user=user, plan=plan, org_id=ORG_ID, status=status)
+    return plan
+
+
+@pytest.mark.django_db
+class TestQueryPlans:
+    def test_pending_job(self, seeded):
+        assert_no_seq_scan(
+            Job.objects.filter(status=Job.Status.started, org_id=ORG_ID), "api_job"
+        )
+
+    def test_unenqueued_jobs(self, seeded):
+        assert_no_seq_scan(Job.objects.filter(enqueued_at=None), "api_job")
+
+    def test_recent_completed_jobs(self, seeded):
+        assert_no_seq_scan(
+            Job.objects.filter(plan=seeded, status=Job.Status.complete).order_by(
+                "-created_at"
+            )[:10],
+            "api_job",
+        )
+
+    def test_most_recent_preflight(self, seeded):
+        assert_no_seq_scan(
+            PreflightResult.objects.filter(
+                org_id=ORG_ID,
+                plan=seeded,
+                is_valid=True,
+                status=PreflightResult.Status.complete,
+            ).order_by("-created_at")[:1],
+            "api_preflightresult",
+        )
+
+    def test_running_preflight(self, seeded):
+        assert_no_seq_scan(
+            PreflightResult.objects.filter(
+                org_id=ORG_ID, status=PreflightResult.Status.started
+            ),
+            "api_preflightresult",
+        )
+
+    def test_expiring_preflights(self, seeded):
+        assert_no_seq_scan(
+            PreflightResult.objects.filter(
+                is_valid=True, created_at__lte=timezone.now() - timedelta(minutes=10)
+            ),
+            "api_preflightresult",
+        )
+
+    def test_scratch_org_from_session(self, scratch_org_factory):
+        scratch_org = scratch_org_factory(org_id=ORG_ID)
+        assert_no_seq_scan(
+            ScratchOrg.objects.filter(uuid=scratch_org.uuid), "api_scratchorg"
+        )
+
+    def test_expiring_tokens(self, seeded):
+        assert_no_seq_scan(
+            SocialToken.objects.filter(
+                account__last_login__lte=timezone.now() - timedelta(hours=1)
+            ),
+            "socialaccount_socialaccount",
+        )
@@ -0,0 +1,126 @@
+from datetime import timedelta
+from unittest.mock import MagicMock
+
+import django_rq
+import pytest
+from rq import SimpleWorker
+from rq.job import Job as RQJob
+from rq.registry import FailedJobRegistry, FinishedJobRegistry, StartedJobRegistry
+from rq.utils import utcnow
+from rq.worker import WorkerStatus
+
+from ..jobs import FAILURE_TTL
+from ..queue_metrics import all_queue_metrics, queue_metrics
+
+
+def seed_job(registry, *, enqueued, started, ended, ttl):
+    """Add a job to registry as if it had run that many seconds ago."""
+    now = utcnow()
+    job = RQJob.create(len, args=([],), connection=registry.connection)
+    job.origin = registry.name
+    job.enqueued_at = now - timedelta(seconds=enqueued)
+    job.started_at = now - timedelta(seconds=started)
+    job.ended_at = now - timedelta(seconds=ended)
+    job.save()
+    registry.add(job, ttl)
+    return job
+
+
+def fake_worker(state, *queue_names):
+    worker = MagicMock()
+    worker.get_state.return_value = state
+    worker.queue_names.return_value = list(queue_names)
+    return worker
+
+
+@pytest.mark.django_db
+class TestQueueMetrics:
+    def test_finished_job(self):
+        queue = django_rq.get_queue("short")
+        job = queue.enqueue(len, [1, 2])
+        try:
+            assert queue_metrics("short")["depth"] >= 1
+
+            django_rq.get_worker("short", worker_class=SimpleWorker).work(burst=True)
+            metrics = queue_metrics("short")
+        finally:
+            job.delete()
+
+        assert metrics["finished"] >= 1
+        assert metrics["wait"]["p50"] is not None
+        assert metrics["run_time"]["max"] is not None
+        assert metrics["failure_rate"] is not None
+
+    def test_failed_jobs(self):
+        queue = django_rq.get_queue("short")
+        # One made like our jobs, one like a cron job, with RQ's failure_ttl:
+        jobs = [
+            queue.enqueue(int, "not a number", failure_ttl=FAILURE_TTL),
+            queue.enqueue(int, "not a number"),
+        ]
+        try:
+            django_rq.get_worker("short", worker_class=SimpleWorker).work(burst=True)
+            metrics = queue_metrics("short")
+        finally:
+            for job in jobs:
+                job.delete()
+
+        assert metrics["failed"] >= 2
+
+    def test_seeded_registries(self, mocker, settings):
+        settings.QUEUE_METRICS_WINDOW = 300
+        queue = django_rq.get_queue("short")
+        queue.empty()
+        registries = [
+            registry(queue=queue)
+            for registry in (StartedJobRegistry, FinishedJobRegistry, FailedJobRegistry)
+        ]
+        for registry in registries:
+            queue.connection.delete(registry.key)
+        _, finished, failed = registries
+        jobs = [
+            queue.enqueue(len, []),
+            queue.enqueue(len, []),
+            seed_job(finished, enqueued=100, started=90, ended=80, ttl=720),
+            seed_job(finished, enqueued=60, started=50, ended=20, ttl=720),
+            # Ended before the window:
+            seed_job(finished, enqueued=400, started=390, ended=380, ttl=720),
+            # Made like our jobs, and like a cron job, with RQ's failure_ttl:
+            seed_job(failed, enqueued=40, started=35, ended=30, ttl=FAILURE_TTL),
+            seed_job(failed, enqueued=20, started=15, ended=10, ttl=None),
+            # Still in the registry, but ended before the window:
+            seed_job(failed, enqueued=1020, started=1010, ended=1000, ttl=None),
+        ]
+        mocker.patch(
+            "metadeploy.api.queue_metrics.Worker.all",
+            return_value=[
+                fake_worker(WorkerStatus.BUSY, "short"),
+                fake_worker(WorkerStatus.IDLE, "default", "short"),
+                fake_worker(WorkerStatus.IDLE, "default"),
+            ],
+        )
+        try:
+            metrics = queue_metrics("short")
+        finally:
+            for job in jobs:
+                job.delete()
+            for registry in registries:
+                queue.connection.delete(registry.key)
+
+        assert metrics["depth"] == 2
+        assert metrics["finished"] == 2
+        assert metrics["failed"] == 2
+        assert metrics["failure_rate"] == 0.5
+        assert metrics["run_time"] == {"p50": 10.0, "p95": 30.0, "max": 30.0}
+        assert metrics["wait"] == {"p50": 5.0, "p95": 10.0, "max": 10.0}
+        assert metrics["workers"] == {"busy": 1, "idle": 1}
+        # Two queued jobs, at the mean run time of 20s, between two workers:
+        assert metrics["backlog_eta"] == 20.0
+
+    def test_pending_jobs(self, job_factory):
+        job_factory(org_id="00Dxxxxxxxxxxxxxxx")
+
+        metrics = all_queue_metrics()
+
+        assert metrics["queues"]["default"]["pending_jobs"] == 1
+        assert "pending_jobs" not in metrics["queues"]["short"]
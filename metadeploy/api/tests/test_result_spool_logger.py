@@ -1,6 +1,6 @@
 import pytest
 
-from ..result_spool_logger import ResultSpoolLogger
+from ..result_spool_logger import PUSH_INTERVAL, ResultSpoolLogger
 
 
 class MockRecord:
@@ -17,15 +17,18 @@ class MockRecord:
 @pytest.mark.django_db
 class TestResultSpoolLogger:
     def test_emit(self, job_factory):
-        job = job_factory(results={"test": [{"logs": ""}]}, org_id="00Dxxxxxxxxxxxxxxx")
+        job = job_factory(
+            results={"test": [{"status": "hide"}]}, org_id="00Dxxxxxxxxxxxxxxx"
+        )
         handler = ResultSpoolLogger(result=job)
         handler.current_key = "test"
-        record = MockRecord("test")
 
-        handler.emit(record)
+        handler.emit(MockRecord("first"))
+        handler.emit(MockRecord("second"))
 
+        assert job.get_results() == {"test": [{"logs": "first\nsecond"}]}
         job.refresh_from_db()
-        assert job.results == {"test": [{"logs": "\ntest"}]}
+        assert job.results == {"test": [{"status": "hide"}]}
 
     def test_emit_none(self, job_factory):
         job = job_factory(results={}, org_id="00Dxxxxxxxxxxxxxxx")
@@ -35,27 +38,21 @@ class TestResultSpoolLogger:
 
         handler.emit(record)
 
-        job.refresh_from_db()
-        assert job.results == {}
-
-    def test_emit_no_logs_key(self, job_factory):
-        job = job_factory(results={"test": [{}]}, org_id="00Dxxxxxxxxxxxxxxx")
-        handler = ResultSpoolLogger(result=job)
-        handler.current_key = "test"
-        record = MockRecord("test")
-
-        handler.emit(record)
-
-        job.refresh_from_db()
-        assert job.results == {"test": [{"logs": "test"}]}
+        assert job.get_results() == {}
 
-    def test_emit_no_current_key(self, job_factory):
+    def test_emit_pushes(self, mocker, job_factory):
         job = job_factory(results={}, org_id="00Dxxxxxxxxxxxxxxx")
+        push = mocker.patch.object(job, "push_results_changed")
         handler = ResultSpoolLogger(result=job)
         handler.current_key = "test"
-        record = MockRecord("test")
 
-        handler.emit(record)
+        monotonic = mocker.patch(
+            "metadeploy.api.result_spool_logger.time.monotonic", return_value=100
+        )
+        handler.emit(MockRecord("first"))
+        handler.emit(MockRecord("second"))
+        push.assert_called_once_with()
 
-        job.refresh_from_db()
-        assert job.results == {"test": [{"logs": "test"}]}
+        monotonic.return_value = 100 + PUSH_INTERVAL
+        handler.emit(MockRecord("third"))
+        assert push.call_count == 2
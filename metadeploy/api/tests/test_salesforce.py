@@ -1,3 +1,4 @@
+import time
 from contextlib import ExitStack
 from unittest.mock import MagicMock, patch
 
@@ -11,7 +12,9 @@ from ..salesforce import (
     ScratchOrgError,
     _get_devhub_api,
     _get_org_result,
+    _org_token_timeout,
     _poll_for_scratch_org_completion,
+    cache_org_config,
     delete_scratch_org,
     refresh_access_token,
 )
@@ -79,6 +82,70 @@ class TestRefreshAccessToken:
             assert scratch_org.delete.called
 
 
+class TestCachedAccessToken:
+    org_id = "00Dxxxxxxxxxxxxxxx"
+
+    def test_reuses_cached_token(self):
+        cache_org_config(
+            self.org_id, MagicMock(config={"access_token": "abc", "org_id": "00D"})
+        )
+        with ExitStack() as stack:
+            OrgConfig = stack.enter_context(
+                patch("metadeploy.api.salesforce.OrgConfig")
+            )
+
+            refresh_access_token(
+                scratch_org=MagicMock(),
+                config={"org_id": "00D"},
+                org_name="current_org",
+                org_id=self.org_id,
+            )
+
+            OrgConfig.assert_called_once_with(
+                {"access_token": "abc", "org_id": "00D"}, "current_org", keychain=None
+            )
+            assert not OrgConfig.return_value.refresh_oauth_token.called
+
+    def test_refreshes_once(self):
+        with ExitStack() as stack:
+            OrgConfig = stack.enter_context(
+                patch("metadeploy.api.salesforce.OrgConfig")
+            )
+            OrgConfig.return_value.config = {"access_token": "abc"}
+
+            for _ in range(2):
+                refresh_access_token(
+                    scratch_org=MagicMock(),
+                    config={},
+                    org_name="current_org",
+                    org_id=self.org_id,
+                )
+
+            assert OrgConfig.return_value.refresh_oauth_token.call_count == 1
+
+    def test_disabled(self, settings):
+        settings.ORG_TOKEN_LIFETIME = 0
+        with ExitStack() as stack:
+            OrgConfig = stack.enter_context(
+                patch("metadeploy.api.salesforce.OrgConfig")
+            )
+            OrgConfig.return_value.config = {"access_token": "abc"}
+
+            for _ in range(2):
+                refresh_access_token(
+                    scratch_org=MagicMock(),
+                    config={},
+                    org_name="current_org",
+                    org_id=self.org_id,
+                )
+
+            assert OrgConfig.return_value.refresh_oauth_token.call_count == 2
+
+    def test_timeout__expired(self):
+        issued_at = (time.time() - settings.ORG_TOKEN_LIFETIME) * 1000
+        assert _org_token_timeout({"issued_at": str(int(issued_at))}) <= 0
+
+
 @pytest.mark.django_db
 def test_delete_org(scratch_org_factory):
     scratch_org = scratch_org_factory(config={"org_id": "some-id"})
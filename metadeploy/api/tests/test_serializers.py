@@ -1,13 +1,16 @@
 from datetime import timedelta
+from unittest import mock
 from uuid import uuid4
 
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from config.settings.base import MINIMUM_JOBS_FOR_AVERAGE
 from metadeploy.conftest import format_timestamp
 
-from ..jobs import calculate_average_plan_runtime
+from ..jobs import finalize_result
 from ..models import SUPPORTED_ORG_TYPES, Job, PreflightResult, ScratchOrg
 from ..serializers import (
     JobSerializer,
@@ -48,6 +51,19 @@ class TestPlanSerializer:
         serializer = PlanSerializer(plan, context=context)
         assert serializer.data["scratch_org_duration"] == 10
 
+    def test_durations(self, rf, user_factory, plan_factory):
+        plan = plan_factory(
+            calculated_average_duration=60,
+            calculated_p90_duration=90,
+            calculated_step_durations={"1": 30},
+        )
+        request = rf.get("/")
+        request.user = user_factory()
+
+        data = PlanSerializer(plan, context={"request": request}).data
+        assert (data["average_duration"], data["p90_duration"]) == (60, 90)
+        assert data["step_durations"] == {"1": 30}
+
     def test_circumspect_description(
         self, rf, user_factory, plan_factory, allowed_list_factory, step_factory
     ):
@@ -65,6 +81,7 @@ class TestPlanSerializer:
         serializer = PlanSerializer(plan, context=context)
         assert serializer.data["preflight_message"] is None
         assert serializer.data["steps"] is None
+        assert serializer.data["step_durations"] is None
 
     def test_circumspect_product_description(
         self,
@@ -638,6 +655,53 @@ class TestJob:
         assert serializer.is_valid(), serializer.errors
         assert serializer.data["results"] == {}
 
+    def test_results__step_results(self, job_factory):
+        job = job_factory(
+            results={"a": [{"status": "hide"}]}, org_id="00Dxxxxxxxxxxxxxxx"
+        )
+        job.record_step_result("b", status="error", message="Oops")
+
+        assert JobSerializer(instance=job).data["results"] == {
+            "a": [{"status": "hide"}],
+            "b": [{"status": "error", "message": "Oops"}],
+        }
+
+    def test_create__constant_queries(
+        self, rf, user_factory, plan_factory, step_factory, preflight_result_factory
+    ):
+        user = user_factory()
+        request = rf.get("/")
+        request.user = user
+
+        def count_validation_queries(step_count):
+            plan = plan_factory()
+            steps = [step_factory(plan=plan) for _ in range(step_count)]
+            preflight_result_factory(
+                plan=plan,
+                user=user,
+                status=PreflightResult.Status.complete,
+                org_id=user.org_id,
+            )
+            data = {"plan": str(plan.id), "steps": [str(step.id) for step in steps]}
+            serializer = JobSerializer(data=data, context=dict(request=request))
+            with CaptureQueriesContext(connection) as queries:
+                assert serializer.is_valid(), serializer.errors
+            return len(queries)
+
+        assert count_validation_queries(1) == count_validation_queries(5)
+
+    def test_create_bad_step(self, rf, user_factory, plan_factory, step_factory):
+        plan = plan_factory()
+        user = user_factory()
+        step = step_factory(plan=plan)
+        request = rf.get("/")
+        request.user = user
+        data = {"plan": str(plan.id), "steps": [str(step.id), "nope"]}
+        serializer = JobSerializer(data=data, context=dict(request=request))
+
+        assert not serializer.is_valid()
+        assert "steps" in serializer.errors
+
 
 @pytest.mark.django_db
 class TestJobSummarySerializer:
@@ -666,8 +730,13 @@ class TestJobSummarySerializer:
 
         assert JobSummarySerializer(job).data["plan_average_duration"] is None
 
-        # run the cron job that sets this value
-        calculate_average_plan_runtime()
+        # finishing a job updates the plan's duration stats
+        finishing_job = job_factory(
+            plan=plan, enqueued_at=start, org_id="00Dxxxxxxxxxxxxxxx"
+        )
+        with mock.patch("metadeploy.api.jobs.timezone.now", return_value=end):
+            with finalize_result(finishing_job):
+                pass
         job.refresh_from_db()
 
         assert JobSummarySerializer(job).data["plan_average_duration"] == 30
@@ -189,6 +189,106 @@ class TestJobViewset:
         assert response.status_code == 204
         assert Job.objects.filter(id=job.id).exists()
 
+    def test_retry_job(
+        self, client, plan_factory, step_factory, job_factory, preflight_result_factory
+    ):
+        plan = plan_factory(preflight_checks=[{"when": "False", "action": "error"}])
+        done, failed = (
+            step_factory(plan=plan, step_num=str(i), is_required=True) for i in (1, 2)
+        )
+        job = job_factory(
+            user=client.user,
+            plan=plan,
+            steps=[done, failed],
+            org_id=client.user.org_id,
+            status=Job.Status.failed,
+            commit_sha="a" * 40,
+        )
+        job.record_step_result(str(done.id), status="ok")
+        job.record_step_result(str(failed.id), status="error")
+        # The preflight only matters for the remaining step:
+        preflight_result_factory(
+            plan=plan,
+            user=client.user,
+            status=PreflightResult.Status.complete,
+            org_id=client.user.org_id,
+            results={str(done.id): [{"status": "error", "message": "Installed"}]},
+        )
+
+        response = client.post(reverse("job-retry", kwargs={"pk": job.id}))
+
+        assert response.status_code == 201, response.json()
+        retry = Job.objects.get(id=response.json()["id"])
+        assert retry.retry_of == job
+        assert retry.commit_sha == "a" * 40
+        assert list(retry.steps.all()) == [failed]
+        assert retry.skip_steps() == ["1"]
+
+    def test_retry_job__not_failed(self, client, job_factory):
+        job = job_factory(user=client.user, org_id=client.user.org_id)
+
+        response = client.post(reverse("job-retry", kwargs={"pk": job.id}))
+
+        assert response.status_code == 409
+
+    def test_retry_job__preflight_error(
+        self, client, plan_factory, step_factory, job_factory, preflight_result_factory
+    ):
+        plan = plan_factory(preflight_checks=[{"when": "True", "action": "error"}])
+        step = step_factory(plan=plan)
+        job = job_factory(
+            user=client.user,
+            plan=plan,
+            steps=[step],
+            org_id=client.user.org_id,
+            status=Job.Status.failed,
+        )
+        preflight_result_factory(
+            plan=plan,
+            user=client.user,
+            status=PreflightResult.Status.complete,
+            org_id=client.user.org_id,
+            results={"plan": [{"status": "error", "message": "Nope"}]},
+        )
+
+        response = client.post(reverse("job-retry", kwargs={"pk": job.id}))
+
+        assert response.status_code == 400
+
+    def test_retry_job__bad_user(self, client, job_factory):
+        job = job_factory(
+            is_public=True, org_id="00Dxxxxxxxxxxxxxxx", status=Job.Status.failed
+        )
+
+        response = client.post(reverse("job-retry", kwargs={"pk": job.id}))
+
+        assert response.status_code == 403
+
+    def test_retry_job__other_users_public_job(
+        self, client, admin_api_client, user_factory, job_factory
+    ):
+        job = job_factory(
+            user=user_factory(),
+            org_id=client.user.org_id,
+            is_public=True,
+            status=Job.Status.failed,
+        )
+
+        for api_client in (client, admin_api_client):
+            response = api_client.post(reverse("job-retry", kwargs={"pk": job.id}))
+
+            assert response.status_code == 403
+        assert not Job.objects.filter(retry_of=job).exists()
+
+    def test_retry_job__other_org(self, client, job_factory):
+        job = job_factory(
+            user=client.user, org_id="00Dxxxxxxxxxxxxxxx", status=Job.Status.failed
+        )
+
+        response = client.post(reverse("job-retry", kwargs={"pk": job.id}))
+
+        assert response.status_code == 403
+
     def test_destroy_job__bad_user(self, client, job_factory):
         job = job_factory(is_public=True, org_id="00Dxxxxxxxxxxxxxxx")
         response = client.delete(reverse("job-detail", kwargs={"pk": job.id}))
@@ -154,6 +154,40 @@ class JobViewSet(
     def perform_destroy(self, instance):
         cache.set(REDIS_JOB_CANCEL_KEY.format(id=instance.id), True)
 
+    @action(detail=True, methods=["post"])
+    def retry(self, request, pk=None):
+        """
+        Start a new job that reruns a failed job from its failed step: from the
+        same commit, running only the selected steps that didn't complete.
+        """
+        job = self.get_object()
+        # A retry runs against the org the job ran in, so only whoever ran
+        # it there may retry it, even if the job is public:
+        user = request.user
+        is_owner = (
+            user.is_authenticated and job.user == user and job.org_id == user.org_id
+        )
+        scratch_org = ScratchOrg.objects.get_from_session(request.session)
+        if not (is_owner or scratch_org and scratch_org.org_id == job.org_id):
+            return Response("", status=status.HTTP_403_FORBIDDEN)
+        if job.status != Job.Status.failed:
+            return Response(
+                {"detail": "Only failed jobs can be retried."},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        context = {**self.get_serializer_context(), "retry_of": job}
+        data = {
+            "plan": str(job.plan.id),
+            "steps": [str(step.id) for step in job.remaining_steps()],
+            "is_public": job.is_public,
+        }
+        serializer = self.get_serializer(data=data, context=context)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        serializer.save(retry_of=job, commit_sha=job.commit_sha)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
 
 class ProductCategoryViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = ProductCategorySerializer
@@ -6,6 +6,7 @@ import pytest
 from allauth.socialaccount.models import SocialAccount, SocialApp, SocialToken
 from django.contrib.auth import get_user_model
 from django.contrib.sites.models import Site
+from django.core.cache import cache
 from pytest_factoryboy import register
 from rest_framework.test import APIClient
 from rest_framework.authtoken.models import Token
@@ -14,6 +15,7 @@ from sfdo_template_helpers.crypto import fernet_encrypt
 from metadeploy.api.models import (
     AllowedList,
     AllowedListOrg,
+    ClickThroughAgreement,
     Job,
     Plan,
     PlanSlug,
@@ -27,6 +29,7 @@ from metadeploy.api.models import (
     Step,
     Version,
 )
+from metadeploy.api.salesforce import ORG_TOKEN_CACHE_KEY
 
 User = get_user_model()
 
@@ -295,6 +298,19 @@ def anon_client():
     return APIClient()
 
 
+@pytest.fixture(autouse=True)
+def clear_agreement_cache():
+    # Cached agreement ids would otherwise outlive each test's rolled-back rows:
+    yield
+    ClickThroughAgreement.clear_cache()
+
+
+@pytest.fixture(autouse=True)
+def clear_org_token_cache():
+    yield
+    cache.delete_pattern(ORG_TOKEN_CACHE_KEY.format(org_id="*"))
+
+
 @register
 class TokenFactory(factory.django.DjangoModelFactory):
     class Meta:
@@ -14,6 +14,7 @@ from django.utils.translation.trans_real import (
     parse_accept_lang_header,
 )
 
+from . import instrumentation, tracing
 from .api.constants import CHANNELS_GROUP_NAME
 from .api.hash_url import convert_org_id_to_key
 from .api.models import ScratchOrg
@@ -81,17 +82,38 @@ class PushNotificationConsumer(AsyncJsonWebsocketConsumer):
             await self.send_json(message)
             return
 
+    def reset_user_cache(self):
+        """
+        The scope's user lives as long as the connection, so drop anything it has
+        memoized before handling each message.
+        """
+        user = self.scope.get("user")
+        if user is not None and user.is_authenticated:
+            user.clear_cached_org_data()
+
     @sync_to_async
     def serialize_instance_as_message(self, event):
-        instance = self.get_instance(**event["instance"])
-        with translation.override(self.lang):
-            SerializerClass = self.get_serializer(event["serializer"])
-            context = user_context(self.scope["user"], self.scope["session"])
-            data = SerializerClass(instance=instance, context=context).data
-            return {
-                "payload": data,
-                "type": event["inner_type"],
-            }
+        with instrumentation.collect() as stats, tracing.span(
+            f"websocket {event['inner_type']}", context=event.get("trace")
+        ):
+            self.reset_user_cache()
+            instance = self.get_instance(**event["instance"])
+            with translation.override(self.lang):
+                SerializerClass = self.get_serializer(event["serializer"])
+                context = user_context(self.scope["user"], self.scope["session"])
+                data = SerializerClass(instance=instance, context=context).data
+        if stats is not None:
+            instrumentation.log(
+                f"Sent {event['inner_type']}",
+                stats,
+                event="websocket_message",
+                type=event["inner_type"],
+                model=event["instance"]["model"],
+            )
+        return {
+            "payload": data,
+            "type": event["inner_type"],
+        }
 
     def get_instance(self, *, model, id):
         Model = apps.get_model("api", model)
@@ -145,6 +167,21 @@ class PushNotificationConsumer(AsyncJsonWebsocketConsumer):
 
     @sync_to_async
     def has_good_permissions(self, content):
+        with instrumentation.collect() as stats:
+            allowed = self.check_permissions(content)
+        if stats is not None:
+            instrumentation.log(
+                f"Subscription to {content['model']}",
+                stats,
+                event="websocket_message",
+                type="subscribe",
+                model=content["model"],
+                allowed=allowed,
+            )
+        return allowed
+
+    def check_permissions(self, content):
+        self.reset_user_cache()
         if content["model"] == "org":
             return self.handle_org_special_case(content)
         possible_exceptions = (
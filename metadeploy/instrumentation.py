@@ -0,0 +1,205 @@
+"""
+Per-request, per-message and per-job performance counters.
+
+While a unit of work (an HTTP request, a websocket message, an RQ job) is
+instrumented, its database queries and their time, cache hits and misses,
+Redis round-trips and time spent in serializers are counted, and logged in
+logfmt with the line describing that work. Only a sample of the work
+(INSTRUMENTATION_SAMPLE_RATE) is instrumented, to keep the overhead low.
+
+The Redis and cache counts rely on the client classes below being configured
+for the default cache (REDIS_CLIENT_CLASS and CLIENT_CLASS).
+"""
+import logging
+import random
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django_redis.client import DefaultClient
+from redis import Redis
+from redis.client import Pipeline
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar("instrumentation", default=None)
+_MISSING = object()
+
+
+def to_ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+class Stats:
+    """The counters for one unit of work."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished = None
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.redis_calls = 0
+        self.serializer_time = 0.0
+        self.serializing = False
+
+    @property
+    def duration(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    def record_query(self, execute, sql, params, many, context):
+        """A database execute_wrapper that counts and times each query."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_queries += 1
+            self.db_time += time.perf_counter() - started
+
+    def as_context(self):
+        """The counters, as logging context."""
+        return {
+            "db_queries": self.db_queries,
+            "db_ms": to_ms(self.db_time),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "redis_calls": self.redis_calls,
+            "serializer_ms": to_ms(self.serializer_time),
+            "total_ms": to_ms(self.duration),
+        }
+
+    def server_timing(self):
+        """The counters, as a Server-Timing header value."""
+        return ", ".join(
+            [
+                f'db;dur={to_ms(self.db_time)};desc="{self.db_queries} queries"',
+                f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+                f'redis;desc="{self.redis_calls} round-trips"',
+                f"serializer;dur={to_ms(self.serializer_time)}",
+                f"total;dur={to_ms(self.duration)}",
+            ]
+        )
+
+
+def current():
+    """The Stats for the work in progress, or None if it isn't instrumented."""
+    return _current.get()
+
+
+def start(*, force=False):
+    """
+    Start instrumenting the work about to be done in this thread, if it is
+    sampled (or force is set). Returns its Stats, or None.
+    """
+    if not force and random.random() >= settings.INSTRUMENTATION_SAMPLE_RATE:
+        return None
+    stats = Stats()
+    stats._previous = _current.get()
+    stats._wrappers = ExitStack()
+    for connection in connections.all():
+        stats._wrappers.enter_context(connection.execute_wrapper(stats.record_query))
+    _current.set(stats)
+    return stats
+
+
+def stop(stats):
+    """Stop instrumenting the work that stats counts."""
+    stats.finished = time.perf_counter()
+    stats._wrappers.close()
+    _current.set(stats._previous)
+
+
+@contextmanager
+def collect(*, force=False):
+    """Instrument the block, if it is sampled. Yields its Stats, or None."""
+    stats = start(force=force)
+    try:
+        yield stats
+    finally:
+        if stats is not None:
+            stop(stats)
+
+
+def log(message, stats, **context):
+    """Log the counters for a unit of work, with context describing it."""
+    logger.info(message, extra={"context": {**context, **stats.as_context()}})
+
+
+class SerializerTimingMixin:
+    """
+    Mixin for serializers to add the time they spend representing instances to
+    the instrumented work. Nested serializers are only counted once.
+    """
+
+    def to_representation(self, instance):
+        stats = _current.get()
+        if stats is None or stats.serializing:
+            return super().to_representation(instance)
+        stats.serializing = True
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            stats.serializer_time += time.perf_counter() - started
+            stats.serializing = False
+
+
+class InstrumentedCacheClient(DefaultClient):
+    """django-redis client that counts cache hits and misses."""
+
+    def get(self, key, default=None, version=None, client=None):
+        value = super().get(key, default=_MISSING, version=version, client=client)
+        stats = _current.get()
+        if stats is not None:
+            if value is _MISSING:
+                stats.cache_misses += 1
+            else:
+                stats.cache_hits += 1
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None, client=None):
+        keys = list(keys)
+        found = super().get_many(keys, version=version, client=client)
+        stats = _current.get()
+        if stats is not None:
+            stats.cache_hits += len(found)
+            stats.cache_misses += len(keys) - len(found)
+        return found
+
+
+def count_redis_call():
+    stats = _current.get()
+    if stats is not None:
+        stats.redis_calls += 1
+
+
+class InstrumentedPipeline(Pipeline):
+    """Redis pipeline that counts each execution as one round-trip."""
+
+    def immediate_execute_command(self, *args, **options):
+        count_redis_call()
+        return super().immediate_execute_command(*args, **options)
+
+    def execute(self, raise_on_error=True):
+        if self.command_stack:
+            count_redis_call()
+        return super().execute(raise_on_error=raise_on_error)
+
+
+class InstrumentedRedis(Redis):
+    """
+    Redis client that counts round-trips to the server. It is used by the
+    cache and by RQ, which shares the cache's connection.
+    """
+
+    def execute_command(self, *args, **options):
+        count_redis_call()
+        return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
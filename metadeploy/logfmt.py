@@ -97,6 +97,11 @@ class LogfmtFormatter(ServerFormatter):
             fields.append(f"event={quote_logvalue(context['event'])}")
         fields += [
             f"request_id={id_}",
+        ]
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            fields.append(f"trace_id={trace_id}")
+        fields += [
             f"at={record.levelname}",
             f"time={time}",
             f"module={record.module}",
@@ -10,10 +10,13 @@ from log_request_id import (
 from log_request_id.middleware import RequestIDMiddleware
 from sfdo_template_helpers.addresses import get_remote_ip
 
+from . import instrumentation, tracing
 from .logfmt import quote_logvalue
 
 logger = logging.getLogger(__name__)
 
+INSTRUMENTATION_REQUEST_HEADER = "HTTP_X_INSTRUMENTATION"
+
 
 class LoggingMiddleware(RequestIDMiddleware):
     def process_request(self, request):
@@ -21,6 +24,17 @@ class LoggingMiddleware(RequestIDMiddleware):
         request_id = self._get_request_id(request)
         local.request_id = request_id
         request.id = request_id
+        # Clients can ask for the breakdown of a request with this header:
+        request.instrumentation = instrumentation.start(
+            force=INSTRUMENTATION_REQUEST_HEADER in request.META
+        )
+        # Whatever the request sets off is traced under its request id, even if
+        # an earlier request on this thread left its span unfinished:
+        tracing.reset()
+        request.trace_span = tracing.start_span(
+            f"{request.method} {request.path}",
+            trace_id=tracing.trace_id_for(request_id),
+        )
 
     def process_response(self, request, response):
         """
@@ -33,6 +47,23 @@ class LoggingMiddleware(RequestIDMiddleware):
         ):
             response[getattr(settings, REQUEST_ID_RESPONSE_HEADER_SETTING)] = request.id
 
+        stats = getattr(request, "instrumentation", None)
+        if stats is not None:
+            instrumentation.stop(stats)
+            if INSTRUMENTATION_REQUEST_HEADER in request.META and (
+                settings.DEBUG
+                or getattr(request, "user", None)
+                and request.user.is_staff
+            ):
+                response["Server-Timing"] = stats.server_timing()
+
+        span = getattr(request, "trace_span", None)
+        if span is not None:
+            span.attributes["status"] = response.status_code
+            if response.status_code >= 500:
+                span.error = f"HTTP {response.status_code}"
+            tracing.end_span(span)
+
         if not getattr(settings, LOG_REQUESTS_SETTING, False):  # pragma: nocover
             return response
 
@@ -65,7 +96,8 @@ class LoggingMiddleware(RequestIDMiddleware):
 
         args = [quote_logvalue(v) for v in args]
 
-        logger.info(message, *args)
+        context = stats.as_context() if stats is not None else {}
+        logger.info(message, *args, extra={"context": context})
 
         try:
             del local.request_id
@@ -0,0 +1,35 @@
+import importlib
+
+from django.conf import settings
+from django.db import connections
+from django_rq.workers import get_worker_class
+
+from ...rq_worker import PreloadingWorkerMixin
+
+# django-rq's module name isn't a valid identifier:
+rqworker_pool = importlib.import_module("django_rq.management.commands.rqworker-pool")
+
+
+class Command(rqworker_pool.Command):
+    """Run several rq workers on one dyno, so that the Salesforce waits of
+    concurrent jobs overlap.
+
+    Extends django-rq's rqworker-pool command. Each worker is its own process
+    (and each job its own workhorse), so sys.path changes and log capture stay
+    per job. The pool size defaults to RQ_WORKER_CONCURRENCY.
+    """
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.set_defaults(num_workers=settings.RQ_WORKER_CONCURRENCY)
+
+    def handle(self, *args, **options):
+        worker_class = get_worker_class(options.get("worker_class"))
+        if issubclass(worker_class, PreloadingWorkerMixin):
+            # Warm the pool parent too, so every worker process forked from it
+            # starts warm. Its connections must not be shared with them.
+            from ...api.jobs import preload_job_modules
+
+            preload_job_modules()
+            connections.close_all()
+        super().handle(*args, **options)
@@ -0,0 +1,55 @@
+import time
+from unittest import mock
+
+import django_rq
+from django.core.management import call_command
+
+
+def record_span(seconds):
+    """Pool test job: report when it ran."""
+    started_at = time.time()
+    time.sleep(seconds)
+    return started_at, time.time()
+
+
+@mock.patch("django_rq.management.commands.rqworker-pool.WorkerPool")
+class TestMetaDeployRQWorkerPoolCommand:
+    def test_command__defaults(self, WorkerPool, settings):
+        settings.RQ_WORKER_CONCURRENCY = 3
+
+        call_command("metadeploy_rqworker_pool", "default")
+
+        assert WorkerPool.call_args.kwargs["num_workers"] == 3
+        WorkerPool.return_value.start.assert_called()
+
+    @mock.patch("metadeploy.api.jobs.preload_job_modules")
+    @mock.patch("django.db.connections.close_all")
+    def test_command__preloads(
+        self, close_all, preload_job_modules, WorkerPool, settings
+    ):
+        call_command(
+            "metadeploy_rqworker_pool",
+            "default",
+            "--num-workers=2",
+            "--worker-class=metadeploy.rq_worker.PreloadingWorker",
+        )
+
+        assert preload_job_modules.called
+        assert close_all.called
+        assert WorkerPool.call_args.kwargs["num_workers"] == 2
+
+
+def test_command__jobs_overlap():
+    queue = django_rq.get_queue("short")
+    queue.empty()
+    jobs = [queue.enqueue(record_span, 1) for _ in range(2)]
+
+    call_command("metadeploy_rqworker_pool", "short", "--num-workers=2", "--burst")
+
+    spans = []
+    for job in jobs:
+        job.refresh()
+        assert job.is_finished
+        spans.append(job.return_value())
+    (first_start, first_end), (second_start, second_end) = sorted(spans)
+    assert second_start < first_end
@@ -1,5 +1,14 @@
+import contextlib
+import logging
+import time
+
 from django.db import DatabaseError, InterfaceError, connections
-from rq.worker import HerokuWorker, Worker
+from rq.utils import utcnow
+from rq.worker import HerokuWorker, SimpleWorker, Worker
+
+from . import instrumentation, tracing
+
+logger = logging.getLogger(__name__)
 
 
 class ConnectionClosingWorkerMixin:
@@ -28,11 +37,53 @@ class ConnectionClosingWorkerMixin:
         return super().work(*args, **kwargs)
 
 
-class ConnectionClosingWorker(ConnectionClosingWorkerMixin, Worker):
+class InstrumentedWorkerMixin:
+    """Mixin for rq workers to log the query, cache and Redis counts of a sample
+    of their jobs."""
+
+    def perform_job(self, job, queue, *args, **kwargs):
+        try:
+            with instrumentation.collect() as stats, self.trace(job, queue) as span:
+                try:
+                    succeeded = super().perform_job(job, queue, *args, **kwargs)
+                    if span is not None and not succeeded:
+                        span.error = "Job failed"
+                    return succeeded
+                finally:
+                    if stats is not None:
+                        instrumentation.log(
+                            f"Performed {job.func_name}",
+                            stats,
+                            event="rq_job",
+                            job_id=job.id,
+                            queue=queue.name,
+                            func=job.func_name,
+                        )
+        finally:
+            # The work horse exits as soon as the job is done:
+            tracing.flush()
+
+    def trace(self, job, queue):
+        """Trace the job as a span of the trace that enqueued it."""
+        if not tracing.enabled():
+            return contextlib.nullcontext()
+        return tracing.span(
+            f"rq {job.func_name}",
+            context=job.meta.get("trace"),
+            job_id=job.id,
+            queue=queue.name,
+        )
+
+
+class ConnectionClosingWorker(
+    InstrumentedWorkerMixin, ConnectionClosingWorkerMixin, Worker
+):
     """Connection-closing worker for non-Heroku environments"""
 
 
-class ConnectionClosingHerokuWorker(ConnectionClosingWorkerMixin, HerokuWorker):
+class ConnectionClosingHerokuWorker(
+    InstrumentedWorkerMixin, ConnectionClosingWorkerMixin, HerokuWorker
+):
     """Connection-closing worker for Heroku
 
     The HerokuWorker prevents child workhorse processes from handling the
@@ -42,3 +93,99 @@ class ConnectionClosingHerokuWorker(ConnectionClosingWorkerMixin, HerokuWorker):
 
     SIGRTMIN is undefined on macOS, so we can't use this worker everywhere.
     """
+
+
+class PersistentConnectionWorkerMixin:
+    """Mixin for in-process rq workers to keep db connections open across jobs.
+
+    Each job is treated like a request: before and after it, any connection
+    that is broken or older than CONN_MAX_AGE is closed, and CONN_HEALTH_CHECKS
+    checks the rest on first use, reconnecting if the server has dropped them.
+
+    This is only safe when jobs run in the worker process itself. A forked
+    workhorse would share the parent's connection socket.
+    """
+
+    def close_unusable_connections(self):
+        for connection in connections.all(initialized_only=True):
+            connection.close_if_unusable_or_obsolete()
+
+    def perform_job(self, *args, **kwargs):
+        self.close_unusable_connections()
+        try:
+            return super().perform_job(*args, **kwargs)
+        finally:
+            self.close_unusable_connections()
+
+
+class PersistentConnectionWorker(
+    InstrumentedWorkerMixin, PersistentConnectionWorkerMixin, SimpleWorker
+):
+    """Non-forking worker that reuses its db connections between jobs
+
+    Meant for the short queue, whose jobs are quick cron tasks: the time saved
+    by not reconnecting to Postgres for each one outweighs the loss of fork
+    isolation. Set DATABASE_CONN_MAX_AGE for the worker to enable reuse.
+    """
+
+
+class PreloadingWorkerMixin:
+    """Mixin for forking rq workers to warm the parent before it forks.
+
+    The parent imports CumulusCI and the task classes that plan steps use, and
+    loads the universal config, once at startup. Each workhorse is forked from
+    that process and starts with them already in memory. Every job logs how long
+    it waited between being enqueued and starting to run.
+    """
+
+    def preload(self):
+        from .api.jobs import preload_job_modules
+
+        start = time.monotonic()
+        count = preload_job_modules()
+        logger.info(
+            f"Preloaded {count} task classes",
+            extra={
+                "context": {
+                    "event": "rq_worker_preloaded",
+                    "task_classes": count,
+                    "duration_ms": round((time.monotonic() - start) * 1000),
+                }
+            },
+        )
+
+    def work(self, *args, **kwargs):
+        self.preload()
+        return super().work(*args, **kwargs)
+
+    def perform_job(self, job, queue, *args, **kwargs):
+        if job.enqueued_at:
+            latency = utcnow() - job.enqueued_at
+            logger.info(
+                f"Starting {job.func_name}",
+                extra={
+                    "context": {
+                        "event": "rq_job_started",
+                        "job_id": job.id,
+                        "queue": queue.name,
+                        "func": job.func_name,
+                        "start_latency_ms": round(latency.total_seconds() * 1000),
+                    }
+                },
+            )
+        return super().perform_job(job, queue, *args, **kwargs)
+
+
+class PreloadingWorker(
+    InstrumentedWorkerMixin, PreloadingWorkerMixin, ConnectionClosingWorkerMixin, Worker
+):
+    """Preloading, connection-closing worker for non-Heroku environments"""
+
+
+class PreloadingHerokuWorker(
+    InstrumentedWorkerMixin,
+    PreloadingWorkerMixin,
+    ConnectionClosingWorkerMixin,
+    HerokuWorker,
+):
+    """Preloading, connection-closing worker for Heroku"""
@@ -13,7 +13,7 @@ from ..api.push import (
     notify_org_result_changed,
     notify_post_job,
     preflight_completed,
-    user_token_expired,
+    user_tokens_expired,
 )
 from ..api.serializers import JobSerializer, OrgSerializer, PreflightResultSerializer
 from ..consumers import PushNotificationConsumer, get_language_from_scope, user_context
@@ -160,7 +160,7 @@ async def test_push_notification_consumer__scratch_org_job_started(
 
 @pytest.mark.django_db
 @pytest.mark.asyncio
-async def test_push_notification_consumer__user_token_invalid(user_factory):
+async def test_push_notification_consumer__user_tokens_invalid(user_factory):
     user = await generate_model(user_factory)
 
     communicator = WebsocketCommunicator(
@@ -175,7 +175,7 @@ async def test_push_notification_consumer__user_token_invalid(user_factory):
     response = await communicator.receive_json_from()
     assert "ok" in response
 
-    await user_token_expired(user)
+    await user_tokens_expired([str(user.id)])
     response = await communicator.receive_json_from()
     assert response == {"type": "USER_TOKEN_INVALID"}
 
@@ -0,0 +1,109 @@
+import logging
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from rest_framework import serializers
+
+from .. import instrumentation
+
+User = get_user_model()
+
+
+class TimedUserSerializer(
+    instrumentation.SerializerTimingMixin, serializers.ModelSerializer
+):
+    class Meta:
+        model = User
+        fields = ("id", "username")
+
+
+class TestCollect:
+    def test_not_sampled(self, settings):
+        settings.INSTRUMENTATION_SAMPLE_RATE = 0
+        with instrumentation.collect() as stats:
+            assert stats is None
+            assert instrumentation.current() is None
+
+    def test_forced(self, settings):
+        settings.INSTRUMENTATION_SAMPLE_RATE = 0
+        with instrumentation.collect(force=True) as stats:
+            assert instrumentation.current() is stats
+        assert instrumentation.current() is None
+        assert stats.duration >= 0
+
+    @pytest.mark.django_db
+    def test_counts_queries(self, user_factory):
+        user_factory()
+        with instrumentation.collect(force=True) as stats:
+            list(User.objects.all())
+            User.objects.count()
+
+        assert stats.db_queries == 2
+        assert stats.as_context()["db_ms"] >= 0
+
+    def test_counts_cache(self):
+        cache.set("instrumentation-test", "value")
+        with instrumentation.collect(force=True) as stats:
+            cache.get("instrumentation-test")
+            cache.get("instrumentation-test-missing")
+            cache.get_many(["instrumentation-test", "instrumentation-test-missing"])
+        cache.delete("instrumentation-test")
+
+        assert (stats.cache_hits, stats.cache_misses) == (2, 2)
+
+    def test_counts_redis_round_trips(self):
+        connection = get_redis_connection("default")
+        with instrumentation.collect(force=True) as stats:
+            connection.get("instrumentation-test")
+            with connection.pipeline() as pipeline:
+                pipeline.get("instrumentation-test")
+                pipeline.get("instrumentation-test")
+                pipeline.execute()
+
+        assert stats.redis_calls == 2
+
+    @pytest.mark.django_db
+    def test_times_serializers(self, user_factory):
+        users = [user_factory(), user_factory()]
+        with instrumentation.collect(force=True) as stats:
+            TimedUserSerializer(users, many=True).data
+
+        assert stats.serializer_time > 0
+
+    def test_log(self, caplog):
+        caplog.set_level(logging.INFO)
+        with instrumentation.collect(force=True) as stats:
+            pass
+        instrumentation.log("Done", stats, event="test")
+
+        assert caplog.records[-1].context["event"] == "test"
+        assert caplog.records[-1].context["db_queries"] == 0
+
+    def test_server_timing(self):
+        with instrumentation.collect(force=True) as stats:
+            pass
+
+        assert stats.server_timing().startswith('db;dur=0.0;desc="0 queries", ')
+
+
+@pytest.mark.django_db
+class TestLoggingMiddleware:
+    def test_server_timing(self, client, settings):
+        settings.DEBUG = True
+        response = client.get("/api/products/", HTTP_X_INSTRUMENTATION="1")
+
+        assert "db;dur=" in response["Server-Timing"]
+
+    def test_server_timing__not_staff(self, client):
+        response = client.get("/api/products/", HTTP_X_INSTRUMENTATION="1")
+
+        assert "Server-Timing" not in response
+
+    def test_logged(self, client, mocker, settings):
+        settings.INSTRUMENTATION_SAMPLE_RATE = 1
+        logger = mocker.patch("metadeploy.logging_middleware.logger")
+        client.get("/api/products/")
+
+        assert "db_queries" in logger.info.call_args.kwargs["extra"]["context"]
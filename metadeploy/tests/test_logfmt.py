@@ -41,6 +41,16 @@ def test_formatter__job_id():
     assert "id=321" in result
 
 
+def test_formatter__trace_id():
+    record = logging.LogRecord(
+        "name", logging.INFO, "module", 1, "Some message", (), None
+    )
+    record.request_id = 123
+    record.trace_id = "abc"
+    result = LogfmtFormatter().format(record)
+    assert "request_id=123 trace_id=abc at=INFO" in result
+
+
 def test_formatter_format():
     record = logging.LogRecord(
         "name", logging.INFO, "module", 1, "Some message", (), None
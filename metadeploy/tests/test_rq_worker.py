@@ -1,8 +1,12 @@
+from datetime import timedelta
 from unittest.mock import MagicMock
 
 import pytest
 from django.db import DatabaseError, InterfaceError
 from django_rq import get_worker
+from rq.utils import utcnow
+
+from ..rq_worker import PersistentConnectionWorker, PreloadingWorker
 
 
 class TestConnectionClosingWorker:
@@ -68,3 +72,66 @@ class TestConnectionClosingWorker:
         worker.work(burst=True)
 
         assert close_database.called
+
+
+class TestPersistentConnectionWorker:
+    def test_perform_job(self, mocker):
+        conn = MagicMock()
+        all_ = mocker.patch("django.db.connections.all")
+        all_.return_value = [conn]
+        perform_job = mocker.patch("rq.worker.Worker.perform_job")
+
+        worker = get_worker("short", worker_class=PersistentConnectionWorker)
+        # Symbolic call only, since we've mocked out the super:
+        worker.perform_job(None, None)
+
+        all_.assert_called_with(initialized_only=True)
+        assert conn.close_if_unusable_or_obsolete.call_count == 2
+        assert not conn.close.called
+        assert perform_job.called
+
+    def test_perform_job__error(self, mocker):
+        conn = MagicMock()
+        mocker.patch("django.db.connections.all").return_value = [conn]
+        mocker.patch("rq.worker.Worker.perform_job", side_effect=DatabaseError())
+
+        worker = get_worker("short", worker_class=PersistentConnectionWorker)
+        with pytest.raises(DatabaseError):
+            worker.perform_job(None, None)
+
+        assert conn.close_if_unusable_or_obsolete.call_count == 2
+
+
+class TestPreloadingWorker:
+    def test_work(self, mocker):
+        preload_job_modules = mocker.patch(
+            "metadeploy.api.jobs.preload_job_modules", return_value=3
+        )
+        close_database = mocker.patch(
+            "metadeploy.rq_worker.ConnectionClosingWorkerMixin.close_database"
+        )
+
+        worker = get_worker(worker_class=PreloadingWorker)
+        worker.work(burst=True)
+
+        assert preload_job_modules.called
+        assert close_database.called
+
+    def test_perform_job__logs_latency(self, mocker, caplog):
+        caplog.set_level("INFO")
+        mocker.patch("metadeploy.rq_worker.ConnectionClosingWorkerMixin.close_database")
+        perform_job = mocker.patch("rq.worker.Worker.perform_job")
+        job = MagicMock(
+            id="abc", func_name="metadeploy.api.jobs.run_flows", enqueued_at=utcnow()
+        )
+        job.enqueued_at -= timedelta(seconds=2)
+        queue = MagicMock()
+        queue.name = "default"
+
+        worker = get_worker(worker_class=PreloadingWorker)
+        worker.perform_job(job, queue)
+
+        assert perform_job.called
+        (record,) = [r for r in caplog.records if r.name == "metadeploy.rq_worker"]
+        assert record.context["event"] == "rq_job_started"
+        assert record.context["start_latency_ms"] >= 2000
@@ -0,0 +1,155 @@
+import json
+import logging
+import threading
+
+import pytest
+from django_rq import get_queue
+
+from .. import tracing
+
+
+@pytest.fixture
+def traces(settings, tmp_path):
+    settings.TRACING_EXPORTER = "json"
+    settings.TRACING_JSON_PATH = str(tmp_path / "traces.jsonl")
+
+    def read():
+        with open(settings.TRACING_JSON_PATH) as f:
+            return [json.loads(line) for line in f]
+
+    return read
+
+
+def test_trace_id_for():
+    request_id = "0F8FAD5B-D9CB-469F-A165-70867728950E"
+    assert tracing.trace_id_for(request_id) == "0f8fad5bd9cb469fa16570867728950e"
+    assert len(tracing.trace_id_for("not-a-uuid")) == 32
+
+
+def test_span__off(settings):
+    settings.TRACING_EXPORTER = ""
+    with tracing.span("outer") as span:
+        assert span is None
+        assert tracing.inject() == {}
+
+
+class TestSpan:
+    def test_exports_when_outermost_ends(self, traces):
+        with tracing.span("outer", trace_id="a" * 32, plan="my-plan") as outer:
+            with tracing.span("inner"):
+                pass
+
+        inner_dict, outer_dict = traces()
+        assert outer_dict["trace_id"] == inner_dict["trace_id"] == "a" * 32
+        assert outer_dict["parent_id"] is None
+        assert inner_dict["parent_id"] == outer.span_id
+        assert outer_dict["attributes"] == {"plan": "my-plan"}
+        assert tracing.current_trace_id() == ""
+
+    def test_records_error(self, traces):
+        with pytest.raises(ValueError):
+            with tracing.span("outer"):
+                raise ValueError("Oops")
+
+        assert traces()[0]["error"] == "ValueError: Oops"
+
+    def test_continues_context(self, traces):
+        with tracing.span("enqueue") as sender:
+            context = tracing.inject()
+
+        with tracing.span("cron"):
+            with tracing.span("worker", context=context):
+                pass
+
+        spans = {span["name"]: span for span in traces()}
+        assert spans["worker"]["trace_id"] == sender.trace_id
+        assert spans["worker"]["parent_id"] == sender.span_id
+        assert spans["cron"]["trace_id"] != sender.trace_id
+
+    def test_otlp(self, settings, mocker):
+        settings.TRACING_EXPORTER = "otlp"
+        post = mocker.patch("requests.post")
+        with tracing.span("outer"):
+            pass
+        tracing.flush()
+
+        assert post.call_args.kwargs["timeout"] == tracing.OTLP_TIMEOUT
+        body = post.call_args.kwargs["json"]
+        (span,) = body["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        assert span["name"] == "outer"
+        assert span["status"] == {"code": 1}
+
+    def test_otlp__full(self, settings, mocker, caplog):
+        settings.TRACING_EXPORTER = "otlp"
+        mocker.patch("metadeploy.tracing.OTLP_QUEUE_SIZE", 1)
+        mocker.patch("metadeploy.tracing._exporter", None)
+        # The exporter is stuck on the first trace, so the third doesn't fit:
+        posted = threading.Event()
+        release = threading.Event()
+
+        def post_otlp(spans):
+            posted.set()
+            release.wait(5)
+
+        mocker.patch("metadeploy.tracing.post_otlp", side_effect=post_otlp)
+        with tracing.span("first"):
+            pass
+        posted.wait(5)
+        for name in ("second", "third"):
+            with tracing.span(name):
+                pass
+        release.set()
+        tracing.flush()
+
+        assert caplog.records[-1].getMessage() == (
+            "Dropped spans: too many waiting to be exported"
+        )
+
+    def test_export_failure(self, settings, caplog):
+        settings.TRACING_EXPORTER = "json"
+        settings.TRACING_JSON_PATH = "/nonexistent/traces.jsonl"
+        with tracing.span("outer"):
+            pass
+
+        assert caplog.records[-1].getMessage() == "Could not export spans"
+
+
+def test_trace_id_filter(traces):
+    record = logging.LogRecord("name", logging.INFO, "module", 1, "msg", (), None)
+    with tracing.span("outer", trace_id="b" * 32):
+        tracing.TraceIDFilter().filter(record)
+
+    assert record.trace_id == "b" * 32
+
+
+def test_tracing_queue(traces):
+    queue = get_queue("short")
+    assert isinstance(queue, tracing.TracingQueue)
+    with tracing.span("outer") as span:
+        rq_job = queue.create_job(print, meta={"key": "value"})
+
+    assert rq_job.meta == {
+        "key": "value",
+        "trace": {"trace_id": span.trace_id, "span_id": span.span_id},
+    }
+
+
+@pytest.mark.django_db
+def test_logging_middleware(client, traces):
+    client.get("/api/products/", HTTP_X_REQUEST_ID="c" * 32)
+
+    (span,) = traces()
+    assert span["trace_id"] == "c" * 32
+    assert span["name"] == "GET /api/products/"
+    assert span["attributes"] == {"status": 200}
+
+
+@pytest.mark.django_db
+def test_logging_middleware__stale_span(client, traces):
+    tracing.start_span("never ended")
+    client.get("/api/products/", HTTP_X_REQUEST_ID="d" * 32)
+
+    (span,) = traces()
+    assert span["trace_id"] == "d" * 32
+    assert span["parent_id"] is None
+    assert tracing.current_trace_id() == ""
@@ -0,0 +1,293 @@
+"""
+Tracing of jobs, preflights and scratch orgs from end to end.
+
+A trace starts with the HTTP request (its trace id is the request id), and
+follows the work it sets off: the trace context rides along in each RQ job's
+meta, on Job rows for the enqueuer to pick up, and in websocket notifications
+for the consumer that serializes them. Each phase is a span.
+
+Tracing is off unless TRACING_EXPORTER is set, to "json" to append finished
+spans to TRACING_JSON_PATH, one per line, or to "otlp" to post them to an
+OpenTelemetry collector's OTLP/HTTP endpoint, TRACING_OTLP_ENDPOINT. The spans
+of each process's part of a trace are exported together when it finishes; OTLP
+posts are made from a background thread, so a slow collector doesn't hold up
+responses, and are dropped if too many are waiting.
+"""
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import requests
+from django.conf import settings
+from django_rq.queues import DjangoRQ
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar("span", default=None)
+TRACE_ID_RE = re.compile(r"[0-9a-f]{32}")
+# How many traces may wait for the OTLP exporter, and how long each post may take:
+OTLP_QUEUE_SIZE = 1000
+OTLP_TIMEOUT = 2
+
+
+def trace_id_for(request_id):
+    """A trace id for a request id: itself, if it is a UUID, or else a hash."""
+    trace_id = request_id.replace("-", "").lower()
+    if TRACE_ID_RE.fullmatch(trace_id):
+        return trace_id
+    return hashlib.sha256(request_id.encode()).hexdigest()[:32]
+
+
+class Span:
+    def __init__(self, name, *, trace_id, parent_id=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes or {}
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.previous = None
+        # The outermost span in this process, which collects the others:
+        self.local_root = self
+        self.finished = []
+
+    def as_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start_ns / 1e9,
+            "duration": (self.end_ns - self.start_ns) / 1e9,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+    def as_otlp(self):
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [
+                {"key": key, "value": {"stringValue": str(value)}}
+                for key, value in self.attributes.items()
+            ],
+            "status": (
+                {"code": 2, "message": self.error} if self.error else {"code": 1}
+            ),
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def enabled():
+    return bool(settings.TRACING_EXPORTER)
+
+
+def current_trace_id():
+    """The current trace id, or "" if nothing is being traced."""
+    span = _current.get()
+    return span.trace_id if span else ""
+
+
+def reset():
+    """Forget the current span, e.g. one a previous request never ended."""
+    _current.set(None)
+
+
+def inject():
+    """The current trace context, to pass to another process or message."""
+    span = _current.get()
+    if span is None:
+        return {}
+    return {"trace_id": span.trace_id, "span_id": span.span_id}
+
+
+def start_span(name, *, context=None, trace_id=None, **attributes):
+    """
+    Start a span, as a child of context (from inject()) if there is one, or
+    else of the current span, or else as the root of trace_id or a new trace.
+    Returns it, or None if tracing is off.
+    """
+    if not enabled():
+        return None
+    previous = _current.get()
+    if context and context.get("trace_id"):
+        span = Span(
+            name,
+            trace_id=context["trace_id"],
+            parent_id=context.get("span_id"),
+            attributes=attributes,
+        )
+    elif previous is not None:
+        span = Span(
+            name,
+            trace_id=previous.trace_id,
+            parent_id=previous.span_id,
+            attributes=attributes,
+        )
+        span.local_root = previous.local_root
+    else:
+        span = Span(
+            name, trace_id=trace_id or secrets.token_hex(16), attributes=attributes
+        )
+    span.previous = previous
+    _current.set(span)
+    return span
+
+
+def end_span(span, error=None):
+    """End a span, and export the trace's spans if it was the outermost one."""
+    span.end_ns = time.time_ns()
+    if error is not None:
+        span.error = f"{error.__class__.__name__}: {error}"
+    _current.set(span.previous)
+    root = span.local_root
+    root.finished.append(span)
+    if span is root:
+        export(root.finished)
+
+
+@contextmanager
+def span(name, *, context=None, trace_id=None, **attributes):
+    """Trace the block as a span (see start_span). Yields it, or None."""
+    current = start_span(name, context=context, trace_id=trace_id, **attributes)
+    if current is None:
+        yield None
+        return
+    try:
+        yield current
+    except BaseException as e:
+        end_span(current, error=e)
+        raise
+    else:
+        end_span(current)
+
+
+def export(spans):
+    try:
+        if settings.TRACING_EXPORTER == "json":
+            with open(settings.TRACING_JSON_PATH, "a") as f:
+                for span in spans:
+                    f.write(json.dumps(span.as_dict(), default=str) + "\n")
+        elif settings.TRACING_EXPORTER == "otlp":
+            _otlp_exporter().submit(spans)
+    except OSError:
+        # Losing a trace mustn't break the work it describes:
+        logger.exception("Could not export spans")
+
+
+def flush(timeout=5):
+    """Wait up to timeout seconds for this process's spans to be exported."""
+    if _exporter is not None and _exporter.pid == os.getpid():
+        _exporter.flush(timeout)
+
+
+def post_otlp(spans):
+    requests.post(
+        settings.TRACING_OTLP_ENDPOINT,
+        json={
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {
+                                "key": "service.name",
+                                "value": {"stringValue": "metadeploy"},
+                            }
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": __name__},
+                            "spans": [span.as_otlp() for span in spans],
+                        }
+                    ],
+                }
+            ]
+        },
+        timeout=OTLP_TIMEOUT,
+    ).raise_for_status()
+
+
+class OTLPExporter(threading.Thread):
+    """Posts traces to the OTLP endpoint, one at a time, in the background."""
+
+    def __init__(self):
+        super().__init__(name="otlp-exporter", daemon=True)
+        self.pid = os.getpid()
+        self.queue = queue.Queue(maxsize=OTLP_QUEUE_SIZE)
+
+    def submit(self, spans):
+        try:
+            self.queue.put_nowait(spans)
+        except queue.Full:
+            logger.warning("Dropped spans: too many waiting to be exported")
+
+    def run(self):
+        while True:
+            spans = self.queue.get()
+            try:
+                post_otlp(spans)
+            except requests.RequestException:
+                logger.exception("Could not export spans")
+            finally:
+                self.queue.task_done()
+
+    def flush(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def _otlp_exporter():
+    """This process's exporter; a forked worker process starts its own."""
+    global _exporter
+    with _exporter_lock:
+        if _exporter is None or _exporter.pid != os.getpid():
+            _exporter = OTLPExporter()
+            _exporter.start()
+        return _exporter
+
+
+class TraceIDFilter(logging.Filter):
+    """Tag log records with the current trace id, if there is one."""
+
+    def filter(self, record):
+        trace_id = current_trace_id()
+        if trace_id:
+            record.trace_id = trace_id
+        return True
+
+
+class TracingQueue(DjangoRQ):
+    """RQ queue that passes the current trace context on in each job's meta."""
+
+    def create_job(self, *args, meta=None, **kwargs):
+        context = inject()
+        if context:
+            meta = {**(meta or {}), "trace": context}
+        return super().create_job(*args, meta=meta, **kwargs)
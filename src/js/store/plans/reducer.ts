@@ -22,6 +22,9 @@ export type Plan = {
   is_allowed: boolean;
   not_allowed_instructions: string | null;
   average_duration: string | null;
+  p90_duration?: number | null;
+  // Median seconds of each step, by step id:
+  step_durations?: { [key: string]: number } | null;
   requires_preflight: boolean;
   order_key: number;
   supported_orgs: SupportedOrgs;